@@ -0,0 +1,91 @@
+"""
+Compares failing lock requests right away, which makes
+transactions abort and retry, with requests that wait
+for the conflicting locks to be released.
+
+Like stress_test_concurrency.py, worker threads run
+transactions that mix selects and updates, but every
+query hits a small set of hot keys, so nearly every
+transaction conflicts with another one.
+"""
+
+# System imports
+import os
+import random
+import shutil
+import sys
+from time import perf_counter, process_time
+
+# Local imports
+from config import Config
+from lstore.db import Database
+from lstore.query import Query
+from lstore.transaction import Transaction
+from lstore.transaction_worker import TransactionWorker
+
+DB_PATH = './BENCH_LOCKS'
+NUM_RECORDS = 1000
+NUM_HOT_KEYS = 20
+NUM_WORKERS = 8
+NUM_TRANSACTIONS = 50  # Per worker
+NUM_COLUMNS = 5
+NUM_SELECTS = 4  # Per transaction
+NUM_UPDATES = 6  # Per transaction
+
+def benchmark(lock_timeout):
+    if (os.path.exists(DB_PATH)):
+        shutil.rmtree(DB_PATH, ignore_errors=True)
+
+    Config.lock_timeout = lock_timeout
+    db = Database()
+    db.open(DB_PATH)
+    table = db.create_table('Grades', NUM_COLUMNS, 0, force_merge=True)
+    query = Query(table)
+    for key in range(NUM_RECORDS):
+        query.insert(key, 0, 0, 0, 0)
+
+    rng = random.Random(3562901)
+    workers = []
+    for _ in range(NUM_WORKERS):
+        transactions = []
+        for _ in range(NUM_TRANSACTIONS):
+            transaction = Transaction()
+            for _ in range(NUM_SELECTS):
+                transaction.add_query(query.select, table, rng.randrange(NUM_HOT_KEYS), 0, [1] * NUM_COLUMNS)
+            for _ in range(NUM_UPDATES):
+                transaction.add_query(query.update, table, rng.randrange(NUM_HOT_KEYS), *[None, rng.randrange(100), None, None, None])
+            transactions.append(transaction)
+        workers.append(TransactionWorker(transactions))
+
+    start = perf_counter()
+    cpu_start = process_time()
+    for worker in workers:
+        worker.run()
+    for worker in workers:
+        worker.join()
+    seconds = perf_counter() - start
+    cpu_seconds = process_time() - cpu_start
+
+    num_committed = sum(worker.stats.count(True) for worker in workers)
+    num_aborted = sum(worker.stats.count(False) for worker in workers)
+    lock_manager = table.lock_manager
+    num_waits, num_timeouts = lock_manager.num_waits, lock_manager.num_timeouts
+    num_deadlocks, latency = lock_manager.num_deadlocks, lock_manager.detection_latency()
+    db.close()
+    shutil.rmtree(DB_PATH, ignore_errors=True)
+
+    mode = f"wait up to {lock_timeout * 1000:g} ms" if lock_timeout > 0 else "abort on conflict"
+    print(f"[{mode}]")
+    print(f"Committing {num_committed} transactions took:\t", seconds)
+    print("Commits per second:\t\t\t", num_committed / seconds)
+    print("CPU seconds per commit:\t\t\t", cpu_seconds / num_committed)
+    print("Aborts:\t\t\t\t\t", num_aborted)
+    print("Lock waits, timeouts:\t\t\t", num_waits, num_timeouts)
+    print("Deadlocks, detection latency (us):\t", num_deadlocks, latency * 1e6)
+
+if __name__ == "__main__":
+    # Threads switch often, so transactions interleave as they would with more cores
+    sys.setswitchinterval(0.0001)
+    benchmark(lock_timeout=0)
+    benchmark(lock_timeout=0.1)
+    benchmark(lock_timeout=1)
@@ -0,0 +1,96 @@
+"""
+Measures how large scans and many small writers share
+a table.
+
+First a single transaction sums every key of the table,
+counting the locks it holds before it commits.  Then
+scanner workers sum a range of keys over and over while
+writer workers update single records outside of it, and
+the commits of both are counted.
+"""
+
+# System imports
+import os
+import random
+import shutil
+import sys
+from time import perf_counter
+
+# Local imports
+from lstore.db import Database
+from lstore.query import Query
+from lstore.transaction import Transaction
+from lstore.transaction_worker import TransactionWorker
+
+DB_PATH = './BENCH_HIERARCHY'
+NUM_RECORDS = 20000
+NUM_COLUMNS = 5
+NUM_SCANNERS = 2
+NUM_SCANS = 20  # Per scanner
+SCAN_KEYS = 5000
+NUM_WRITERS = 6
+NUM_WRITES = 200  # Per writer
+
+def count_locks(table):
+    lock_manager = table.lock_manager
+    return sum(len(keys) for keys in lock_manager.transaction_dictionary.values())
+
+def benchmark():
+    if (os.path.exists(DB_PATH)):
+        shutil.rmtree(DB_PATH, ignore_errors=True)
+
+    db = Database()
+    db.open(DB_PATH)
+    table = db.create_table('Grades', NUM_COLUMNS, 0, force_merge=True)
+    query = Query(table)
+    for key in range(NUM_RECORDS):
+        query.insert(key, 1, 0, 0, 0)
+
+    # One scan of the whole table
+    transaction = Transaction()
+    transaction.add_query(query.sum, table, 0, NUM_RECORDS - 1, 1)
+    start = perf_counter()
+    for wrapper in transaction.queries:
+        wrapper.try_run()
+    num_locks = count_locks(table)
+    transaction.commit()
+    print(f"Locks held by a sum of {NUM_RECORDS} keys:\t", num_locks, f"({perf_counter() - start:.3f} s)")
+
+    # Scans and writers running together
+    rng = random.Random(3562901)
+    scanners, writers = [], []
+    for _ in range(NUM_SCANNERS):
+        transactions = []
+        for _ in range(NUM_SCANS):
+            transaction = Transaction()
+            transaction.add_query(query.sum, table, 0, SCAN_KEYS - 1, 1)
+            transactions.append(transaction)
+        scanners.append(TransactionWorker(transactions))
+    for _ in range(NUM_WRITERS):
+        transactions = []
+        for _ in range(NUM_WRITES):
+            transaction = Transaction()
+            key = rng.randrange(NUM_RECORDS // 2, NUM_RECORDS)
+            transaction.add_query(query.update, table, key, *[None, None, rng.randrange(100), None, None])
+            transactions.append(transaction)
+        writers.append(TransactionWorker(transactions))
+
+    start = perf_counter()
+    for worker in scanners + writers:
+        worker.run()
+    for worker in scanners + writers:
+        worker.join()
+    seconds = perf_counter() - start
+    num_aborts = sum(worker.stats.count(False) for worker in scanners + writers)
+    db.close()
+    shutil.rmtree(DB_PATH, ignore_errors=True)
+
+    print("Seconds for scans and writes:\t\t", seconds)
+    print("Scans per second:\t\t\t", NUM_SCANNERS * NUM_SCANS / seconds)
+    print("Writes per second:\t\t\t", NUM_WRITERS * NUM_WRITES / seconds)
+    print("Aborts:\t\t\t\t\t", num_aborts)
+
+if __name__ == "__main__":
+    # Threads switch often, so transactions interleave as they would with more cores
+    sys.setswitchinterval(0.0001)
+    benchmark()
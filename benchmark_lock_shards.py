@@ -0,0 +1,58 @@
+"""
+Measures how many locks the lock manager hands out as
+more threads request them, with one mutex for all the
+lock tables and with the tables split into shards.
+
+Every thread runs transactions that take the table
+intention lock and record locks on random keys, then
+release them all, like the queries of a workload with
+few conflicts.
+"""
+
+# System imports
+import random
+import sys
+import threading
+from time import perf_counter
+
+# Local imports
+from config import Config
+from lstore.lock_manager import ColumnMask, LockManager, TABLE_GRANULE
+from lstore.transaction import Transaction
+
+NUM_RECORDS = 100000
+NUM_TRANSACTIONS = 2000  # Per thread
+NUM_RECORD_LOCKS = 10  # Per transaction
+THREAD_COUNTS = [1, 2, 4, 8]
+
+def run_thread(lock_manager, seed):
+    rng = random.Random(seed)
+    mask = ColumnMask(0b00110, 0b10000)
+    for _ in range(NUM_TRANSACTIONS):
+        transaction = Transaction()
+        lock_manager.request(Config.INTENTION_EXCLUSIVE_LOCK, TABLE_GRANULE, transaction)
+        for _ in range(NUM_RECORD_LOCKS):
+            lock_manager.request(mask, rng.randrange(NUM_RECORDS), transaction)
+        lock_manager.release_all(transaction)
+
+def benchmark(num_shards):
+    print(f"[{num_shards} shard{'s' if num_shards > 1 else ''}]")
+    for num_threads in THREAD_COUNTS:
+        lock_manager = LockManager(num_shards=num_shards)
+        threads = [threading.Thread(target=run_thread, args=(lock_manager, seed)) for seed in range(num_threads)]
+        start = perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        seconds = perf_counter() - start
+
+        num_requests = num_threads * NUM_TRANSACTIONS * (NUM_RECORD_LOCKS + 1)
+        print(f"{num_threads} threads, lock requests per second:\t", num_requests / seconds,
+              "\twaits:", lock_manager.num_waits)
+
+if __name__ == "__main__":
+    # Threads switch often, so they interleave as they would with more cores
+    sys.setswitchinterval(0.0001)
+    benchmark(num_shards=1)
+    benchmark(num_shards=Config.lock_num_shards)
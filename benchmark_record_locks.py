@@ -0,0 +1,80 @@
+"""
+Compares one lock per column with one record lock that
+carries a bitmask of the columns.
+
+A transaction updates and selects records of a table
+with 20 columns.  Before it commits the size of the lock
+table is measured, and the time of every lock request
+of its queries is added up.
+"""
+
+# System imports
+import os
+import random
+import shutil
+from time import perf_counter
+
+# Local imports
+from config import Config
+from lstore.db import Database
+from lstore.query import Query
+from lstore.transaction import Transaction
+
+DB_PATH = './BENCH_RECORD_LOCKS'
+NUM_COLUMNS = 20
+NUM_RECORDS = 1000
+NUM_TRANSACTIONS = 50
+NUM_UPDATES = 20  # Per transaction
+NUM_SELECTS = 20  # Per transaction
+
+def benchmark(column_masks):
+    if (os.path.exists(DB_PATH)):
+        shutil.rmtree(DB_PATH, ignore_errors=True)
+
+    Config.lock_column_masks = column_masks
+    db = Database()
+    db.open(DB_PATH)
+    table = db.create_table('Wide', NUM_COLUMNS, 0, force_merge=True)
+    query = Query(table)
+    for key in range(NUM_RECORDS):
+        query.insert(key, *[0] * (NUM_COLUMNS - 1))
+
+    # Time every lock request
+    lock_manager = table.lock_manager
+    request = lock_manager.request
+    timing = {'seconds': 0, 'requests': 0}
+    def timed_request(*args, **kwargs):
+        start = perf_counter()
+        result = request(*args, **kwargs)
+        timing['seconds'] += perf_counter() - start
+        timing['requests'] += 1
+        return result
+    lock_manager.request = timed_request
+
+    rng = random.Random(3562901)
+    num_entries = 0
+    for _ in range(NUM_TRANSACTIONS):
+        transaction = Transaction()
+        for _ in range(NUM_UPDATES):
+            columns = [None] * NUM_COLUMNS
+            columns[rng.randrange(1, NUM_COLUMNS)] = rng.randrange(100)
+            transaction.add_query(query.update, table, rng.randrange(NUM_RECORDS), *columns)
+        for _ in range(NUM_SELECTS):
+            projected = [rng.randrange(2) for _ in range(NUM_COLUMNS)]
+            transaction.add_query(query.select, table, rng.randrange(NUM_RECORDS), 0, projected)
+        for wrapper in transaction.queries:
+            wrapper.try_run()
+        num_entries += sum(len(keys) for keys in lock_manager.transaction_dictionary.values())
+        transaction.commit()
+
+    db.close()
+    shutil.rmtree(DB_PATH, ignore_errors=True)
+
+    print(f"[{'record locks with column masks' if column_masks else 'one lock per column'}]")
+    print("Lock entries per transaction:\t", num_entries / NUM_TRANSACTIONS)
+    print("Lock requests per query:\t", timing['requests'] / (NUM_TRANSACTIONS * (NUM_UPDATES + NUM_SELECTS)))
+    print("Lock microseconds per query:\t", timing['seconds'] * 1e6 / (NUM_TRANSACTIONS * (NUM_UPDATES + NUM_SELECTS)))
+
+if __name__ == "__main__":
+    benchmark(column_masks=False)
+    benchmark(column_masks=True)
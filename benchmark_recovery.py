@@ -0,0 +1,179 @@
+"""
+Kills a database process at random points and checks
+that recovery brings back exactly the committed state,
+reporting how long recovery takes for the size of the
+log it had to replay.
+
+A child process runs a seeded workload of small
+transactions (inserts, updates, deletes and ones that
+abort) and prints the number of every transaction whose
+commit returned.  The parent kills it with SIGKILL once
+enough transactions committed, reopens the database and
+compares it with the same workload replayed in memory.
+The transaction that was running at the kill may or may
+not have committed, both outcomes are accepted.
+"""
+
+# System imports
+import os
+import random
+import shutil
+import signal
+import subprocess
+import sys
+from time import perf_counter
+
+# Local imports
+from config import Config
+from lstore.db import Database
+from lstore.query import Query
+from lstore.transaction import Transaction
+from lstore.wal import WAL_FILE
+
+DB_PATH = './BENCH_RECOVERY'
+NUM_COLUMNS = 5
+NUM_RECORDS = 1000
+NUM_TRIALS = 3
+
+class Workload():
+    """A seeded stream of transactions and the state they leave"""
+
+    def __init__(self, seed):
+        self.random = random.Random(seed)
+        self.model = {key: [key] + [0] * (NUM_COLUMNS - 1) for key in range(NUM_RECORDS)}
+        self.next_key = NUM_RECORDS
+
+    def next(self):
+        """Get the next transaction and apply it to the model
+
+        Returns
+        -------
+        operations : list<tuple>
+            The queries of the transaction
+        """
+
+        choice = self.random.random()
+        keys = sorted(self.model)
+        if (choice < 0.2):
+            key = self.next_key
+            self.next_key += 1
+            columns = [key] + [self.random.randrange(1000) for _ in range(NUM_COLUMNS - 1)]
+            self.model[key] = columns
+            return [('insert', columns)]
+        if (choice < 0.3):
+            key = self.random.choice(keys)
+            del self.model[key]
+            return [('delete', key)]
+        if (choice < 0.4):
+            # Updating a missing record makes the transaction abort
+            key = self.random.choice(keys)
+            return [('update', key, [None, -1, None, None, None]), ('update', -1, [None, -1, None, None, None])]
+
+        operations = []
+        for key in self.random.sample(keys, 2):
+            columns = [None] + [self.random.choice([None, self.random.randrange(1000)]) for _ in range(NUM_COLUMNS - 1)]
+            operations.append(('update', key, columns))
+            self.model[key] = [old if new is None else new for old, new in zip(self.model[key], columns)]
+        return operations
+
+def run_child(seed, checkpoint_log_size):
+    """Commit transactions until killed"""
+
+    Config.checkpoint_log_size = checkpoint_log_size
+    db = Database()
+    db.open(DB_PATH)
+    table = db.get_table('Grades')
+    query = Query(table)
+    workload = Workload(seed)
+    functions = {'insert': query.insert, 'update': query.update, 'delete': query.delete}
+
+    number = 0
+    while True:
+        transaction = Transaction()
+        for operation in workload.next():
+            if (operation[0] == 'insert'):
+                transaction.add_query(query.insert, table, *operation[1])
+            elif (operation[0] == 'delete'):
+                transaction.add_query(query.delete, table, operation[1])
+            else:
+                transaction.add_query(functions[operation[0]], table, operation[1], *operation[2])
+        transaction.run()
+        number += 1
+        print(number, flush=True)
+
+def setup():
+    if (os.path.exists(DB_PATH)):
+        shutil.rmtree(DB_PATH, ignore_errors=True)
+    db = Database()
+    db.open(DB_PATH)
+    query = Query(db.create_table('Grades', NUM_COLUMNS, 0, force_merge=True))
+    for key in range(NUM_RECORDS):
+        query.insert(key, *[0] * (NUM_COLUMNS - 1))
+    db.close()
+
+def matches(query, model, keys):
+    for key in keys:
+        expected = [model[key]] if key in model else []
+        if ([record.columns for record in query.select(key, 0, [1] * NUM_COLUMNS)] != expected):
+            return False
+    return True
+
+def trial(seed, num_transactions, checkpoint_log_size):
+    """Kill a child after about num_transactions commits and recover"""
+
+    setup()
+    rng = random.Random(seed)
+    kill_after = rng.randint(num_transactions // 2, num_transactions)
+    child = subprocess.Popen(
+        [sys.executable, __file__, 'child', str(seed), str(checkpoint_log_size)],
+        stdout=subprocess.PIPE, text=True
+    )
+    committed = 0
+    for line in child.stdout:
+        committed = int(line)
+        if (committed >= kill_after):
+            break
+    child.send_signal(signal.SIGKILL)
+    # Lines printed before the kill landed also committed
+    for line in child.stdout:
+        committed = int(line)
+    child.wait()
+
+    log_size = os.path.getsize(os.path.join(DB_PATH, WAL_FILE))
+    db = Database()
+    start = perf_counter()
+    db.open(DB_PATH)
+    seconds = perf_counter() - start
+    query = Query(db.get_table('Grades'))
+
+    # The transaction running at the kill either committed or not
+    workload = Workload(seed)
+    for _ in range(committed):
+        workload.next()
+    before = dict(workload.model)
+    workload.next()
+    keys = set(before) | set(workload.model)
+    correct = matches(query, before, keys) or matches(query, workload.model, keys)
+
+    stats = db.recovery_stats
+    db.close()
+    shutil.rmtree(DB_PATH, ignore_errors=True)
+    return committed, log_size, seconds, stats, correct
+
+def benchmark(num_transactions, checkpoint_log_size=2**40):
+    mode = f"checkpoint every {checkpoint_log_size // 1024} KiB" if checkpoint_log_size < 2**40 else "no checkpoints"
+    print(f"[kill after up to {num_transactions} transactions, {mode}]")
+    for seed in range(NUM_TRIALS):
+        committed, log_size, seconds, stats, correct = trial(seed * 7919 + num_transactions, num_transactions, checkpoint_log_size)
+        print(f"Committed {committed:5d}  log {log_size / 1024:8.1f} KiB  "
+              f"replayed {stats.num_redone:5d}  undone {stats.num_undone:3d}  "
+              f"recovery {seconds:.3f} s  {'OK' if correct else 'WRONG'}")
+
+if __name__ == "__main__":
+    if (len(sys.argv) > 1 and sys.argv[1] == 'child'):
+        run_child(int(sys.argv[2]), int(sys.argv[3]))
+    else:
+        benchmark(250)
+        benchmark(1000)
+        benchmark(4000)
+        benchmark(4000, checkpoint_log_size=64 * 1024)
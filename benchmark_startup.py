@@ -0,0 +1,73 @@
+"""
+Measures how long short-lived jobs spend starting up.
+
+Every run is a new interpreter that imports the database and
+opens every table of a database with 1, 10 and 100 tables.
+A normal start builds the index of every table and starts
+its merge thread and compactor right away, a fast start
+waits for the first query of each table to do so.
+"""
+
+# System imports
+import os
+import shutil
+import subprocess
+import sys
+
+# Local imports
+from lstore.db import Database
+from lstore.query import Query
+
+DB_PATH = './BENCH_STARTUP'
+NUM_RECORDS = 1_000
+NUM_RUNS = 3
+
+STARTUP = """
+import time
+start = time.perf_counter()
+from config import Config
+Config.lstore_fast_start = {fast_start}
+from lstore.db import Database
+imported = time.perf_counter()
+db = Database()
+db.open({path!r})
+tables = [db.get_table(name) for name in db.table_names()]
+opened = time.perf_counter()
+tables[0].index
+queried = time.perf_counter()
+print(imported - start, opened - imported, queried - opened)
+"""
+
+def create(num_tables):
+    if (os.path.exists(DB_PATH)):
+        shutil.rmtree(DB_PATH, ignore_errors=True)
+
+    db = Database()
+    db.open(DB_PATH)
+    for i in range(num_tables):
+        query = Query(db.create_table(f'Table{i}', 5, 0, force_merge=True))
+        for key in range(NUM_RECORDS):
+            query.insert(key, 93, 0, 0, 0)
+    db.close()
+
+def benchmark(num_tables, fast_start):
+    code = STARTUP.format(fast_start=fast_start, path=DB_PATH)
+    totals = [0, 0, 0]
+    for _ in range(NUM_RUNS):
+        output = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True).stdout
+        for i, seconds in enumerate(output.split()):
+            totals[i] += float(seconds)
+    import_time, open_time, query_time = [total / NUM_RUNS for total in totals]
+
+    mode = "fast start" if fast_start else "normal start"
+    print(f"[{mode}, {num_tables} tables]")
+    print("Importing took:\t\t\t", import_time)
+    print("Opening every table took:\t", open_time)
+    print("First query on a table took:\t", query_time)
+
+if __name__ == "__main__":
+    for num_tables in [1, 10, 100]:
+        create(num_tables)
+        benchmark(num_tables, fast_start=False)
+        benchmark(num_tables, fast_start=True)
+    shutil.rmtree(DB_PATH, ignore_errors=True)
@@ -0,0 +1,77 @@
+"""
+Compares cumulative and non-cumulative tail records.
+
+Cumulative tail records copy every column changed so far into each
+new tail record, so updates write more but the latest version is
+always one tail record away.  Non-cumulative tail records only write
+the updated columns, so updates are cheaper but reads walk the
+version chain.
+"""
+
+# System imports
+import os
+import shutil
+from time import process_time
+from random import choice, randrange, seed
+
+# Local imports
+from lstore.db import Database
+from lstore.query import Query
+
+DB_PATH = './BENCH_TAIL_MODES'
+NUM_RECORDS = 1_000
+NUM_UPDATES = 10_000
+NUM_READS = 10_000
+NUM_COLUMNS = 5
+
+def benchmark(is_cumulative):
+    if (os.path.exists(DB_PATH)):
+        shutil.rmtree(DB_PATH, ignore_errors=True)
+
+    seed(3562901)
+    db = Database()
+    db.open(DB_PATH)
+    table = db.create_table('Grades', NUM_COLUMNS, 0, force_merge=True, is_cumulative=is_cumulative)
+    query = Query(table)
+    keys = []
+
+    for i in range(NUM_RECORDS):
+        query.insert(906659671 + i, 93, 0, 0, 0)
+        keys.append(906659671 + i)
+
+    # Every update touches a single random column
+    update_time_0 = process_time()
+    for _ in range(NUM_UPDATES):
+        columns = [None] * NUM_COLUMNS
+        columns[randrange(1, NUM_COLUMNS)] = randrange(0, 100)
+        query.update(choice(keys), *columns)
+    update_time_1 = process_time()
+
+    select_time_0 = process_time()
+    for _ in range(NUM_READS):
+        query.select(choice(keys), 0, [1] * NUM_COLUMNS)
+    select_time_1 = process_time()
+
+    version_time_0 = process_time()
+    for _ in range(NUM_READS):
+        query.select_version(choice(keys), 0, [1] * NUM_COLUMNS, -2)
+    version_time_1 = process_time()
+
+    sum_time_0 = process_time()
+    for i in range(0, NUM_RECORDS, 100):
+        query.sum(keys[i], keys[min(i + 99, NUM_RECORDS - 1)], randrange(0, NUM_COLUMNS))
+    sum_time_1 = process_time()
+
+    db.close()
+    shutil.rmtree(DB_PATH, ignore_errors=True)
+
+    mode = "cumulative" if is_cumulative else "non-cumulative"
+    print(f"[{mode}]")
+    print(f"Updating {NUM_UPDATES // 1000}k records took:  \t\t", update_time_1 - update_time_0)
+    print(f"Selecting {NUM_READS // 1000}k records took:  \t\t", select_time_1 - select_time_0)
+    print(f"Selecting {NUM_READS // 1000}k version -2 records took:\t", version_time_1 - version_time_0)
+    print(f"Aggregate {NUM_RECORDS // 1000}k of 100 record batch took:\t", sum_time_1 - sum_time_0)
+
+if __name__ == "__main__":
+    benchmark(is_cumulative=True)
+    benchmark(is_cumulative=False)
@@ -0,0 +1,106 @@
+"""
+Compares how the lock priority policies treat long
+transactions that compete with many short ones.
+
+Every worker runs mostly short transactions of two
+updates and some long ones that select and update many
+hot keys.  Without priorities a long transaction can
+lose every conflict and retry for a long time, with
+wound-wait and wait-die it keeps the timestamp of its
+first run, so it becomes the oldest and wins.  The
+latency of a transaction runs from its first attempt
+to its commit.
+"""
+
+# System imports
+import os
+import random
+import shutil
+import sys
+from time import perf_counter
+
+# Local imports
+from config import Config
+from lstore.db import Database
+from lstore.query import Query
+from lstore.transaction import Transaction
+from lstore.transaction_worker import TransactionWorker
+
+DB_PATH = './BENCH_PRIORITY'
+NUM_RECORDS = 1000
+NUM_HOT_KEYS = 50
+NUM_WORKERS = 8
+NUM_TRANSACTIONS = 60  # Per worker
+LONG_EVERY = 6  # Every sixth transaction is long
+NUM_COLUMNS = 5
+NUM_LONG_QUERIES = 30
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+def benchmark(policy):
+    if (os.path.exists(DB_PATH)):
+        shutil.rmtree(DB_PATH, ignore_errors=True)
+
+    Config.lock_priority_policy = policy
+    db = Database()
+    db.open(DB_PATH)
+    table = db.create_table('Grades', NUM_COLUMNS, 0, force_merge=True)
+    query = Query(table)
+    for key in range(NUM_RECORDS):
+        query.insert(key, 0, 0, 0, 0)
+
+    rng = random.Random(3562901)
+    workers = []
+    long_transactions = set()
+    for _ in range(NUM_WORKERS):
+        transactions = []
+        for number in range(NUM_TRANSACTIONS):
+            transaction = Transaction()
+            if (number % LONG_EVERY == 0):
+                long_transactions.add(transaction)
+                for _ in range(NUM_LONG_QUERIES):
+                    transaction.add_query(query.select, table, rng.randrange(NUM_HOT_KEYS), 0, [1] * NUM_COLUMNS)
+                    transaction.add_query(query.update, table, rng.randrange(NUM_HOT_KEYS), *[None, rng.randrange(100), None, None, None])
+            else:
+                for _ in range(2):
+                    transaction.add_query(query.update, table, rng.randrange(NUM_HOT_KEYS), *[None, rng.randrange(100), None, None, None])
+            transactions.append(transaction)
+        workers.append(TransactionWorker(transactions))
+
+    start = perf_counter()
+    for worker in workers:
+        worker.run()
+    for worker in workers:
+        worker.join()
+    seconds = perf_counter() - start
+
+    latencies = {True: [], False: []}
+    aborts = {True: 0, False: 0}
+    for worker in workers:
+        for transaction, latency in worker.latencies.items():
+            is_long = transaction in long_transactions
+            latencies[is_long].append(latency)
+            aborts[is_long] += transaction.num_aborts
+    lock_manager = table.lock_manager
+    num_deadlocks, num_wounds, num_dies = lock_manager.num_deadlocks, lock_manager.num_wounds, lock_manager.num_dies
+    num_timeouts = lock_manager.num_timeouts
+    db.close()
+    shutil.rmtree(DB_PATH, ignore_errors=True)
+
+    print(f"[{policy or 'deadlock detection'}]")
+    print("Seconds:\t\t\t\t", seconds)
+    for is_long in (False, True):
+        values = latencies[is_long]
+        print(f"{'Long' if is_long else 'Short'} latency p50/p99/max (ms):\t",
+              f"{percentile(values, 0.5) * 1000:.1f} {percentile(values, 0.99) * 1000:.1f} {max(values) * 1000:.1f}",
+              f" aborts {aborts[is_long]}")
+    print("Deadlocks, wounds, dies, timeouts:\t", num_deadlocks, num_wounds, num_dies, num_timeouts)
+
+if __name__ == "__main__":
+    # Threads switch often, so transactions interleave as they would with more cores
+    sys.setswitchinterval(0.0001)
+    benchmark(None)
+    benchmark('wound-wait')
+    benchmark('wait-die')
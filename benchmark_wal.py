@@ -0,0 +1,75 @@
+"""
+Compares syncing the write-ahead log once per commit
+with group commit.
+
+Every worker thread commits small update transactions
+on its own records, so they never wait on each other's
+locks and only compete for the log.  Group commit lets
+the commits that arrive during the commit delay share
+one fsync.
+"""
+
+# System imports
+import os
+import shutil
+from time import perf_counter
+
+# Local imports
+from config import Config
+from lstore.db import Database
+from lstore.query import Query
+from lstore.transaction import Transaction
+from lstore.transaction_worker import TransactionWorker
+
+DB_PATH = './BENCH_WAL'
+NUM_WORKERS = 8
+NUM_TRANSACTIONS = 200  # Per worker
+NUM_COLUMNS = 5
+
+def benchmark(group_commit, commit_delay=0):
+    if (os.path.exists(DB_PATH)):
+        shutil.rmtree(DB_PATH, ignore_errors=True)
+
+    Config.wal_group_commit = group_commit
+    Config.wal_commit_delay = commit_delay
+    db = Database()
+    db.open(DB_PATH)
+    table = db.create_table('Grades', NUM_COLUMNS, 0, force_merge=True)
+    query = Query(table)
+    for key in range(NUM_WORKERS * NUM_TRANSACTIONS):
+        query.insert(key, 0, 0, 0, 0)
+    db.wal.flush()
+
+    workers = []
+    for worker in range(NUM_WORKERS):
+        transactions = []
+        for i in range(NUM_TRANSACTIONS):
+            transaction = Transaction()
+            transaction.add_query(query.update, table, worker * NUM_TRANSACTIONS + i, *[None, i, None, None, None])
+            transactions.append(transaction)
+        workers.append(TransactionWorker(transactions))
+
+    num_syncs = db.wal.num_syncs
+    start = perf_counter()
+    for worker in workers:
+        worker.run()
+    for worker in workers:
+        worker.join()
+    seconds = perf_counter() - start
+    num_syncs = db.wal.num_syncs - num_syncs
+
+    db.close()
+    shutil.rmtree(DB_PATH, ignore_errors=True)
+
+    num_commits = NUM_WORKERS * NUM_TRANSACTIONS
+    mode = f"group commit, {commit_delay * 1000:g} ms delay" if group_commit else "fsync per commit"
+    print(f"[{mode}]")
+    print(f"Committing {num_commits} transactions took:\t", seconds)
+    print("Commits per second:\t\t\t", num_commits / seconds)
+    print("Commits per fsync:\t\t\t", num_commits / num_syncs)
+
+if __name__ == "__main__":
+    benchmark(group_commit=False)
+    benchmark(group_commit=True)
+    benchmark(group_commit=True, commit_delay=0.0005)
+    benchmark(group_commit=True, commit_delay=0.002)
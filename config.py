@@ -1,22 +1,60 @@
 """
 A centralized spot to configure the database.
 """
-# from data_structures.b_plus_tree import BPlusTree
-from data_structures.binary_search_tree import BSTree
-from data_structures.hash_map import HashMap
+# System imports
+import importlib
+
+class LazyClass:
+    """A class the Config only imports when it is first used
+
+    Importing the Config stays cheap, the data structure
+    modules are loaded by the first table that needs them.
+    """
+
+    def __init__(self, module, name):
+        self.module = module
+        self.name = name
+
+    def __set_name__(self, owner, attribute):
+        self.attribute = attribute
+
+    def __get__(self, instance, owner):
+        value = getattr(importlib.import_module(self.module), self.name)
+        # Later reads skip the import
+        setattr(owner, self.attribute, value)
+        return value
 
 class Config:
     page_size = 2**12    #4KB
     page_cell_size = 8   # Thats what the adssignment description said.
     pages_per_block = 2**4  # Total pages that exist in a single block file
     pool_max_blocks = 2**12  # Total number of blocks that can be stored in the BufferPool at a time
-    index_ordered_data_structure = BSTree    # Make sure this class passes test_data_structure_correctness(), and does well on it.
-    index_unordered_data_structure = HashMap
+    pool_segment_files = True  # Store the blocks of a range of block numbers of every column in one segment file instead of one file per block
+    pool_blocks_per_segment = 2**6  # Block numbers that share a segment file
+    pool_flush_workers = 4  # Threads that write segments back to disk in parallel during a flush
+    pool_warm_set = True  # Record the cached blocks on close and load them back in the background when tables are reopened
+    pool_hit_rate_window = 1000  # Block lookups per point of the buffer pool hit rate curve
+    index_ordered_data_structure = LazyClass('data_structures.binary_search_tree', 'BSTree')    # Make sure this class passes test_data_structure_correctness(), and does well on it.
+    index_unordered_data_structure = LazyClass('data_structures.hash_map', 'HashMap')
     b_plus_tree_minimum_degree = 2**7   # 2**6 to 2**7 for fast insert. 2**8 to 2**9 for fast range query
     b_plus_tree_search_algorithm_threshold = 10 # Switch between a linear scan and binary search in b+ tree at this value. Might improve performance.
     b_plus_tree_bulk_insert_start_threshold = 100
     b_plus_tree_bulk_insert_ratio_threshold = 0.30
-    lstore_is_cumulative = False    # Paper mentions there are two ways to do this.
+    lstore_is_cumulative = False    # Paper mentions there are two ways to do this. Cumulative tails carry every column changed so far, tables opt in through create_table(is_cumulative=True)
+    lstore_sparse_tails = True    # Tail records only write the updated (schema encoded) columns instead of every column
+    sparse_offset_cache_pages = 2**8    # Sealed tail pages whose per-record value offsets are kept, the others work them out from their schema page when read
+    lstore_packed_headers = False    # Base records keep their five metadata cells together in one header page instead of one page per metadata column
+    lstore_fast_start = False    # Opening a table defers building its index and starting its merge thread until the first query
+    wal_enabled = False    # Databases log every insert, update and delete so committed transactions survive a crash, off by default as logging slows down plain queries
+    wal_group_commit = True    # Concurrent commits share one fsync instead of syncing once per commit
+    wal_commit_delay = 0.0005    # Seconds the first commit of a group waits for other commits to join its fsync
+    wal_buffer_size = 2**20    # Bytes of log records buffered before they are written out without a commit
+    checkpoint_log_size = 2**24    # Bytes of log records after which the database checkpoints its tables, which bounds the log replayed after a crash
+    version_index_min_depth = 4    # select_version / sum_version deeper than this use the per-record version array instead of walking the chain
+    version_index_max_depth = 2**10    # Newest tail RIDs a version array keeps, older versions are walked to from the oldest one kept
+    version_index_max_records = 2**14    # Records with a version array, the ones read least recently are dropped first
+    tail_retention_versions = None    # Compaction keeps at least this many of the newest versions of each record (None keeps every version)
+    tail_retention_seconds = None    # Compaction also keeps versions younger than this many seconds (None disables the age rule)
     column_data_offset = 5
     byteorder = 'big'
     indirection_column_idx = 0
@@ -31,6 +69,21 @@ class Config:
     # Lock types
     SHARED_LOCK = 0
     EXCLUSIVE_LOCK = 1
+    COLUMN_LOCK = 2    # A record lock with a ColumnMask of the columns it reads and writes
+    INTENTION_SHARED_LOCK = 3    # Modes of the table and key range Granules, together with SHARED_LOCK and EXCLUSIVE_LOCK
+    INTENTION_EXCLUSIVE_LOCK = 4
+    SHARED_INTENTION_EXCLUSIVE_LOCK = 5
+    GRANULE_LOCK = 6    # A lock on a Granule in any of its modes
+    lock_range_size = 2**10    # Consecutive primary keys that share a key range Granule
+    lock_escalation_threshold = 2**6    # Record locks of a Transaction in one key range before it locks the whole range instead
+    lock_column_masks = True    # Take one lock per record with a column bitmask instead of one lock per column
+    lock_timeout = 1.0    # Seconds a lock request waits behind conflicting locks before it fails
+    lock_deadlock_detection = True    # Whether a request that has to wait first looks for a cycle in the waits-for graph
+    lock_deadlock_victim = 'youngest'    # Which Transaction of a deadlock aborts, the 'youngest' or the 'cheapest' (fewest locks and changes)
+    lock_priority_policy = None    # 'wound-wait' or 'wait-die' to prevent deadlocks by Transaction age instead of detecting them
+    lock_num_shards = 2**4    # Shards of the lock tables, each with its own mutex, that resources are hashed to
+    transaction_backoff_base = 1e-4    # Seconds of the largest delay before the first retry of an aborted Transaction, doubled on every further abort
+    transaction_backoff_max = 1e-2    # Seconds the delay before a retry is capped at
 
     # Best time to insert 100_000 random items into a b+ tree with minimum_degree.
     # 200 1.5865
@@ -776,6 +776,19 @@ class BPlusTree:
                 yield key
             leaf = leaf.link
 
+    """Iterator over leaf keys from the first key that is at least low_key"""
+    def keys_from(self, low_key):
+        leaf = self._get_leaf(low_key)
+        if leaf is None:
+            return
+
+        index = self._find_key_index(leaf.keys, low_key)
+        while leaf is not None:
+            for key in leaf.keys[index:]:
+                yield key
+            leaf = leaf.link
+            index = 0
+
     """Iterator over leaf values"""
     def values(self):
         leaf = self._minimum_leaf()
@@ -0,0 +1,206 @@
+"""
+This defines a growable bitmap stored as an
+array of 64-bit words.  Besides constant time
+access to a single bit, whole words can be
+checked at once, so runs of set or clear bits
+are skipped 64 at a time while iterating.
+"""
+
+# System imports
+from array import array
+import struct
+
+WORD_SIZE = 64
+FULL_WORD = (1 << WORD_SIZE) - 1
+
+class Bitmap():
+    """A growable bitmap
+
+    Bit i is stored in word i // 64 at
+    position i % 64.  Bits past the size
+    of the bitmap are always clear.
+    """
+
+    def __init__(self, size=0):
+        """Initialize a Bitmap
+
+        Parameters
+        ----------
+        size : int
+            The initial number of bits, all clear
+        """
+
+        self.size = size
+        self.words = array('Q', [0]) * (-(-size // WORD_SIZE))
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, i):
+        """Whether a bit is set
+
+        Parameters
+        ----------
+        i : int
+            The position of the bit
+
+        Returns
+        -------
+        b : bool
+            Whether the bit is set
+
+        Raises
+        ------
+        IndexError
+        """
+
+        if (i < 0 or i >= self.size):
+            raise IndexError(i)
+        return (self.words[i // WORD_SIZE] >> (i % WORD_SIZE)) & 1 == 1
+
+    def append(self, bit=False):
+        """Add a bit at the end
+
+        Parameters
+        ----------
+        bit : bool
+            Whether the new bit is set
+        """
+
+        if (self.size % WORD_SIZE == 0):
+            self.words.append(0)
+        self.size += 1
+        if (bit):
+            self.set(self.size - 1)
+
+    def set(self, i):
+        """Set a bit
+
+        Parameters
+        ----------
+        i : int
+            The position of the bit
+        """
+
+        if (i < 0 or i >= self.size):
+            raise IndexError(i)
+        self.words[i // WORD_SIZE] |= 1 << (i % WORD_SIZE)
+
+    def clear(self, i):
+        """Clear a bit
+
+        Parameters
+        ----------
+        i : int
+            The position of the bit
+        """
+
+        if (i < 0 or i >= self.size):
+            raise IndexError(i)
+        self.words[i // WORD_SIZE] &= FULL_WORD ^ (1 << (i % WORD_SIZE))
+
+    def count(self):
+        """Count the set bits
+
+        Returns
+        -------
+        n : int
+            The number of set bits
+        """
+
+        return sum(bin(word).count("1") for word in self.words if word)
+
+    def iter_set(self, start=0, stop=None):
+        """Iterate the positions of the set bits
+
+        Words without any set bit are skipped at once.
+
+        Parameters
+        ----------
+        start : int
+            The first position to consider
+        stop : int | None
+            One past the last position to consider (Default is the size)
+
+        Yields
+        ------
+        i : int
+            The position of a set bit in ascending order
+        """
+
+        yield from self.__iter_bits(start, stop, 0)
+
+    def iter_clear(self, start=0, stop=None):
+        """Iterate the positions of the clear bits
+
+        Words with every bit set are skipped at once.
+
+        Parameters
+        ----------
+        start : int
+            The first position to consider
+        stop : int | None
+            One past the last position to consider (Default is the size)
+
+        Yields
+        ------
+        i : int
+            The position of a clear bit in ascending order
+        """
+
+        yield from self.__iter_bits(start, stop, FULL_WORD)
+
+    def __iter_bits(self, start, stop, invert):
+        if (stop is None or stop > self.size):
+            stop = self.size
+        if (start >= stop):
+            return
+
+        words = self.words
+        for word_num in range(start // WORD_SIZE, -(-stop // WORD_SIZE)):
+            # Clear bits are found by looking for the set bits of the inverted word
+            word = words[word_num] ^ invert
+            if (word == 0):
+                continue
+
+            base = word_num * WORD_SIZE
+            while (word):
+                low_bit = word & -word
+                i = base + low_bit.bit_length() - 1
+                if (i >= stop):
+                    return
+                if (i >= start):
+                    yield i
+                word ^= low_bit
+
+    def tofile(self, fp):
+        """Write the Bitmap to an open binary file
+
+        Parameters
+        ----------
+        fp : file
+            The file to write to
+        """
+
+        fp.write(struct.pack('<q', self.size))
+        self.words.tofile(fp)
+
+    @staticmethod
+    def fromfile(fp):
+        """Read a Bitmap written by tofile
+
+        Parameters
+        ----------
+        fp : file
+            The file to read from
+
+        Returns
+        -------
+        bitmap : Bitmap
+            The restored Bitmap
+        """
+
+        bitmap = Bitmap()
+        bitmap.size = struct.unpack('<q', fp.read(8))[0]
+        bitmap.words.fromfile(fp, -(-bitmap.size // WORD_SIZE))
+        return bitmap
@@ -204,6 +204,8 @@ class PriorityQueue():
             # Remove the item from the internal queue and hash map
             item = self.map[key]
             self.data.remove(item)
+            # Removing an item from the middle breaks the heap order
+            heapq.heapify(self.data)
             del self.map[key]
 
             return item
@@ -16,6 +16,10 @@ Where:
   * num_cells is defined as the total number of filled cells
     in the Page
   * M is defined as the total number of bytes per page
+
+A Block that belongs to a SegmentFile is stored in one of
+its extents instead.  Files of older tables are still read
+and are removed once the Block was written to its segment.
 """
 
 # System imports
@@ -35,7 +39,7 @@ class Block():
     quickly retrieved and written between disk and RAM.
     """
 
-    def __init__(self, base_path, column, block_id, size=Config.pages_per_block):
+    def __init__(self, base_path, column, block_id, size=Config.pages_per_block, segment=None, journal=None):
         """Initialize the Block
 
         This sets up an initial Block with internal properties.
@@ -51,13 +55,22 @@ class Block():
             The unique block ID that this block corresponds to
         size : int
             The size of the block in number of pages
+        segment : SegmentFile | None
+            The SegmentFile that stores the block or
+            None to store it in its own file
+        journal : UndoJournal | None
+            The journal the file of the block is saved
+            to before it is overwritten or removed
         """
 
         self.base_path = base_path
-        # self.column = column
+        self.column = column
         self.block_id = block_id
         self.size = size
+        self.segment = segment
+        self.journal = journal
         self.pages = []  # A list of Page objects
+        self.in_file = False  # Whether the block was read from its own file
 
         # Compute the full path
         self.full_path = os.path.join(base_path, f"{block_id}.data")
@@ -75,8 +88,15 @@ class Block():
             (False implies that this block is completely new)
         """
 
+        if (self.segment is not None):
+            pages = self.segment.read_pages(self.column, self.block_id)
+            if (pages is not None):
+                self.pages = pages
+                return True
+
         # Check if the file exists on disk already
         if (os.path.exists(self.full_path)):
+            self.in_file = True
             # Open the Block file
             with open(self.full_path, 'rb') as fp:
                 # Read metadata
@@ -113,7 +133,7 @@ class Block():
         del self.pages
         self.pages = []
 
-    def write(self):
+    def write(self, keep_pages=False):
         """Write data to the disk and discard pages
 
         Write all pages in the current Block to disk
@@ -122,6 +142,12 @@ class Block():
         destructive action and will not preserve
         any data in RAM after writing to disk successfully.
 
+        Parameters
+        ----------
+        keep_pages : bool
+            Keep the pages in memory, such as for a
+            checkpoint of a block that stays cached
+
         Returns
         -------
         status : bool
@@ -132,6 +158,14 @@ class Block():
         if (len(self.pages) == 0):
             return False
 
+        if (self.segment is not None):
+            self.segment.write_pages(self.column, self.block_id, self.pages)
+            self.written(keep_pages)
+            return True
+
+        if (self.journal is not None):
+            self.journal.save_file(self.full_path)
+
         # Write all data to the disk
         with open(self.full_path, 'wb') as fp:
             # Write metadata
@@ -152,11 +186,39 @@ class Block():
                 # Write data to the file
                 fp.write(barray)
 
+            # Checkpoints rely on the file being on disk
+            if (self.journal is not None):
+                fp.flush()
+                os.fsync(fp.fileno())
+
         # Delete internal data
-        self.discard()
+        if (not keep_pages):
+            self.discard()
 
         return True
 
+    def written(self, keep_pages=False):
+        """Finish a write that went to the segment
+
+        The BufferPool writes the Blocks of a segment
+        in one batch and calls this for each of them.
+
+        Parameters
+        ----------
+        keep_pages : bool
+            Keep the pages in memory
+        """
+
+        # The block moved into its segment, so the file of an older table is stale
+        if (self.in_file):
+            if (self.journal is not None):
+                self.journal.save_file(self.full_path)
+            os.remove(self.full_path)
+            self.in_file = False
+
+        if (not keep_pages):
+            self.discard()
+
     def get(self):
         """Get all pages
 
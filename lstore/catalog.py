@@ -0,0 +1,153 @@
+"""
+This is responsible for the Catalog of a database,
+a single file that describes every table.  Knowing
+the tables from the Catalog means the Database can
+check for, list and drop tables without opening
+them, and tables are only opened when first used.
+
+Data is stored on disk with the following format:
+
+n_tables (4 Bytes)
+[
+    name_length (4 Bytes)
+    name (name_length Bytes)
+    num_columns (4 Bytes)
+    primary_key (4 Bytes)
+] x n_tables
+
+Databases written before the Catalog existed have
+it rebuilt from the meta data of their tables.
+"""
+
+# System imports
+import os
+import struct
+
+CATALOG_FILE = 'catalog.data'
+
+class Catalog():
+    """The tables of a database
+
+    Maps every table name to its number of
+    columns and primary key column.
+    """
+
+    def __init__(self, path):
+        """Load the Catalog of a database
+
+        Parameters
+        ----------
+        path : str
+            The path of the database
+        """
+
+        self.path = path
+        self.tables = {}  # Table name mapped to (num_columns, primary_key)
+
+        catalog_path = os.path.join(path, CATALOG_FILE)
+        if (os.path.exists(catalog_path)):
+            with open(catalog_path, 'rb') as fp:
+                n_tables = struct.unpack('<i', fp.read(4))[0]
+                for _ in range(n_tables):
+                    name_length = struct.unpack('<i', fp.read(4))[0]
+                    name = fp.read(name_length).decode()
+                    self.tables[name] = struct.unpack('<ii', fp.read(8))
+        elif (os.path.exists(path)):
+            self.__rebuild()
+
+    def __contains__(self, name):
+        return name in self.tables
+
+    def __len__(self):
+        return len(self.tables)
+
+    def __rebuild(self):
+        """Find the tables of an older database from their meta data"""
+
+        for name in sorted(os.listdir(self.path)):
+            meta_path = os.path.join(self.path, name, 'meta.data')
+            if (not os.path.exists(meta_path)):
+                continue
+            with open(meta_path, 'rb') as fp:
+                # num_records and num_tail_records come before the columns and key
+                fp.read(8)
+                self.tables[name] = struct.unpack('<ii', fp.read(8))
+        if (self.tables):
+            self.save()
+
+    def names(self):
+        """Get the names of every table
+
+        Returns
+        -------
+        names : list<str>
+            The table names in sorted order
+        """
+
+        return sorted(self.tables)
+
+    def get(self, name):
+        """Get the description of a table
+
+        Parameters
+        ----------
+        name : str
+            The table name
+
+        Returns
+        -------
+        description : tuple<int> | None
+            The (num_columns, primary_key) of the table
+            or None if the table does not exist
+        """
+
+        return self.tables.get(name)
+
+    def add(self, name, num_columns, primary_key):
+        """Add a table and save the Catalog
+
+        Parameters
+        ----------
+        name : str
+            The table name
+        num_columns : int
+            The number of columns of the table
+        primary_key : int
+            The primary key column
+        """
+
+        self.tables[name] = (num_columns, primary_key)
+        self.save()
+
+    def remove(self, name):
+        """Remove a table and save the Catalog
+
+        Parameters
+        ----------
+        name : str
+            The table name
+        """
+
+        self.tables.pop(name, None)
+        self.save()
+
+    def save(self):
+        """Write the Catalog
+
+        The Catalog is written to a temporary file that
+        replaces the old one, so it is never half written.
+        """
+
+        if (not os.path.exists(self.path)):
+            os.makedirs(self.path)
+
+        catalog_path = os.path.join(self.path, CATALOG_FILE)
+        temp_path = catalog_path + '.tmp'
+        with open(temp_path, 'wb') as fp:
+            fp.write(struct.pack('<i', len(self.tables)))
+            for name, (num_columns, primary_key) in self.tables.items():
+                encoded = name.encode()
+                fp.write(struct.pack('<i', len(encoded)))
+                fp.write(encoded)
+                fp.write(struct.pack('<ii', num_columns, primary_key))
+        os.replace(temp_path, catalog_path)
@@ -0,0 +1,189 @@
+"""
+This is responsible for garbage collecting tail
+records through the TailCompactor.  Tail pages only
+ever grow: rolled back updates leave tombstoned tail
+records behind, deleted records keep their version
+chains and old versions are kept forever.
+
+A compaction walks the version chain of every live
+base record and keeps the versions allowed by the
+retention policy (the newest N versions and every
+version younger than T seconds).  Values of expired
+versions are folded into the base record, so the
+oldest readable version stays exact.  The kept tail
+records are then rewritten with new dense RIDs and
+the indirection and TPS columns are remapped.
+
+Compaction is only run on demand through Table.compact,
+plain Query calls take none of the latches that keep it
+from changing the tail records under them.
+"""
+
+# System imports
+from bisect import bisect_right
+import time
+
+# Local imports
+from config import Config
+import lstore.utils as utils
+from lstore.lock_manager import TABLE_GRANULE
+
+class TailCompactor():
+    """Reclaims dead and expired tail records
+
+    Compaction needs the table to itself, so it takes
+    the exclusive table lock, the index latch that the
+    queries of transactions run under and the checkpoint
+    latch that logged Query calls share.
+    """
+
+    def __init__(self, table, retention_versions=Config.tail_retention_versions, retention_seconds=Config.tail_retention_seconds):
+        """Initialize the TailCompactor
+
+        Parameters
+        ----------
+        table : Table
+            The Table whose tail records are compacted
+        retention_versions : int | None
+            Keep at least this many of the newest versions
+            of every record (None keeps every version)
+        retention_seconds : int | None
+            Also keep every version younger than this many
+            seconds (None disables the age rule)
+        """
+
+        self.table = table
+        self.retention_versions = retention_versions
+        self.retention_seconds = retention_seconds
+        self.num_compactions = 0
+        self.num_reclaimed = 0
+
+    def compact(self):
+        """Rewrite the tail records without dead or expired ones
+
+        Returns
+        -------
+        reclaimed : int | None
+            The number of tail records that were dropped
+            or None if transactions are holding the table
+        """
+
+        # Every call owns its lock, so a second compaction cannot share it
+        lock_manager = self.table.lock_manager
+        owner = object()
+        if (lock_manager.request(Config.EXCLUSIVE_LOCK, TABLE_GRANULE, owner, timeout=0) is None):
+            lock_manager.release_all(owner)
+            return None
+
+        try:
+            table = self.table
+            with table.index_latch, table.checkpoint_latch.exclusive(), table.maintenance_lock:
+                reclaimed = self.__compact()
+        finally:
+            lock_manager.release_all(owner)
+
+        self.num_compactions += 1
+        self.num_reclaimed += reclaimed
+        return reclaimed
+
+    def __is_retained(self, depth, timestamp, now):
+        """Whether a version at a depth of its chain is kept"""
+
+        if (depth == 0):
+            return True
+        if (self.retention_versions is None and self.retention_seconds is None):
+            return True
+        if (self.retention_versions is not None and depth < self.retention_versions):
+            return True
+        if (self.retention_seconds is not None and now - timestamp < self.retention_seconds):
+            return True
+        return False
+
+    def __compact(self):
+        page_directory = self.table.page_directory
+        num_data_columns = page_directory.num_columns - Config.column_data_offset
+
+        # Appends wait until the tail has been rewritten
+        with page_directory.delta_buffer.lock:
+            num_tail_records = page_directory.num_tail_records
+            now = int(time.time())
+
+            # Walk every live chain from the newest version back, chains are newest first so
+            # the kept versions are always a prefix of the chain
+            keep = bytearray(num_tail_records)
+            for rid in range(page_directory.num_records):
+                tail_rid = page_directory.get_column_value(rid, Config.indirection_column_idx)
+                if (tail_rid == -1):
+                    continue
+                if (page_directory.get_column_value(rid, Config.rid_column_idx) == -1):
+                    # A deleted record no longer needs any of its versions
+                    page_directory.set_column_value(rid, Config.indirection_column_idx, -1)
+                    continue
+
+                depth = 0
+                while (tail_rid != -1):
+                    timestamp = page_directory.get_column_value(tail_rid, Config.timestamp_column_idx, tail_flg=1)
+                    if (not self.__is_retained(depth, timestamp, now)):
+                        self.__fold_into_base(rid, tail_rid, num_data_columns)
+                        break
+                    keep[tail_rid] = 1
+                    tail_rid = page_directory.get_column_value(tail_rid, Config.indirection_column_idx, tail_flg=1)
+                    depth += 1
+
+            kept = [tail_rid for tail_rid in range(num_tail_records) if keep[tail_rid]]
+            if (len(kept) == num_tail_records):
+                return 0
+
+            # Kept records get the RIDs 0..n-1 in their old order
+            remap = {old_rid: new_rid for new_rid, old_rid in enumerate(kept)}
+            records = []
+            for old_rid in kept:
+                columns = [-1] * page_directory.num_columns
+                for column_id in range(Config.column_data_offset):
+                    columns[column_id] = page_directory.get_column_value(old_rid, column_id, tail_flg=1)
+                schema = columns[Config.schema_encoding_column_idx]
+                for column in range(num_data_columns):
+                    if (utils.get_bit(schema, column)):
+                        columns[column + Config.column_data_offset] = page_directory.get_tail_value(old_rid, column, schema)
+
+                # The next older version is either kept or expired
+                columns[Config.indirection_column_idx] = remap.get(columns[Config.indirection_column_idx], -1)
+                records.append(columns)
+
+            page_directory.rewrite_tail(records)
+
+            # Point the base records at the new RIDs
+            for rid in range(page_directory.num_records):
+                indirection = page_directory.get_column_value(rid, Config.indirection_column_idx)
+                if (indirection != -1):
+                    page_directory.set_column_value(rid, Config.indirection_column_idx, remap[indirection])
+
+                # The TPS becomes the newest kept tail record it covered
+                tps = page_directory.get_column_value(rid, Config.tps_and_brid_column_idx)
+                if (tps != -1):
+                    page_directory.set_column_value(rid, Config.tps_and_brid_column_idx, bisect_right(kept, tps) - 1)
+
+        # The merge starts over on the rewritten tail pages
+        self.table.reset_merge()
+
+        return num_tail_records - len(kept)
+
+    def __fold_into_base(self, rid, tail_rid, num_data_columns):
+        """Write the values of the newest expired version into the base record
+
+        Parameters
+        ----------
+        rid : int
+            The base RID
+        tail_rid : int
+            The newest expired version of the record
+        num_data_columns : int
+            The number of logical columns
+        """
+
+        page_directory = self.table.page_directory
+        columns = list(range(num_data_columns))
+        values = page_directory.get_tail_attributes(tail_rid, columns)
+        for column, value in zip(columns, values):
+            if (value is not None):
+                page_directory.set_column_value(rid, column + Config.column_data_offset, value)
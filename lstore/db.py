@@ -5,23 +5,87 @@ This class also handles the creation and deletion of tables via the create and d
 create function will create a new table in the database. The Table constructor takes as input the 
 name of the table, the number of columns, and the index of the key column. The drop function 
 drops the specified table
+
+Tables are listed in the Catalog of the database and
+are only opened when they are first used.  Open tables
+are cached and reference counted, get_table hands out
+the cached Table and close_table closes it once the
+last user is done with it.
+
+With Config.wal_enabled (off by default) every change
+is written to the WriteAheadLog of the database.
+Tables are checkpointed whenever enough of the log has
+built up and the log is cut back to the oldest
+checkpoint, so opening the database after a crash only
+replays the end of the log.  A close checkpoints every
+table and empties the log.  Without the log a crash
+may lose the changes made since a table was opened.
 """
 
 # System imports
 import os
 import shutil
+import threading
 
 # Local imports
-from lstore.table import Table
+from lstore.catalog import Catalog
+from lstore.pool import SharedBufferPool
+from lstore.recovery import recover
+from lstore.table import Table, read_checkpoint
+from lstore.wal import WriteAheadLog, WAL_FILE
 from errors import TableNotUniqueError, TableDoesNotExistError
 from config import Config
 
 class Database():
     def __init__(self):
         self.path = './TEMP'  # Path to the saved database
-        self.tables = {}  # Dictionary of name - Table pairs
+        self.tables = {}  # Dictionary of name - Table pairs of the open tables
+        self.references = {}  # Dictionary of name - number of users of each open table
+        self.bufferpool = SharedBufferPool()  # Memory shared by the pages of every table
+        self.catalog = None  # Loaded on first use
+        self.wal = None  # Opened on first use
+        self.recovery_stats = None  # What the last open had to recover
+        self.lock = threading.RLock()
+
+    def __get_catalog(self):
+        if (self.catalog is None):
+            self.catalog = Catalog(self.path)
+        return self.catalog
+
+    def __get_wal(self):
+        if (self.wal is None and Config.wal_enabled):
+            # A lost log starts after every checkpoint so no later record looks checkpointed
+            base_lsn = max([read_checkpoint(os.path.join(self.path, name))[1] for name in self.__get_catalog().names()], default=0)
+            self.wal = WriteAheadLog(
+                os.path.join(self.path, WAL_FILE),
+                group_commit=Config.wal_group_commit,
+                commit_delay=Config.wal_commit_delay,
+                buffer_size=Config.wal_buffer_size,
+                checkpoint_size=Config.checkpoint_log_size,
+                base_lsn=base_lsn,
+            )
+            thread = threading.Thread(target=self.__run_checkpoints, args=(self.wal,), daemon=True)
+            thread.start()
+        return self.wal
+
+    def __close_wal(self):
+        wal = self.wal
+        self.wal = None
+        # Wakes the checkpoint thread, which sees the log is gone
+        wal.checkpoint_needed.set()
+        wal.close()
 
-    def open(self, path):
+    def __run_checkpoints(self, wal):
+        """Checkpoint whenever the log has grown enough"""
+
+        while True:
+            wal.checkpoint_needed.wait()
+            with self.lock:
+                if (self.wal is not wal):
+                    return
+                self.checkpoint()
+
+    def open(self, path, memory_budget=None):
         """Open an existing database
         
         Parameters
@@ -29,16 +93,35 @@ class Database():
         path : str
             The path to the database file.  This will
             be created if it doesn't already exist.
+        memory_budget : int | None
+            The bytes of pages that all tables may hold
+            in memory together (Default is Config.pool_max_blocks blocks)
         """
 
+        if (memory_budget is not None):
+            self.bufferpool.resize(SharedBufferPool.blocks_for_memory(memory_budget))
+
         # Check if path is not empty
         if (path != ''):
             self.path = path
+            self.catalog = None
+            if (self.wal is not None):
+                self.__close_wal()
 
             # Check if path already exists
             if (not os.path.exists(path)):
                 # Create the folder
                 os.makedirs(path)
+
+            # Whatever a crash left behind is repaired before any table is used
+            if (Config.wal_enabled and (os.path.exists(os.path.join(path, WAL_FILE)) or len(self.__get_catalog()) > 0)):
+                self.recovery_stats = recover(path, self.__get_wal(), self.catalog, shared_pool=self.bufferpool)
+
+            # Tables load the blocks that were cached at the last close as they are opened
+            warm_path = os.path.join(path, 'warm.data')
+            if (Config.pool_warm_set and os.path.exists(warm_path)):
+                with open(warm_path, 'rb') as fp:
+                    self.bufferpool.load_warm_set(fp, path)
         else:
             pass # TODO: Throw an error for invalid path
 
@@ -53,17 +136,71 @@ class Database():
         
         # Only close out if the stored path is proper
         if (self.path != ''):
-            for table_name,t in self.tables.items():
-                # Create a folder for each table
+            with self.lock:
+                # The cached blocks are recorded before the tables drop them
+                if (Config.pool_warm_set and os.path.exists(self.path)):
+                    with open(os.path.join(self.path, 'warm.data'), 'wb') as fp:
+                        self.bufferpool.save_warm_set(fp, self.path)
+
+                for table_name,t in self.tables.items():
+                    # Create a folder for each table
                     
-                pname = os.path.join(self.path, table_name)
-                if (not os.path.exists(pname)):
-                    os.makedirs(pname)
-                
-                #close table
-                t.close()
-
-    def create_table(self, name, num_columns, key_index, force_merge=False, merge_interval=30):
+                    pname = os.path.join(self.path, table_name)
+                    if (not os.path.exists(pname)):
+                        os.makedirs(pname)
+
+                # Tables write back independently, so they are closed in parallel
+                if (len(self.tables) > 1):
+                    # Imported here, concurrent.futures is slow to import and short jobs rarely close many tables
+                    from concurrent.futures import ThreadPoolExecutor
+                    with ThreadPoolExecutor(max_workers=len(self.tables)) as executor:
+                        list(executor.map(lambda t: t.close(), self.tables.values()))
+                else:
+                    for t in self.tables.values():
+                        t.close()
+
+                # Every handle is closed, the next get_table opens the table again
+                self.tables = {}
+                self.references = {}
+
+                # Every change is in the table files now
+                if (self.wal is not None):
+                    self.wal.truncate()
+                    self.__close_wal()
+
+    def checkpoint(self):
+        """Checkpoint every open table and cut back the log
+
+        The log keeps the records after the oldest checkpoint
+        of any table and every record of a Transaction that
+        is still running, which recovery may have to undo.
+
+        Returns
+        -------
+        lsn : int | None
+            The LSN the log now starts at or None
+            if the database does not keep a log
+        """
+
+        with self.lock:
+            wal = self.wal
+            if (wal is None):
+                return None
+            wal.checkpoint_needed.clear()
+            wal.checkpoint_lsn = wal.next_lsn
+
+            cuts = []
+            for name in self.__get_catalog().names():
+                table = self.tables.get(name)
+                if (table is not None):
+                    cuts.append(table.checkpoint())
+                else:
+                    cuts.append(read_checkpoint(os.path.join(self.path, name))[1])
+            lsn = wal.oldest_needed_lsn(min(cuts, default=wal.next_lsn))
+            wal.trim(lsn)
+            return lsn
+
+    def create_table(self, name, num_columns, key_index, force_merge=False, merge_interval=30, is_cumulative=Config.lstore_is_cumulative, is_sparse=Config.lstore_sparse_tails, is_packed=Config.lstore_packed_headers):
         """Creates a new table
 
         Parameters
@@ -74,6 +211,12 @@ class Database():
             Number of Columns: all columns are integer
         key : int
             Index of table key in columns
+        is_cumulative : bool
+            Whether tail records carry every column updated so far
+        is_sparse : bool
+            Whether tail records only write their updated columns
+        is_packed : bool
+            Whether base records keep their metadata in one header page
 
         Returns
         -------
@@ -88,13 +231,19 @@ class Database():
         # Extract the table path on disk
         table_path = os.path.join(self.path, name)
 
-        # Check that the name doesn't exist already
-        if (name in self.tables or os.path.exists(table_path)):
-            raise TableNotUniqueError
-        
-        # Create a new table
-        table = Table(self.path, name, num_columns, key_index, force_merge, merge_interval)
-        self.tables[name] = table
+        with self.lock:
+            # Check that the name doesn't exist already
+            if (name in self.tables or name in self.__get_catalog() or os.path.exists(table_path)):
+                raise TableNotUniqueError
+            
+            # Create a new table
+            table = Table(self.path, name, num_columns, key_index, force_merge, merge_interval, is_cumulative, is_sparse, is_packed, shared_pool=self.bufferpool, wal=self.__get_wal())
+            # Recovery replays the log onto the empty table the checkpoint leaves
+            if (table.wal is not None):
+                table.checkpoint()
+            self.catalog.add(name, num_columns, key_index)
+            self.tables[name] = table
+            self.references[name] = 1
 
         return table
     
@@ -114,16 +263,48 @@ class Database():
         # Extract the table path on disk
         table_path = os.path.join(self.path, name)
 
-        # Check if the table does not exist
-        if (name not in self.tables or not os.path.exists(table_path)):
-            raise TableDoesNotExistError(f"cannot drop table `{name}` because it does not exist")
-        
-        # Delete the table on disk
-        shutil.rmtree(table_path, ignore_errors=True)
+        with self.lock:
+            # Check if the table does not exist
+            if (name not in self.__get_catalog()):
+                raise TableDoesNotExistError(f"cannot drop table `{name}` because it does not exist")
 
-        # Delete the table from memory
-        del self.tables[name]
+            # Stop the background work of an open table
+            table = self.tables.pop(name, None)
+            self.references.pop(name, None)
+            if (table is not None):
+                table.stop()
+            
+            # Forget its pages without writing them
+            self.bufferpool.drop(self.bufferpool.keys(table_path))
+            self.bufferpool.close_segments(table_path)
+            self.bufferpool.unregister(table_path)
+
+            # Delete the table on disk
+            self.catalog.remove(name)
+            shutil.rmtree(table_path, ignore_errors=True)
     
+    def set_table_quota(self, name, memory):
+        """Limit the memory a table may hold in the buffer pool
+
+        Parameters
+        ----------
+        name : str
+            The name of the table
+        memory : int | None
+            The bytes of pages the table may hold
+            or None to remove its quota
+
+        Raises
+        ------
+        TableDoesNotExistError
+        """
+
+        if (name not in self.__get_catalog()):
+            raise TableDoesNotExistError(f"cannot set the quota of table `{name}` because it does not exist")
+
+        quota = None if memory is None else SharedBufferPool.blocks_for_memory(memory)
+        self.bufferpool.set_quota(os.path.join(self.path, name), quota)
+
     def get_table(self, name):
         """Returns table with the passed name
 
@@ -132,24 +313,78 @@ class Database():
         name : str
             The name of the table to get
 
+        The table is opened on the first call and
+        every later call returns the same Table.
+        Each call takes a reference that is given
+        back with close_table.
+
         Returns
         -------
         table : Table
             The table that was found in the current database
-            or `None` if not found.
 
         Raises
         ------
         TableDoesNotExistError
         """
-        
-        table_path = os.path.join(self.path, name)
 
-        if (name not in self.tables) and (not os.path.exists(table_path)):
-            raise TableDoesNotExistError(f"cannot get table `{name}` because it does not exist")
-        
-        if os.path.exists(table_path):
-            table = Table(self.path, name)
-            self.tables[name] = table
+        with self.lock:
+            table = self.tables.get(name)
+            if (table is not None):
+                self.references[name] += 1
+                return table
+
+            if (name not in self.__get_catalog()):
+                raise TableDoesNotExistError(f"cannot get table `{name}` because it does not exist")
             
-        return self.tables.get(name)
+            num_columns, primary_key = self.catalog.get(name)
+            table = Table(self.path, name, num_columns, primary_key, shared_pool=self.bufferpool, wal=self.__get_wal())
+            self.tables[name] = table
+            self.references[name] = 1
+            return table
+
+    def close_table(self, name):
+        """Give back a reference to a table
+
+        The table is closed once every reference
+        taken by create_table and get_table is
+        given back.
+
+        Parameters
+        ----------
+        name : str
+            The name of the table
+
+        Returns
+        -------
+        closed : bool
+            Whether the table was closed
+
+        Raises
+        ------
+        TableDoesNotExistError
+        """
+
+        with self.lock:
+            if (name not in self.tables):
+                raise TableDoesNotExistError(f"cannot close table `{name}` because it is not open")
+
+            self.references[name] -= 1
+            if (self.references[name] > 0):
+                return False
+
+            table = self.tables.pop(name)
+            del self.references[name]
+        table.close()
+        return True
+
+    def table_names(self):
+        """Get the names of every table in the database
+
+        Returns
+        -------
+        names : list<str>
+            The table names in sorted order
+        """
+
+        return self.__get_catalog().names()
@@ -0,0 +1,171 @@
+"""
+This is responsible for an in-memory write buffer
+for tail records called the DeltaBuffer.  Updates
+append one cell to every physical tail column, and
+going through the BufferPool for each of them costs
+a pin, a block lookup, a cache maintenance step and
+a dirty mark per cell.
+
+The DeltaBuffer instead keeps the page that is
+currently being filled of every tail column in
+memory.  Appends write straight into those pages
+and readers look in the DeltaBuffer before the
+BufferPool, so buffered records are visible right
+away.  Once a page is full it is sealed, which hands
+the packed page to the BufferPool in a single call.
+The merge only ever looks at sealed pages.
+"""
+
+# System imports
+import threading
+
+# Local imports
+from config import Config
+from lstore.page import Page
+
+class DeltaBuffer():
+    """The active tail pages of a table
+
+    Maps a physical tail column to the page
+    that is currently being appended to.
+    """
+
+    def __init__(self, bufferpool):
+        """Initialize the DeltaBuffer
+
+        Parameters
+        ----------
+        bufferpool : BufferPool
+            The BufferPool that sealed pages are handed to
+        """
+
+        self.bufferpool = bufferpool
+        self.page_capacity = Config.page_size // Config.page_cell_size
+        self.pages = {}  # Column id mapped to (page number, Page)
+        self.in_pool = set()  # Columns whose active page also exists in the BufferPool
+        self.num_sealed = 0  # Total pages sealed since the table was opened
+        self.lock = threading.Lock()
+
+    def __contains__(self, column_id):
+        return column_id in self.pages
+
+    def __len__(self):
+        return len(self.pages)
+
+    def load(self, column_id, num_cells):
+        """Resume appending to the last page of a column
+
+        A reopened table may end in a partially filled
+        page, which becomes the active page again.
+
+        Parameters
+        ----------
+        column_id : int
+            The physical tail column
+        num_cells : int
+            The total number of cells already in the column
+        """
+
+        if (num_cells % self.page_capacity == 0):
+            return
+
+        page_num = num_cells // self.page_capacity
+        page = self.bufferpool.get_page(page_num, column_id, tail_flg=1)
+        self.pages[column_id] = (page_num, page)
+        self.in_pool.add(column_id)
+
+    def get_page(self, column_id, page_num):
+        """Get a buffered page
+
+        Parameters
+        ----------
+        column_id : int
+            The physical tail column
+        page_num : int
+            The page number within the column
+
+        Returns
+        -------
+        page : Page | None
+            The active page or None if the page
+            is not buffered (it has been sealed)
+        """
+
+        active = self.pages.get(column_id)
+        if (active is None or active[0] != page_num):
+            return None
+        return active[1]
+
+    def append(self, column_id, position, value):
+        """Append a cell to the active page of a column
+
+        Must be called with the lock held.
+
+        Parameters
+        ----------
+        column_id : int
+            The physical tail column
+        position : int
+            The position of the new cell within the column
+        value : int
+            The value to write
+
+        Returns
+        -------
+        sealed : bool
+            Whether the append filled the page and sealed it
+        """
+
+        page_num = position // self.page_capacity
+        active = self.pages.get(column_id)
+        if (active is None or active[0] != page_num):
+            active = (page_num, Page())
+            self.pages[column_id] = active
+            self.in_pool.discard(column_id)
+
+        page = active[1]
+        page.write(value)
+        if (not page.has_capacity()):
+            self.__seal(column_id)
+            return True
+        return False
+
+    def __seal(self, column_id):
+        """Hand a full page to the BufferPool
+
+        The page is added to the BufferPool before it is
+        dropped from the buffer so readers always find it.
+        """
+
+        page_num, page = self.pages[column_id]
+        self.__write_through(column_id, page_num, page)
+        del self.pages[column_id]
+        self.in_pool.discard(column_id)
+        self.num_sealed += 1
+
+    def __write_through(self, column_id, page_num, page):
+        if (column_id in self.in_pool):
+            self.bufferpool.update_page(page, page_num, column_id, tail_flg=1)
+        else:
+            self.bufferpool.add_page(page, page_num, column_id, tail_flg=1)
+
+    def clear(self):
+        """Forget every active page without writing it
+
+        Must be called with the lock held.
+        """
+
+        self.pages = {}
+        self.in_pool = set()
+
+    def flush(self):
+        """Write every partially filled page to the BufferPool
+
+        The pages stay active, so appends continue where
+        they left off and later seals replace them.
+        """
+
+        with self.lock:
+            for column_id, (page_num, page) in self.pages.items():
+                self.__write_through(column_id, page_num, page)
+                self.in_pool.add(column_id)
@@ -88,6 +88,23 @@ class Index:
         else:
             return list(self._locate_range_linear(column, low_target_value=begin, high_target_value=end))
 
+    def locate_keys(self, begin, end, column):
+        """
+        Returns the keys stored for column "column" between "begin" and "end" inclusive
+        and the next key after them, or None if there is none.
+        Returns None without an ordered index on the column.
+        """
+        index = self.indices[column]
+        if not hasattr(index, 'keys_from'):
+            return None
+
+        keys = []
+        for key in index.keys_from(begin):
+            if key > end:
+                return keys, key
+            keys.append(key)
+        return keys, None
+
     @timer
     def create_index(self, column, ordered:bool=False, unique_keys:bool=False):
         """
@@ -0,0 +1,243 @@
+"""
+This is responsible for the UndoJournal of a table,
+which keeps the files of the table restorable to
+their last checkpoint.
+
+Between checkpoints the BufferPool writes dirty
+Blocks back whenever it evicts them, so after a
+crash the table files hold a mix of checkpointed and
+newer pages that no meta data describes.  Before a
+place on disk is overwritten for the first time since
+the checkpoint, its old contents are synced to the
+UndoJournal.  Recovery writes them back, which also
+repairs Blocks that were only partly written, and the
+log is replayed from the checkpoint on top of it.
+
+Data is stored on disk with the following format:
+
+generation (8 Bytes)
+[
+    length (4 Bytes)
+    checksum (4 Bytes)
+    kind (1 Byte)
+    path_length (2 Bytes)
+    path (path_length Bytes)
+    offset (8 Bytes)
+    size (8 Bytes)
+    data (size Bytes)
+] x n_entries
+
+Where:
+  * generation is the checkpoint the entries undo to
+  * kind is EXTENT_ENTRY for an extent of a SegmentFile
+    and FILE_ENTRY for a whole file
+  * size is -1 for an extent past the end of its file
+    or for a file that did not exist
+  * length and checksum cover the bytes after them,
+    a torn entry is ignored since its overwrite never
+    started
+"""
+
+# System imports
+import os
+import struct
+import threading
+import zlib
+
+JOURNAL_FILE = 'undo.data'
+
+EXTENT_ENTRY = 0
+FILE_ENTRY = 1
+
+GENERATION = struct.Struct('<q')
+FRAME = struct.Struct('<II')
+ENTRY = struct.Struct('<BH')
+LOCATION = struct.Struct('<qq')
+
+# The header of a free extent, written over extents that did not exist
+FREE_HEADER = struct.pack('<iii', -1, -1, 0)
+
+class UndoJournal():
+    """The before-images of a table since its last checkpoint
+
+    Every extent and file is saved once per
+    checkpoint, on its first overwrite.
+    """
+
+    def __init__(self, path, generation):
+        """Open the UndoJournal of a table
+
+        Parameters
+        ----------
+        path : str
+            The path of the table
+        generation : int
+            The checkpoint generation of the table
+        """
+
+        self.path = os.path.join(path, JOURNAL_FILE)
+        self.lock = threading.Lock()
+        self.saved = set()  # Extents and files saved in this generation
+        self.num_saved = 0
+        self.fp = None
+        self.reset(generation)
+
+    def reset(self, generation):
+        """Start over after a checkpoint
+
+        Parameters
+        ----------
+        generation : int
+            The generation of the new checkpoint
+        """
+
+        with self.lock:
+            if (self.fp is not None):
+                self.fp.close()
+            self.fp = open(self.path, 'wb')
+            self.fp.write(GENERATION.pack(generation))
+            self.fp.flush()
+            os.fsync(self.fp.fileno())
+            self.generation = generation
+            self.saved = set()
+
+    def save_extents(self, segment, extents):
+        """Save extents of a SegmentFile before they are written
+
+        Parameters
+        ----------
+        segment : SegmentFile
+            The SegmentFile that is about to be written
+        extents : list<int>
+            The extents that are about to be written
+        """
+
+        with self.lock:
+            if ((FILE_ENTRY, segment.path) in self.saved):
+                return
+            entries = []
+            size = os.fstat(segment.fd).st_size
+            for extent in extents:
+                if ((segment.path, extent) in self.saved):
+                    continue
+                self.saved.add((segment.path, extent))
+                offset = extent * segment.extent_size
+                if (offset >= size):
+                    entries.append(self.__encode(EXTENT_ENTRY, segment.path, offset, None))
+                else:
+                    entries.append(self.__encode(EXTENT_ENTRY, segment.path, offset, os.pread(segment.fd, segment.extent_size, offset)))
+            self.__append(entries)
+
+    def save_file(self, path):
+        """Save a whole file before it is written or removed
+
+        Parameters
+        ----------
+        path : str
+            The path of the file
+        """
+
+        with self.lock:
+            if ((FILE_ENTRY, path) in self.saved):
+                return
+            self.saved.add((FILE_ENTRY, path))
+            data = None
+            if (os.path.exists(path)):
+                with open(path, 'rb') as fp:
+                    data = fp.read()
+            self.__append([self.__encode(FILE_ENTRY, path, 0, data)])
+
+    def close(self):
+        with self.lock:
+            if (self.fp is not None):
+                self.fp.close()
+                self.fp = None
+
+    def __encode(self, kind, path, offset, data):
+        encoded = path.encode()
+        payload = (ENTRY.pack(kind, len(encoded)) + encoded
+            + LOCATION.pack(offset, -1 if data is None else len(data)) + (data or b''))
+        return FRAME.pack(len(payload), zlib.crc32(payload)) + payload
+
+    def __append(self, entries):
+        """Sync entries, the lock must be held"""
+
+        if (not entries):
+            return
+        # A closed journal is reopened by a table that is written to after its close
+        if (self.fp is None):
+            self.fp = open(self.path, 'ab')
+        self.fp.write(b''.join(entries))
+        self.fp.flush()
+        os.fsync(self.fp.fileno())
+        self.num_saved += len(entries)
+
+def restore(path, generation):
+    """Undo every write since a checkpoint
+
+    Parameters
+    ----------
+    path : str
+        The path of the table
+    generation : int
+        The checkpoint generation of the table
+
+    Returns
+    -------
+    num_restored : int
+        The number of extents and files written back
+    """
+
+    journal_path = os.path.join(path, JOURNAL_FILE)
+    if (not os.path.exists(journal_path)):
+        return 0
+    with open(journal_path, 'rb') as fp:
+        data = fp.read()
+
+    # Entries of an older generation were made before the checkpoint finished
+    if (len(data) < GENERATION.size or GENERATION.unpack_from(data)[0] != generation):
+        return 0
+
+    entries = []
+    offset = GENERATION.size
+    while (offset + FRAME.size <= len(data)):
+        length, checksum = FRAME.unpack_from(data, offset)
+        start = offset + FRAME.size
+        payload = data[start:start + length]
+        if (len(payload) < length or zlib.crc32(payload) != checksum):
+            break
+        offset = start + length
+
+        kind, path_length = ENTRY.unpack_from(payload)
+        position = ENTRY.size
+        file_path = payload[position:position + path_length].decode()
+        position += path_length
+        location, size = LOCATION.unpack_from(payload, position)
+        position += LOCATION.size
+        entries.append((kind, file_path, location, None if size == -1 else payload[position:position + size]))
+
+    # Later entries were made on top of earlier ones, so they are undone first
+    for kind, file_path, location, before in reversed(entries):
+        if (kind == FILE_ENTRY):
+            if (before is None):
+                if (os.path.exists(file_path)):
+                    os.remove(file_path)
+                continue
+            directory = os.path.dirname(file_path)
+            if (not os.path.exists(directory)):
+                os.makedirs(directory)
+            with open(file_path, 'wb') as fp:
+                fp.write(before)
+                fp.flush()
+                os.fsync(fp.fileno())
+        else:
+            if (not os.path.exists(file_path)):
+                continue
+            fd = os.open(file_path, os.O_RDWR)
+            try:
+                # An extent that did not exist is given back as a free one
+                os.pwrite(fd, before if before is not None else FREE_HEADER, location)
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+    return len(entries)
@@ -1,33 +1,127 @@
 # System Imports
+from collections import deque, namedtuple
 import threading
+import time
 
 # Local Imports
 from config import Config
 
-class LockManager():
-    """Lock Manager
+class ColumnMask(namedtuple('ColumnMask', ['read', 'write'])):
+    """The lock type of a record lock
 
-    The lock manager handles requests
-    for locks on specific resources,
-    handing them off when available,
-    constructing them if they do not
-    exist, and deconstructing them when
-    they are no longer needed.
+    The bits of read and write are the physical columns
+    of the record the lock reads and writes.  Two masks
+    conflict when one writes a column the other uses.
     """
 
-    def __init__(self):
-        """Initialize a Lock Manger
+    def conflicts(self, other):
+        return bool(self.write & (other.read | other.write) or other.write & self.read)
 
-        This initializes a lock manger which tracks
-        lock resources in a dictionary and handles
-        calls to it in a thread-safe manner.
-        """
+    def covers(self, other):
+        """Whether holding this mask allows everything the other one does"""
 
-        # Internal variables
+        return (other.read & ~(self.read | self.write)) == 0 and (other.write & ~self.write) == 0
+
+    def union(self, other):
+        return ColumnMask(self.read | other.read, self.write | other.write)
+
+class Granule(namedtuple('Granule', ['level', 'id'])):
+    """A resource of the lock hierarchy
+
+    The table holds key ranges, which hold the record
+    locks of their primary keys.  Granules take the
+    intention modes, which announce finer locks below
+    them, as well as shared and exclusive locks.
+    """
+
+TABLE_GRANULE = Granule('Table', None)
+
+def range_granule(key):
+    """Get the key range Granule of a primary key"""
+
+    return Granule('Range', key // Config.lock_range_size)
+
+IS = Config.INTENTION_SHARED_LOCK
+IX = Config.INTENTION_EXCLUSIVE_LOCK
+S = Config.SHARED_LOCK
+SIX = Config.SHARED_INTENTION_EXCLUSIVE_LOCK
+X = Config.EXCLUSIVE_LOCK
+
+# Modes of other Transactions each mode of a Granule is compatible with
+GRANULE_COMPATIBLE = {
+    IS: {IS, IX, S, SIX},
+    IX: {IS, IX},
+    S: {IS, S},
+    SIX: {IS},
+    X: set(),
+}
+
+# Modes whose rights each mode of a Granule includes
+GRANULE_COVERS = {
+    IS: {IS},
+    IX: {IS, IX},
+    S: {IS, S},
+    SIX: {IS, IX, S, SIX},
+    X: {IS, IX, S, SIX, X},
+}
+
+def granule_supremum(held, requested):
+    """Get the weakest mode that includes two modes of a Granule"""
+
+    if (requested in GRANULE_COVERS[held]):
+        return held
+    if (held in GRANULE_COVERS[requested]):
+        return requested
+    # Only shared and intention exclusive are not ordered
+    return SIX
+
+class LockRequest():
+    """A lock request waiting for its resource
+
+    Each waiting request has its own condition on the
+    mutex of its LockShard, so a release wakes only
+    the requests it grants.
+    """
+
+    def __init__(self, lock_type, transaction, condition, upgrade):
+        self.lock_type = lock_type
+        self.transaction = transaction
+        self.condition = condition
+        self.upgrade = upgrade  # Whether the Transaction holds the shared lock and waits to make it exclusive
+        self.granted = False
+        self.victim = False  # Whether the request was failed to break or prevent a deadlock
+
+def timestamp(transaction):
+    """Get the age of a Transaction, lower is older
+
+    A Transaction keeps the timestamp of its first run
+    over its retries, otherwise its id stands in.
+    """
+
+    value = getattr(transaction, 'timestamp', None)
+    return getattr(transaction, 'id', 0) if value is None else value
+
+class LockShard():
+    """The lock tables of the resources hashed to one shard
+
+    Every table and the queues of a shard are only used
+    with its mutex held, so requests for resources of
+    different shards do not wait on each other.
+    """
+
+    def __init__(self):
         self.x_locks = {}  # Exclusive locks which map a key to a single Transaction
         self.s_locks = {}  # Shared locks which map a key to a set of Transactions
+        self.column_locks = {}  # Record locks which map a resource to the ColumnMask of every Transaction
+        self.granule_locks = {}  # Granules mapped to the mode of every Transaction holding them
         self.transaction_dictionary = {}  # Transactions mapped to a set of x/s lock keys
-        self.__lock = threading.Lock()  # Internal mutex (Singular to prevent request/release race conditions)
+        self.queues = {}  # Resources mapped to a deque of the LockRequests waiting for them
+        self.waiting = {}  # Transactions mapped to the (resource, LockRequest) they wait on
+        self.mutex = threading.Lock()
+
+        # Statistics
+        self.num_waits = 0  # Requests that had to wait
+        self.num_timeouts = 0  # Requests that failed after waiting
 
     def __add_transaction(self, key, transaction):
         """Internal method to add transactions
@@ -211,26 +305,430 @@ class LockManager():
         else:
             return False
 
-    def request(self, lock_type, unique_id, transaction):
+    def __remove_column_lock(self, key, transaction):
+        """Internal method for removing a record lock
+
+        Remove the ColumnMask of a Transaction from the
+        internal storage.  If no masks remain, the
+        resource is deleted.
+
+        Parameters
+        ----------
+        key : tuple<int, any>
+            The key used to uniquely identify the lock
+        transaction : Transaction
+            The specific Transaction to associate the lock with
+
+        Returns
+        -------
+        status : bool
+            Whether or not the operation completed successfully
+        """
+
+        holders = self.column_locks.get(key[1])
+        if (holders is None or transaction not in holders):
+            return False
+        del holders[transaction]
+        if (len(holders) == 0):
+            del self.column_locks[key[1]]
+
+        # Maintain the transaction dictionary
+        self.__remove_transaction(key, transaction)
+        return True
+
+    def __remove_granule_lock(self, key, transaction):
+        """Internal method for removing a Granule lock
+
+        Parameters
+        ----------
+        key : tuple<int, Granule>
+            The key used to uniquely identify the lock
+        transaction : Transaction
+            The specific Transaction to associate the lock with
+
+        Returns
+        -------
+        status : bool
+            Whether or not the operation completed successfully
+        """
+
+        holders = self.granule_locks.get(key[1])
+        if (holders is None or transaction not in holders):
+            return False
+        del holders[transaction]
+        if (len(holders) == 0):
+            del self.granule_locks[key[1]]
+
+        # Maintain the transaction dictionary
+        self.__remove_transaction(key, transaction)
+        return True
+
+    def grantable(self, lock_type, unique_id, transaction):
+        """Check whether a lock conflicts with no other Transaction"""
+
+        if (isinstance(unique_id, Granule)):
+            compatible = GRANULE_COMPATIBLE[lock_type]
+            holders = self.granule_locks.get(unique_id, {})
+            return all(holder == transaction or held in compatible for holder, held in holders.items())
+
+        if (isinstance(lock_type, ColumnMask)):
+            holders = self.column_locks.get(unique_id, {})
+            return all(holder == transaction or not lock_type.conflicts(held) for holder, held in holders.items())
+
+        x_holder = self.x_locks.get((Config.EXCLUSIVE_LOCK, unique_id))
+        if (x_holder is not None):
+            return x_holder == transaction
+        if (lock_type == Config.EXCLUSIVE_LOCK):
+            s_holders = self.s_locks.get((Config.SHARED_LOCK, unique_id), ())
+            return len(s_holders) == 0 or (len(s_holders) == 1 and transaction in s_holders)
+        return True
+
+    def grant(self, lock_type, unique_id, transaction):
+        """Take a grantable lock
+
+        Returns
+        -------
+        key : tuple<int, any>
+            The key of the lock the Transaction now holds
+        """
+
+        if (isinstance(unique_id, Granule)):
+            holders = self.granule_locks.setdefault(unique_id, {})
+            held = holders.get(transaction)
+            holders[transaction] = lock_type if held is None else granule_supremum(held, lock_type)
+            key = (Config.GRANULE_LOCK, unique_id)
+            self.__add_transaction(key, transaction)
+            return key
+
+        if (isinstance(lock_type, ColumnMask)):
+            holders = self.column_locks.setdefault(unique_id, {})
+            held = holders.get(transaction)
+            holders[transaction] = lock_type if held is None else held.union(lock_type)
+            key = (Config.COLUMN_LOCK, unique_id)
+            self.__add_transaction(key, transaction)
+            return key
+
+        x_key = (Config.EXCLUSIVE_LOCK, unique_id)
+        if (x_key in self.x_locks):
+            return x_key
+        if (lock_type == Config.EXCLUSIVE_LOCK):
+            # Upgrade the lock
+            self.__remove_shared_lock((Config.SHARED_LOCK, unique_id), transaction)
+            self.__add_exclusive_lock(x_key, transaction)
+            return x_key
+        s_key = (Config.SHARED_LOCK, unique_id)
+        self.__add_shared_lock(s_key, transaction)
+        return s_key
+
+    def wake(self, unique_id):
+        """Grant the waiting requests of a resource
+
+        Requests are granted in FIFO order up to the
+        first one that still conflicts.
+        """
+
+        queue = self.queues.get(unique_id)
+        while (queue):
+            request = queue[0]
+            if (not self.grantable(request.lock_type, unique_id, request.transaction)):
+                break
+            queue.popleft()
+            self.waiting.pop(request.transaction, None)
+            self.grant(request.lock_type, unique_id, request.transaction)
+            request.granted = True
+            request.condition.notify()
+        if (queue is not None and len(queue) == 0):
+            del self.queues[unique_id]
+
+    def withdraw(self, unique_id, request):
+        """Remove a waiting request from its queue"""
+
+        queue = self.queues[unique_id]
+        queue.remove(request)
+        self.waiting.pop(request.transaction, None)
+        if (len(queue) == 0):
+            del self.queues[unique_id]
+        else:
+            self.wake(unique_id)
+
+    def blockers(self, transaction):
+        """Get the Transactions a waiting Transaction waits for
+
+        These are the holders of conflicting locks on the
+        resource and the conflicting requests ahead of it.
+        """
+
+        entry = self.waiting.get(transaction)
+        if (entry is None):
+            return []
+        unique_id, request = entry
+
+        if (isinstance(unique_id, Granule)):
+            compatible = GRANULE_COMPATIBLE[request.lock_type]
+            holders = self.granule_locks.get(unique_id, {})
+            blockers = [holder for holder, held in holders.items() if holder != transaction and held not in compatible]
+            for ahead in self.queues[unique_id]:
+                if (ahead is request):
+                    break
+                if (ahead.lock_type not in compatible):
+                    blockers.append(ahead.transaction)
+            return blockers
+
+        if (isinstance(request.lock_type, ColumnMask)):
+            holders = self.column_locks.get(unique_id, {})
+            blockers = [holder for holder, held in holders.items() if holder != transaction and request.lock_type.conflicts(held)]
+            for ahead in self.queues[unique_id]:
+                if (ahead is request):
+                    break
+                if (request.lock_type.conflicts(ahead.lock_type)):
+                    blockers.append(ahead.transaction)
+            return blockers
+
+        blockers = []
+        x_holder = self.x_locks.get((Config.EXCLUSIVE_LOCK, unique_id))
+        if (x_holder is not None and x_holder != transaction):
+            blockers.append(x_holder)
+        if (request.lock_type == Config.EXCLUSIVE_LOCK):
+            blockers.extend(holder for holder in self.s_locks.get((Config.SHARED_LOCK, unique_id), ()) if holder != transaction)
+        for ahead in self.queues[unique_id]:
+            if (ahead is request):
+                break
+            if (request.lock_type == Config.EXCLUSIVE_LOCK or ahead.lock_type == Config.EXCLUSIVE_LOCK):
+                blockers.append(ahead.transaction)
+        return blockers
+
+    def remove(self, key, transaction):
+        """Remove a lock by its key without waking the requests behind it
+
+        Returns
+        -------
+        status : bool
+            Whether or not the operation completed successfully
+        """
+
+        if (key[0] == Config.SHARED_LOCK):
+            return self.__remove_shared_lock(key, transaction)
+        elif (key[0] == Config.EXCLUSIVE_LOCK):
+            return self.__remove_exclusive_lock(key, transaction)
+        elif (key[0] == Config.COLUMN_LOCK):
+            return self.__remove_column_lock(key, transaction)
+        elif (key[0] == Config.GRANULE_LOCK):
+            return self.__remove_granule_lock(key, transaction)
+        return False
+
+    def release_all(self, transaction):
+        """Remove every lock of a Transaction in the shard
+
+        Returns
+        -------
+        status : bool
+            Whether or not the operation completed successfully
+        """
+
+        # Check if the transaction actually has any locks currently
+        if (transaction in self.transaction_dictionary):
+            # Loop through all keys in the transaction dictionary for the given transaction
+            keys = list(self.transaction_dictionary[transaction])  # Prevents dictionary resize errors
+            for key in keys:
+                if (self.remove(key, transaction) == False):
+                    return False
+
+            # Hand the resources to the requests waiting for them
+            for key in keys:
+                self.wake(key[1])
+
+        return True
+
+
+class LockManager():
+    """Lock Manager
+
+    The lock manager handles requests
+    for locks on specific resources,
+    handing them off when available,
+    constructing them if they do not
+    exist, and deconstructing them when
+    they are no longer needed.
+
+    A request that conflicts waits in the FIFO queue
+    of its resource until a release grants it or its
+    timeout passes.  Upgrades from shared to exclusive
+    wait at the front of the queue, and a second upgrade
+    of the same resource fails right away since the two
+    would wait on each other forever.
+
+    With deadlock detection a request that has to wait
+    first follows the waits-for graph, built from the held
+    locks and the queues, back to its own Transaction.  A
+    cycle is broken by failing the request of one of its
+    Transactions, the youngest or the cheapest to redo.
+    Cycles only form when a request starts to wait, so
+    checking then finds each one as soon as it exists.
+
+    A priority policy prevents cycles instead, since every
+    wait goes from an older Transaction to a younger one
+    (wound-wait) or the other way around (wait-die).  With
+    wait-die a request that would wait for an older
+    Transaction fails.  With wound-wait a request wounds
+    the younger Transactions it would wait for: a waiting
+    one fails right away and a running one aborts at its
+    next query.
+
+    Record locks hold a ColumnMask instead of a shared or
+    exclusive mode, so one lock covers all the columns a
+    query uses on a record.  A Transaction asking for more
+    columns of a record it holds waits like an upgrade.
+
+    Granules lock the table and key ranges with modes
+    from a compatibility matrix.  A Transaction that
+    holds a Granule and requests another mode is given
+    the weakest mode that includes both, waiting like an
+    upgrade if it conflicts.
+
+    The lock tables are split into LockShards by the hash
+    of the resource, so a request or release only takes
+    the mutex of one shard.  Only a request that has to
+    wait takes the mutexes of every shard, in order, to
+    follow the waits-for graph or apply the priorities
+    across them.  The shards a Transaction holds locks in
+    are only added to by the thread running it, so
+    release_all visits them one by one.
+    """
+
+    def __init__(self, detect_deadlocks=None, victim_policy=None, priority_policy=None, num_shards=None):
+        """Initialize a Lock Manger
+
+        This initializes a lock manger which tracks
+        lock resources in a dictionary and handles
+        calls to it in a thread-safe manner.
+
+        Parameters
+        ----------
+        detect_deadlocks : bool
+            Whether waiting requests are checked for deadlocks,
+            otherwise deadlocks last until a timeout
+        victim_policy : str
+            'youngest' fails the request of the Transaction that
+            started last, 'cheapest' the one of the Transaction
+            holding the fewest locks and changes
+        priority_policy : str | None
+            'wound-wait' or 'wait-die' to order the waits by
+            Transaction age, which makes detection unnecessary
+        num_shards : int
+            The number of LockShards resources are hashed to
+
+        The Config settings are used for unset parameters.
+        """
+
+        # Internal variables
+        self.shards = [LockShard() for _ in range(Config.lock_num_shards if num_shards is None else num_shards)]
+        self.transaction_shards = {}  # Transactions mapped to the indices of the shards they requested locks in
+        self.detect_deadlocks = Config.lock_deadlock_detection if detect_deadlocks is None else detect_deadlocks
+        self.victim_policy = Config.lock_deadlock_victim if victim_policy is None else victim_policy
+        self.priority_policy = Config.lock_priority_policy if priority_policy is None else priority_policy
+
+        # Statistics, changed with every shard locked
+        self.num_deadlocks = 0  # Cycles found in the waits-for graph
+        self.num_victims = 0  # Requests failed to break a cycle
+        self.num_detections = 0  # Searches of the waits-for graph
+        self.detection_seconds = 0  # Total time spent searching
+        self.num_wounds = 0  # Younger Transactions wounded by older ones
+        self.num_dies = 0  # Requests failed for waiting on an older Transaction
+
+    def __merged(self, name):
+        """Internal method to merge a table of every shard, without locking them"""
+
+        merged = {}
+        for shard in self.shards:
+            merged.update(getattr(shard, name))
+        return merged
+
+    @property
+    def x_locks(self):
+        return self.__merged('x_locks')
+
+    @property
+    def s_locks(self):
+        return self.__merged('s_locks')
+
+    @property
+    def column_locks(self):
+        return self.__merged('column_locks')
+
+    @property
+    def granule_locks(self):
+        return self.__merged('granule_locks')
+
+    @property
+    def queues(self):
+        return self.__merged('queues')
+
+    @property
+    def waiting(self):
+        return self.__merged('waiting')
+
+    @property
+    def transaction_dictionary(self):
+        """Transactions mapped to the keys of their locks in every shard"""
+
+        merged = {}
+        for shard in self.shards:
+            for transaction, keys in list(shard.transaction_dictionary.items()):
+                merged.setdefault(transaction, set()).update(keys)
+        return merged
+
+    @property
+    def num_waits(self):
+        return sum(shard.num_waits for shard in self.shards)
+
+    @property
+    def num_timeouts(self):
+        return sum(shard.num_timeouts for shard in self.shards)
+
+    def __shard(self, unique_id):
+        """Internal method to get the index of the shard of a resource"""
+
+        return hash(unique_id) % len(self.shards)
+
+    def __lock_all(self):
+        """Internal method to take the mutex of every shard, always in the same order"""
+
+        for shard in self.shards:
+            shard.mutex.acquire()
+
+    def __unlock_all(self):
+        for shard in reversed(self.shards):
+            shard.mutex.release()
+
+    def request(self, lock_type, unique_id, transaction, timeout=None, instant=False):
         """Request a lock
 
         This will handle all logic regarding a request 
-        for a lock. If an exclusive lock on resource
-        exists, deny request. If an exclusive lock is 
-        requested but a shared lock exists, deny
-        request. All other cases, construct lock if
-        needed and return. Returns false for denied
-        request and a lock otherwise.
+        for a lock. A lock that conflicts with the locks
+        of other Transactions, or that would pass requests
+        already waiting for the resource, waits in the
+        queue of the resource.  A Transaction that holds
+        the exclusive lock is given it for any request and
+        holding the shared lock satisfies a shared request.
         
         Parameters
         ----------
-        lock_type: int
+        lock_type: int | ColumnMask
             The specific type of lock requested as
-            defined in Config.
+            defined in Config, or the columns of a
+            record lock.
         unique_id : any
-            Any value to uniquely identify a resource.
+            Any value to uniquely identify a resource, a
+            Granule takes the modes of the hierarchy.
         transaction : Transaction
             The Transaction requesting the lock
+        timeout : float | None
+            Seconds to wait for a conflicting lock, 0 fails
+            right away (Default is Config.lock_timeout)
+        instant : bool
+            Whether to give a record or Granule lock back as
+            soon as it is granted, which only checks that no
+            other Transaction holds a conflicting lock
 
         Returns
         -------
@@ -238,52 +736,284 @@ class LockManager():
             The key for the lock, or None if unsuccessful
         """
 
-        with self.__lock:
-            # Construct keys for different lock types
-            s_key = (Config.SHARED_LOCK, unique_id)
-            x_key = (Config.EXCLUSIVE_LOCK, unique_id)
-
-            # Boolean checks
-            shared_exists = s_key in self.s_locks
-            exclusive_exists = x_key in self.x_locks
-
-            # If an exclusive lock exists, further checks are needed
-            if exclusive_exists:
-                # Only allow the lock if it already belongs to the requesting Transaction
-                if (self.x_locks[x_key] == transaction):
-                    return x_key
+        index = self.__shard(unique_id)
+        shard = self.shards[index]
+        # Only the thread running the Transaction adds to its shards
+        shards = self.transaction_shards.get(transaction)
+        if (shards is None):
+            shards = self.transaction_shards[transaction] = set()
+        shards.add(index)
+
+        if (not instant):
+            with shard.mutex:
+                return self.__request(shard, lock_type, unique_id, transaction, timeout)
+
+        with shard.mutex:
+            if (isinstance(unique_id, Granule) or isinstance(lock_type, ColumnMask)):
+                holders = shard.granule_locks if isinstance(unique_id, Granule) else shard.column_locks
+                previous = holders.get(unique_id, {}).get(transaction)
+            else:
+                holders = None
+                s_key = (Config.SHARED_LOCK, unique_id)
+                x_key = (Config.EXCLUSIVE_LOCK, unique_id)
+                if (shard.x_locks.get(x_key) == transaction):
+                    previous = x_key
+                elif (transaction in shard.s_locks.get(s_key, ())):
+                    previous = s_key
                 else:
-                    return None
-
-            # Construct the requesting lock key
-            lock_key = (lock_type, unique_id)
-            
-            # Check the requested lock type
-            if (lock_type == Config.EXCLUSIVE_LOCK):
-                # If a shared lock already exists, further checks are needed
-                if shared_exists:
-                    # The lock can be upgraded to an X-Lock if it belongs to the requesting Transaction
-                    if (transaction in self.s_locks[s_key]):
-                        # Upgrade the lock
-                        self.__remove_shared_lock(s_key, transaction)
-                        self.__add_exclusive_lock(lock_key, transaction)
-
-                        return lock_key
-                    else:
-                        # The lock is forbidden
+                    previous = None
+            key = self.__request(shard, lock_type, unique_id, transaction, timeout)
+            if (key is not None and key is not False):
+                # Only the lock this request granted is given back
+                if (previous is None):
+                    shard.remove(key, transaction)
+                elif (holders is not None):
+                    holders[unique_id][transaction] = previous
+                elif (key != previous):
+                    # The shared lock was upgraded
+                    shard.remove(key, transaction)
+                    shard.grant(Config.SHARED_LOCK, unique_id, transaction)
+                shard.wake(unique_id)
+            return key
+
+    def __request(self, shard, lock_type, unique_id, transaction, timeout):
+        """Internal lock request, called with the mutex of the shard of the resource held"""
+
+        is_mask = isinstance(lock_type, ColumnMask)
+        is_granule = isinstance(unique_id, Granule)
+        if (is_granule):
+            if (lock_type not in GRANULE_COMPATIBLE):
+                # Unhandled lock type
+                return False
+        elif (lock_type != Config.SHARED_LOCK and lock_type != Config.EXCLUSIVE_LOCK and not is_mask):
+            # Unhandled lock type
+            return False
+        if (timeout is None):
+            timeout = Config.lock_timeout
+
+        # Construct keys for different lock types
+        s_key = (Config.SHARED_LOCK, unique_id)
+        x_key = (Config.EXCLUSIVE_LOCK, unique_id)
+        column_key = (Config.COLUMN_LOCK, unique_id)
+        granule_key = (Config.GRANULE_LOCK, unique_id)
+
+        # Locks the Transaction already holds
+        if (is_granule):
+            held = shard.granule_locks.get(unique_id, {}).get(transaction)
+            if (held is not None):
+                if (lock_type in GRANULE_COVERS[held]):
+                    return granule_key
+                lock_type = granule_supremum(held, lock_type)
+            upgrade = held is not None
+        elif (is_mask):
+            held = shard.column_locks.get(unique_id, {}).get(transaction)
+            if (held is not None and held.covers(lock_type)):
+                return column_key
+            upgrade = held is not None
+        else:
+            if (shard.x_locks.get(x_key) == transaction):
+                return x_key
+            holds_shared = transaction in shard.s_locks.get(s_key, ())
+            if (lock_type == Config.SHARED_LOCK and holds_shared):
+                return s_key
+            upgrade = holds_shared
+
+        # Only an upgrade may pass the waiting requests
+        queue = shard.queues.get(unique_id)
+        if ((not queue or upgrade) and shard.grantable(lock_type, unique_id, transaction)):
+            return shard.grant(lock_type, unique_id, transaction)
+
+        if (timeout <= 0 or getattr(transaction, 'wounded', False)):
+            return None
+        if (upgrade and queue and queue[0].upgrade and not self.detect_deadlocks and self.priority_policy is None):
+            # Two upgrades wait on each other's shared lock
+            return None
+
+        request = LockRequest(lock_type, transaction, threading.Condition(shard.mutex), upgrade)
+        if (queue is None):
+            queue = shard.queues[unique_id] = deque()
+        if (upgrade):
+            queue.appendleft(request)
+        else:
+            queue.append(request)
+        shard.waiting[transaction] = (unique_id, request)
+        shard.num_waits += 1
+
+        if (self.priority_policy is not None or self.detect_deadlocks):
+            # The other shards are locked in order, so the mutex of this one is let go first
+            shard.mutex.release()
+            self.__lock_all()
+            try:
+                # The request may have been granted or failed in the meantime
+                if (request.granted or request.victim):
+                    pass
+                elif (self.priority_policy is not None):
+                    if (not self.__prioritize(transaction)):
+                        shard.withdraw(unique_id, request)
+                        self.num_dies += 1
                         return None
                 else:
-                    # The exclusive lock can be added
-                    self.__add_exclusive_lock(lock_key, transaction)
-                    return lock_key
-            elif (lock_type == Config.SHARED_LOCK):
-                # The shared lock can be added since no exclusive locks precede it
-                self.__add_shared_lock(lock_key, transaction)
-                return lock_key
+                    self.__resolve_deadlocks(transaction)
+            finally:
+                # Keep the mutex of this shard for the wait
+                for other in reversed(self.shards):
+                    if (other is not shard):
+                        other.mutex.release()
+
+        deadline = time.monotonic() + timeout
+        while (not request.granted):
+            remaining = deadline - time.monotonic()
+            if (request.victim):
+                return None
+            if (remaining <= 0):
+                # Give up the place in the queue, which may let the requests behind it in
+                shard.withdraw(unique_id, request)
+                shard.num_timeouts += 1
+                return None
+            request.condition.wait(remaining)
+        if (is_granule):
+            return granule_key
+        if (is_mask):
+            return column_key
+        return x_key if lock_type == Config.EXCLUSIVE_LOCK else s_key
+
+    def __waiting_entry(self, transaction):
+        """Internal method to find what a Transaction waits on, called with every shard locked
+
+        Returns
+        -------
+        entry : tuple<LockShard, any, LockRequest> | None
+            The shard, resource and request, or None if
+            the Transaction does not wait
+        """
+
+        for shard in self.shards:
+            entry = shard.waiting.get(transaction)
+            if (entry is not None):
+                return (shard, *entry)
+        return None
+
+    def __blockers(self, transaction):
+        """Internal method to get the Transactions a waiting Transaction waits for"""
+
+        entry = self.__waiting_entry(transaction)
+        return [] if entry is None else entry[0].blockers(transaction)
+
+    def __fail(self, entry):
+        """Internal method to fail a waiting request to break or prevent a deadlock"""
+
+        shard, unique_id, request = entry
+        request.victim = True
+        shard.withdraw(unique_id, request)
+        request.condition.notify()
+
+    def __find_cycle(self, start):
+        """Internal method to find a cycle of the waits-for graph through a Transaction
+
+        Returns
+        -------
+        cycle : list<Transaction> | None
+            The Transactions of the cycle starting with
+            the given one or None if there is no cycle
+        """
+
+        path = [start]
+        on_path = {start}
+        visited = set()
+        stack = [iter(self.__blockers(start))]
+        while (stack):
+            for blocker in stack[-1]:
+                if (blocker == start):
+                    return path
+                if (blocker in on_path or blocker in visited):
+                    continue
+                path.append(blocker)
+                on_path.add(blocker)
+                stack.append(iter(self.__blockers(blocker)))
+                break
             else:
-                # Unhandled lock type
-                return False
+                stack.pop()
+                visited.add(path[-1])
+                on_path.discard(path.pop())
+        return None
+
+    def __choose_victim(self, cycle):
+        """Internal method to pick the Transaction of a cycle that gives up
 
+        Ties go to the first Transaction of the cycle,
+        the one whose request closed it.
+        """
+
+        if (self.victim_policy == 'cheapest'):
+            def cost(transaction):
+                num_locks = sum(len(shard.transaction_dictionary.get(transaction, ())) for shard in self.shards)
+                return num_locks + len(getattr(transaction, 'undo_log', ()))
+            return min(cycle, key=cost)
+        return max(cycle, key=timestamp)
+
+    def __resolve_deadlocks(self, transaction):
+        """Internal method to break every cycle through a Transaction that started waiting"""
+
+        start = time.perf_counter()
+        while (self.__waiting_entry(transaction) is not None):
+            cycle = self.__find_cycle(transaction)
+            if (cycle is None):
+                break
+            self.num_deadlocks += 1
+            self.num_victims += 1
+            victim = self.__choose_victim(cycle)
+            self.__fail(self.__waiting_entry(victim))
+        self.num_detections += 1
+        self.detection_seconds += time.perf_counter() - start
+
+    def __prioritize(self, transaction):
+        """Internal method to apply the priority policy to a Transaction that started waiting
+
+        Returns
+        -------
+        status : bool
+            Whether the Transaction may wait
+        """
+
+        blockers = self.__blockers(transaction)
+        age = timestamp(transaction)
+        if (self.priority_policy == 'wait-die'):
+            return all(age < timestamp(blocker) for blocker in blockers)
+
+        for blocker in blockers:
+            if (timestamp(blocker) > age and not getattr(blocker, 'wounded', False)):
+                blocker.wounded = True
+                self.num_wounds += 1
+                entry = self.__waiting_entry(blocker)
+                if (entry is not None):
+                    self.__fail(entry)
+        return True
+
+    def held_mode(self, unique_id, transaction):
+        """Get the mode a Transaction holds a Granule in
+
+        Returns
+        -------
+        mode : int | None
+            The mode, or None if the Granule is not held
+        """
+
+        shard = self.shards[self.__shard(unique_id)]
+        with shard.mutex:
+            return shard.granule_locks.get(unique_id, {}).get(transaction)
+
+    def detection_latency(self):
+        """Get the average time spent looking for a deadlock
+
+        Returns
+        -------
+        seconds : float
+            The mean seconds per search of the waits-for graph
+        """
+
+        if (self.num_detections == 0):
+            return 0.0
+        return self.detection_seconds / self.num_detections
 
     def release(self, lock_type, unique_id, transaction):
         """Release a lock
@@ -301,7 +1031,9 @@ class LockManager():
             The specific type of lock requested as
             defined in Config.
         unique_id : any
-            Any value to uniquely identify a resource.
+            Any value to uniquely identify a resource,
+            a Granule is released in whichever mode
+            the Transaction holds it.
         transaction : Transaction
             The Transaction trying to release the lock
 
@@ -312,23 +1044,24 @@ class LockManager():
             otherwise returns False.
         """
 
-        with self.__lock:
+        shard = self.shards[self.__shard(unique_id)]
+        with shard.mutex:
             # Try to successfully release a lock
             try:
                 # Construct the lock key
-                lock_key = (lock_type, unique_id)
-
-                # If releasing exclusive lock, deconstruct it
-                if (lock_type == Config.EXCLUSIVE_LOCK):
-                    return self.__remove_exclusive_lock(lock_key, transaction)
-                
-                # If releasing shared lock, decrement count if other
-                # threads are using it, else deconstruct it
-                elif (lock_type == Config.SHARED_LOCK):
-                    return self.__remove_shared_lock(lock_key, transaction)
+                if (isinstance(unique_id, Granule)):
+                    lock_key = (Config.GRANULE_LOCK, unique_id)
+                elif (lock_type in (Config.SHARED_LOCK, Config.EXCLUSIVE_LOCK, Config.COLUMN_LOCK)):
+                    lock_key = (lock_type, unique_id)
                 else:
                     # Unhandled lock type
                     return False
+
+                status = shard.remove(lock_key, transaction)
+
+                # Hand the resource to the requests waiting for it
+                shard.wake(unique_id)
+                return status
             # Return False if a failure occured
             # WITH DEL, KEY ERROR IS RAISED FOR FAILURE
             except:
@@ -349,21 +1082,10 @@ class LockManager():
             Whether or not the operation completed successfully
         """
 
-        with self.__lock:
-            # Check if the transaction actually has any locks currently
-            if (transaction in self.transaction_dictionary):
-                # Loop through all keys in the transaction dictionary for the given transaction
-                keys = list(self.transaction_dictionary[transaction])  # Prevents dictionary resize errors
-                for key in keys:
-                    # Check the lock type
-                    if (key[0] == Config.SHARED_LOCK):
-                        status = self.__remove_shared_lock(key, transaction)
-                        if (status == False):
-                            return False
-                    elif (key[0] == Config.EXCLUSIVE_LOCK):
-                        status = self.__remove_exclusive_lock(key, transaction)
-                        if (status == False):
-                            return False
-                
-            # All removals completed successfully
-            return True
+        # Each shard is released on its own, no other mutex is held meanwhile
+        status = True
+        for index in sorted(self.transaction_shards.pop(transaction, ())):
+            shard = self.shards[index]
+            with shard.mutex:
+                status = shard.release_all(transaction) and status
+        return status
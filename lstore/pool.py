@@ -1,10 +1,14 @@
 # System imports
 import os
+import shutil
+import struct
+import time
 
 # Local imports
 from config import Config
 from lstore.block import Block
 from lstore.page import Page
+from lstore.segment import SegmentFile
 from lstore.cache_policy import LeakyBucketCachePolicy, LRUCachePolicy, MRUCachePolicy
 from data_structures.priority_queue import PriorityQueue
 from collections import defaultdict
@@ -20,18 +24,508 @@ the rest of pages are stored on disk.
 The cache policy determines exactly how Pages
 are flushed back to disk depending on a specific
 heuristic function.
+
+Blocks are stored in SegmentFiles, one per range
+of block numbers of the base or tail pages, which
+hold the Blocks of every column of that range.
+A flush hands the dirty Blocks of every segment to
+a shared thread pool as one sorted batch.
+
+The memory itself is a SharedBufferPool, which a
+Database shares between the BufferPools of all of
+its tables.  It accounts for the Blocks of every
+table and keeps busy tables from pushing everyone
+else out.
+
+On close the SharedBufferPool records its warm set,
+the cached block keys with their access counts.  A
+reopened table loads its part of the warm set back
+in a background thread, hottest blocks first, so the
+first queries after a restart hit the pool.
 """
 
+# Suffix of a directory of Blocks that a discard set aside
+SET_ASIDE_SUFFIX = '.old'
+
+# Flush writers shared by the BufferPools of every table
+_flush_executor = None
+_flush_executor_lock = threading.Lock()
+
+def _get_flush_executor():
+    global _flush_executor
+    with _flush_executor_lock:
+        if (_flush_executor is None):
+            # Imported on the first flush, concurrent.futures is slow to import
+            from concurrent.futures import ThreadPoolExecutor
+            _flush_executor = ThreadPoolExecutor(max_workers=Config.pool_flush_workers, thread_name_prefix='flush')
+        return _flush_executor
+
+class SharedBufferPool():
+    """A fixed size pool of memory shared by tables
+
+    Holds the cached Blocks of every table along with
+    their pins and dirty marks.  Blocks are keyed by
+    (table path, column, tail flag, block number).
+
+    A table may be given a quota, then it only ever
+    evicts its own Blocks once it reaches the quota.
+    When the pool is full the victim is the coldest
+    Block of the table that is furthest over its fair
+    share (its quota or an equal split of the pool).
+    """
+
+    def __init__(self, max_blocks=Config.pool_max_blocks):
+        """Initialize the SharedBufferPool
+
+        Parameters
+        ----------
+        max_blocks : int
+            The maximum number of Blocks that will reside in memory
+            at any given time
+        """
+
+        # Create a priority queue corresponding to each Block
+        self.queue = PriorityQueue(max_blocks)
+        policy = LRUCachePolicy(self.queue)
+        self.queue.set_policy(policy=policy)
+
+        # Create a list of pins and dirty blocks
+        self.dirty_blocks = set()
+        self.pinned_blocks = defaultdict(int)
+        self.to_evict = {}  # Evicted dirty blocks waiting for their last pin
+        self.lock = threading.RLock()
+
+        # Per table accounting
+        self.resident = defaultdict(int)  # Table path mapped to its number of cached blocks
+        self.quotas = {}  # Table path mapped to its maximum number of cached blocks
+        self.tables = set()
+
+        # Open SegmentFiles of every table keyed by (table path, tail_flg, segment number)
+        self.segments = {}
+        self.segment_lock = threading.Lock()
+
+        # Warm set entries (priority, key) of tables that were not reopened yet keyed by table path
+        self.warm_set = {}
+        self.warm_threads = []
+        self.num_warmed = 0
+
+        # Hit rate metrics, the curve holds (seconds since start, hit rate) for every window of accesses
+        self.start_time = time.monotonic()
+        self.num_hits = 0
+        self.num_misses = 0
+        self.window_hits = 0
+        self.window_accesses = 0
+        self.hit_rate_curve = []
+
+    @staticmethod
+    def blocks_for_memory(memory):
+        """Get the number of Blocks that fit into an amount of memory
+
+        Parameters
+        ----------
+        memory : int
+            The number of bytes
+
+        Returns
+        -------
+        max_blocks : int
+            The number of Blocks, at least one
+        """
+
+        return max(1, memory // (Config.pages_per_block * Config.page_size))
+
+    @property
+    def max_blocks(self):
+        return self.queue.capacity
+
+    def register(self, path, quota=None):
+        """Add a table to the pool
+
+        Parameters
+        ----------
+        path : str
+            The table path
+        quota : int | None
+            The maximum number of Blocks of the table
+            (None only limits it by its fair share once the pool is full)
+        """
+
+        with self.lock:
+            self.tables.add(path)
+            if (quota is not None):
+                self.quotas[path] = quota
+
+    def unregister(self, path):
+        """Remove a table and its quota from the pool
+
+        Parameters
+        ----------
+        path : str
+            The table path
+        """
+
+        with self.lock:
+            self.tables.discard(path)
+            self.quotas.pop(path, None)
+            self.resident.pop(path, None)
+
+    def set_quota(self, path, quota):
+        """Set or remove the quota of a table
+
+        Parameters
+        ----------
+        path : str
+            The table path
+        quota : int | None
+            The maximum number of Blocks or None to remove the quota
+        """
+
+        with self.lock:
+            if (quota is None):
+                self.quotas.pop(path, None)
+                return
+            self.quotas[path] = quota
+            while (self.resident[path] > quota):
+                self.__evict(self.__coldest(path))
+
+    def resize(self, max_blocks):
+        """Change the size of the pool
+
+        Parameters
+        ----------
+        max_blocks : int
+            The new maximum number of Blocks
+        """
+
+        with self.lock:
+            self.queue.capacity = max_blocks
+            while (len(self.queue) > max_blocks):
+                self.__evict(self.__coldest(self.__most_over_share()))
+
+    def usage(self, path):
+        """Get the number of cached Blocks of a table
+
+        Parameters
+        ----------
+        path : str
+            The table path
+
+        Returns
+        -------
+        num_blocks : int
+            The number of Blocks of the table in memory
+        """
+
+        return self.resident[path]
+
+    def get(self, key):
+        """Get a cached Block or None"""
+
+        with self.lock:
+            item = self.queue.get(key)
+            if (item is not None):
+                return item[2]
+            return self.to_evict.get(key)
+
+    def admit(self, key, block):
+        """Add a Block or mark it as used
+
+        Parameters
+        ----------
+        key : tuple
+            The key of the Block
+        block : Block
+            The Block
+        """
+
+        with self.lock:
+            if (key in self.queue):
+                # A clean block loaded by the warm set loader gives way to the copy a query read
+                item = self.queue.map[key]
+                if (item[2] is not block and key not in self.dirty_blocks):
+                    item[2] = block
+                self.queue.push(key, block)
+                return
+
+            # A dirty block that was evicted while pinned comes back still dirty
+            if (self.to_evict.pop(key, None) is not None):
+                self.dirty_blocks.add(key)
+
+            path = key[0]
+            quota = self.quotas.get(path)
+            if (quota is not None and self.resident[path] >= quota):
+                # A table at its quota replaces one of its own blocks
+                self.__evict(self.__coldest(path))
+            elif (len(self.queue) >= self.queue.capacity):
+                self.__evict(self.__coldest(self.__most_over_share(path)))
+
+            self.queue.push(key, block)
+            self.resident[path] += 1
+
+    def drop(self, keys):
+        """Remove Blocks without writing them
+
+        Parameters
+        ----------
+        keys : list<tuple>
+            The keys of the Blocks
+        """
+
+        with self.lock:
+            for key in keys:
+                if (self.queue.remove(key) is not None):
+                    self.resident[key[0]] -= 1
+                self.dirty_blocks.discard(key)
+                self.pinned_blocks.pop(key, None)
+                self.to_evict.pop(key, None)
+
+    def keys(self, path):
+        """Get the keys of the cached Blocks of a table"""
+
+        with self.lock:
+            return [key for key in self.queue.map if key[0] == path]
+
+    def pin(self, key):
+        with self.lock:
+            self.pinned_blocks[key] += 1
+
+    def unpin(self, key):
+        with self.lock:
+            self.pinned_blocks[key] -= 1
+            # we never should go below zero
+            assert self.pinned_blocks[key] >= 0
+
+            # check if we should evict the block
+            if self.pinned_blocks[key] == 0 and key in self.to_evict:
+                block = self.to_evict.pop(key)
+                # reverse eviction if key already in a queue
+                if key not in self.queue:
+                    block.write()
+
+    def __coldest(self, path):
+        """Get the key of the least valuable Block of a table"""
+
+        # The top of the heap is the coldest block overall
+        if (self.queue.data[0][1][0] == path):
+            return self.queue.data[0][1]
+        return min((item for item in self.queue.data if item[1][0] == path), key=lambda item: item[0])[1]
+
+    def __most_over_share(self, requester=None):
+        """Get the path of the table that holds the most blocks over its share
+
+        On a tie the table asking for memory gives up one of its own blocks.
+        """
+
+        fair_share = self.queue.capacity / max(1, len(self.tables))
+        return max(
+            (path for path, count in self.resident.items() if count > 0),
+            key=lambda path: (self.resident[path] - self.quotas.get(path, fair_share), path == requester)
+        )
+
+    def __evict(self, key):
+        """Remove a Block, writing it first if it is dirty"""
+
+        item = self.queue.remove(key)
+        self.resident[key[0]] -= 1
+        if (key in self.dirty_blocks):
+            self.dirty_blocks.remove(key)
+            if (self.pinned_blocks[key] == 0):
+                item[2].write()
+            else:
+                self.to_evict[key] = item[2]
+
+    def record_access(self, hit):
+        """Count a block lookup for the hit rate metrics
+
+        Parameters
+        ----------
+        hit : bool
+            Whether the block was found in the pool
+        """
+
+        if (hit):
+            self.num_hits += 1
+            self.window_hits += 1
+        else:
+            self.num_misses += 1
+        self.window_accesses += 1
+        if (self.window_accesses >= Config.pool_hit_rate_window):
+            self.hit_rate_curve.append((time.monotonic() - self.start_time, self.window_hits / self.window_accesses))
+            self.window_hits = 0
+            self.window_accesses = 0
+
+    def hit_rate(self):
+        """Get the fraction of block lookups that hit the pool
+
+        Returns
+        -------
+        rate : float
+            The hit rate since the pool was started
+        """
+
+        accesses = self.num_hits + self.num_misses
+        if (accesses == 0):
+            return 0.0
+        return self.num_hits / accesses
+
+    def save_warm_set(self, fp, db_path):
+        """Write the cached block keys and their access counts
+
+        Entries are written as <table name length> <table name>
+        <column_id> <tail_flg> <block_num> <priority>.
+
+        Parameters
+        ----------
+        fp : file
+            The binary file to write to
+        db_path : str
+            The database path, table paths are stored relative to it
+        """
+
+        with self.lock:
+            entries = [(item[1], item[0]) for item in self.queue.data]
+        for key, priority in entries:
+            name = os.path.relpath(key[0], db_path).encode()
+            fp.write(struct.pack('<i', len(name)))
+            fp.write(name)
+            fp.write(struct.pack('<iiiq', key[1], key[2], key[3], priority))
+
+    def load_warm_set(self, fp, db_path):
+        """Read a warm set written by save_warm_set
+
+        The blocks are loaded once their table is opened.
+
+        Parameters
+        ----------
+        fp : file
+            The binary file to read from
+        db_path : str
+            The database path the table names are relative to
+        """
+
+        warm_set = defaultdict(list)
+        while True:
+            length = fp.read(4)
+            if (len(length) < 4):
+                break
+            name = fp.read(struct.unpack('<i', length)[0]).decode()
+            column_id, tail_flg, block_num, priority = struct.unpack('<iiiq', fp.read(20))
+            path = os.path.join(db_path, name)
+            warm_set[path].append((priority, (path, column_id, tail_flg, block_num)))
+
+        with self.lock:
+            for path, entries in warm_set.items():
+                # The hottest blocks are loaded first
+                entries.sort(reverse=True)
+                self.warm_set[path] = entries
+            self.start_time = time.monotonic()
+            self.hit_rate_curve = []
+
+    def start_warming(self, bufferpool):
+        """Load the warm set of a table in a background thread
+
+        Parameters
+        ----------
+        bufferpool : BufferPool
+            The BufferPool of the reopened table
+        """
+
+        with self.lock:
+            entries = self.warm_set.pop(bufferpool.base_path, None)
+        if (not entries):
+            return
+
+        thread = threading.Thread(target=self.__warm, args=(bufferpool, entries), daemon=True)
+        self.warm_threads.append(thread)
+        thread.start()
+
+    def wait_warming(self, timeout=None):
+        """Wait for every warm set loader to finish
+
+        Parameters
+        ----------
+        timeout : float | None
+            The seconds to wait for each loader
+        """
+
+        for thread in self.warm_threads:
+            thread.join(timeout)
+
+    def __warm(self, bufferpool, entries):
+        path = bufferpool.base_path
+        for priority, key in entries:
+            with self.lock:
+                # Warming never evicts anything
+                if (path not in self.tables or len(self.queue) >= self.queue.capacity):
+                    return
+                if (key in self.queue or key in self.to_evict):
+                    continue
+
+            block = bufferpool._read_block(*key)
+
+            with self.lock:
+                quota = self.quotas.get(path)
+                if (len(self.queue) >= self.queue.capacity or (quota is not None and self.resident[path] >= quota)):
+                    return
+                if (key in self.queue or key in self.to_evict or len(block.pages) == 0):
+                    continue
+                self.queue.push(key, block, priority)
+                self.resident[path] += 1
+                self.num_warmed += 1
+
+    def get_segment(self, path, tail_flg, segment_num, block_size, journal=None):
+        """Get a SegmentFile, opening it if needed"""
+
+        key = (path, tail_flg, segment_num)
+        with self.segment_lock:
+            segment = self.segments.get(key)
+            if segment is None:
+                segment_path = os.path.join(path, ('base' if tail_flg == 0 else 'tail'), f"{segment_num}.seg")
+                segment = SegmentFile(segment_path, block_size, journal=journal)
+                self.segments[key] = segment
+            return segment
+
+    def sync_segments(self, path):
+        """Make every write to the open SegmentFiles of a table durable"""
+
+        with self.segment_lock:
+            segments = [segment for key, segment in self.segments.items() if key[0] == path]
+        for segment in segments:
+            segment.sync()
+
+    def close_segments(self, path, tail_flg=None):
+        """Close the SegmentFiles of a table
+
+        Parameters
+        ----------
+        path : str
+            The table path
+        tail_flg : int | None
+            Only close the base or tail segments (Default closes both)
+        """
+
+        with self.segment_lock:
+            for key in [key for key in self.segments if key[0] == path and (tail_flg is None or key[1] == tail_flg)]:
+                self.segments.pop(key).close()
+
+    def segment_numbers(self, path, tail_flg):
+        """Get the numbers of the SegmentFiles of a table that exist on disk"""
+
+        directory = os.path.join(path, ('base' if tail_flg == 0 else 'tail'))
+        return [int(file_name.split('.')[0]) for file_name in os.listdir(directory) if file_name.endswith('.seg')]
+
+
 class BufferPool():
-    """A fixed size pool of memory
+    """The pages of one table
 
-    The BufferPool represents a fixed size pool
-    of memory in RAM which reads/writes data to
-    and from disk whenever elements are needed
-    to be exchanged.
+    The BufferPool of a table reads/writes its data
+    to and from disk whenever elements are needed
+    to be exchanged.  The Blocks themselves are held
+    by a SharedBufferPool which may be shared with
+    other tables.
     """
 
-    def __init__(self, base_path, num_columns, max_blocks=Config.pool_max_blocks, block_size = Config.pages_per_block):
+    def __init__(self, base_path, num_columns, max_blocks=Config.pool_max_blocks, block_size = Config.pages_per_block, use_segments=Config.pool_segment_files, blocks_per_segment=Config.pool_blocks_per_segment, shared_pool=None, journal=None):
         """Initialize the BufferPool
 
         Initialize the BufferPool with a set of
@@ -44,81 +538,271 @@ class BufferPool():
             data will be stored (<database>/<table>)
         max_blocks : int
             The maximum number of Blocks that will reside in memory
-            at any given time
+            at any given time (only used without a shared_pool)
+        use_segments : bool
+            Whether Blocks are stored in SegmentFiles or
+            in one file per Block
+        blocks_per_segment : int
+            The number of block numbers that share a SegmentFile
+        shared_pool : SharedBufferPool | None
+            The memory shared with other tables
+            (Default is a pool of max_blocks for this table alone)
+        journal : UndoJournal | None
+            The journal that files are saved to before
+            they are first overwritten after a checkpoint
         """
 
         # Create the base path if it doesn't exist
         self.base_path = base_path
-        self.max_blocks = max_blocks
+        self.journal = journal
         self.block_size = block_size
+        self.use_segments = use_segments
+        self.blocks_per_segment = blocks_per_segment
+        self.num_columns = num_columns
         if (not os.path.exists(os.path.join(base_path, 'base'))):
             os.makedirs(os.path.join(base_path, 'base'))
             os.makedirs(os.path.join(base_path, 'tail'))
+
+        # Files set aside by a discard that the meta data never stopped describing
+        for name in ('base', 'tail'):
+            directory = os.path.join(base_path, name)
+            if (os.path.exists(directory + SET_ASIDE_SUFFIX)):
+                shutil.rmtree(directory, ignore_errors=True)
+                os.rename(directory + SET_ASIDE_SUFFIX, directory)
+
+        self.__make_column_directories()
         
-        # Create a folder for each column
-        for i in range(num_columns):
-            if (not os.path.exists(os.path.join(base_path, 'base', str(i)))):
-                os.makedirs(os.path.join(base_path, 'base', str(i)))
-            if (not os.path.exists(os.path.join(base_path, 'tail', str(i)))):
-                os.makedirs(os.path.join(base_path, 'tail', str(i)))
-        
-        # Create a priority queue corresponding to each Block
-        self.queue = PriorityQueue(max_blocks)
-        policy = LRUCachePolicy(self.queue)
-        self.queue.set_policy(policy=policy)
+        if (shared_pool is None):
+            shared_pool = SharedBufferPool(max_blocks)
+        self.shared_pool = shared_pool
+        self.shared_pool.register(base_path)
+        self.shared_pool.start_warming(self)
 
-        # Create a list of pins and dirty blocks
-        # self.pinned_blocks
-        self.dirty_blocks = set()
-        self.pinned_blocks = defaultdict(int)
-        self.__lock = threading.Lock()
-        self.to_evict_flag = defaultdict(int)
+        # Totals over every flush for reporting write-back throughput
+        self.num_flushed_blocks = 0
+        self.num_flushed_bytes = 0
+        self.num_flush_writes = 0
+        self.flush_seconds = 0.0
 
     def flush(self):
         """Flush all dirty blocks to disk
 
-        This writes all remaining dirty blocks to disk
-        to prevent data loss and also clears the queue.
+        This writes all remaining dirty blocks of the
+        table to disk to prevent data loss and also
+        drops its blocks from the pool.
         """
 
-        # Loop through all dirty_blocks and write them to disk
-        for key in self.dirty_blocks:
-            if key in self.queue:
-                block = self.queue[key][2] 
-                block.write()
+        start = time.perf_counter()
+
+        shared_pool = self.shared_pool
+        with shared_pool.lock:
+            keys = [key for key in shared_pool.dirty_blocks if key[0] == self.base_path]
+        blocks = []
+        for key in keys:
+            block = shared_pool.get(key)
+            assert block is not None
+            blocks.append(block)
+        self.__write_blocks(blocks, keep_pages=False)
+
+        # Remove all items of the table in the queue and pinned/dirty lists
+        shared_pool.drop(shared_pool.keys(self.base_path) + keys)
+        self.flush_seconds += time.perf_counter() - start
+
+    def checkpoint(self):
+        """Write every dirty block to disk and keep it cached
+
+        The blocks stay in the pool as clean blocks.  Evicted
+        blocks that still wait for their last pin are written
+        as well, and every write is durable once this returns.
+        The caller keeps the pages of the table from changing.
+        """
+
+        start = time.perf_counter()
+
+        shared_pool = self.shared_pool
+        with shared_pool.lock:
+            keys = [key for key in shared_pool.dirty_blocks if key[0] == self.base_path]
+            blocks = [shared_pool.get(key) for key in keys]
+            evicted = [key for key in shared_pool.to_evict if key[0] == self.base_path]
+            blocks.extend(shared_pool.to_evict.pop(key) for key in evicted)
+            for key in keys:
+                shared_pool.dirty_blocks.discard(key)
+        self.__write_blocks(blocks, keep_pages=True)
+        shared_pool.sync_segments(self.base_path)
+        self.flush_seconds += time.perf_counter() - start
+
+    def __write_blocks(self, blocks, keep_pages):
+        """Write blocks, grouped by the segment that stores them"""
+
+        batches = defaultdict(list)
+        for block in blocks:
+            if (len(block.pages) == 0):
+                continue
+            if (block.segment is None):
+                self.num_flushed_bytes += len(block.pages) * Config.page_size
+                self.num_flush_writes += 1
+                self.num_flushed_blocks += 1
+                block.write(keep_pages)
             else:
-                assert 1 == 0
+                batches[block.segment].append(block)
+
+        # Segments are written in parallel, a single one is written right away
+        if (len(batches) == 1):
+            results = [self.__write_batch(*batches.popitem(), keep_pages)]
+        else:
+            results = list(_get_flush_executor().map(lambda item: self.__write_batch(*item, keep_pages), batches.items()))
+        for num_blocks, num_bytes, num_writes in results:
+            self.num_flushed_blocks += num_blocks
+            self.num_flushed_bytes += num_bytes
+            self.num_flush_writes += num_writes
+
+    def __write_batch(self, segment, blocks, keep_pages):
+        """Write the dirty blocks of one segment"""
+
+        num_bytes, num_writes = segment.write_blocks([(block.column, block.block_id, block.pages) for block in blocks])
+        for block in blocks:
+            block.written(keep_pages)
+        return len(blocks), num_bytes, num_writes
+
+    def flush_rate(self):
+        """Get the write-back throughput
+
+        Returns
+        -------
+        rate : float
+            The bytes written per second over every flush
+        """
+
+        if (self.flush_seconds == 0):
+            return 0.0
+        return self.num_flushed_bytes / self.flush_seconds
+
+    def close(self):
+        """Flush all dirty blocks and close the segment files
+
+        Segment files are opened again when they are used.
+        """
 
-        # Remove all items in the queue and pinned/dirty lists
-        self.queue.clear()
-        self.dirty_blocks = []
+        self.flush()
+        self.shared_pool.close_segments(self.base_path)
     
+    def discard(self, tail_flg):
+        """Drop every base or tail block without writing it
+
+        The blocks are removed from the pool.  With a journal
+        their files are saved to it and deleted from disk,
+        otherwise the directory is set aside until
+        drop_set_aside is called once the meta data of the
+        table no longer refers to it, and a crash before
+        that brings it back when the table is opened.
+
+        Parameters
+        ----------
+        tail_flg : int
+            Whether to drop the tail blocks or the base blocks
+        """
+
+        self.shared_pool.drop([key for key in self.shared_pool.keys(self.base_path) if key[2] == tail_flg])
+        self.shared_pool.close_segments(self.base_path, tail_flg)
+
+        directory = os.path.join(self.base_path, ('base' if tail_flg == 0 else 'tail'))
+        if (self.journal is None and not os.path.exists(directory + SET_ASIDE_SUFFIX)):
+            os.rename(directory, directory + SET_ASIDE_SUFFIX)
+            os.makedirs(directory)
+            self.__make_column_directories()
+            return
+
+        for name in os.listdir(directory):
+            path = os.path.join(directory, name)
+            if (os.path.isdir(path)):
+                # Block files of an older table
+                for file_name in os.listdir(path):
+                    self.__remove(os.path.join(path, file_name))
+            else:
+                self.__remove(path)
+
+    def drop_set_aside(self):
+        """Delete the directories set aside by discard"""
+
+        for name in ('base', 'tail'):
+            directory = os.path.join(self.base_path, name) + SET_ASIDE_SUFFIX
+            if (os.path.exists(directory)):
+                shutil.rmtree(directory)
+
+    def __make_column_directories(self):
+        """Create a folder for each column, used without SegmentFiles"""
+
+        for i in range(self.num_columns if not self.use_segments else 0):
+            if (not os.path.exists(os.path.join(self.base_path, 'base', str(i)))):
+                os.makedirs(os.path.join(self.base_path, 'base', str(i)))
+            if (not os.path.exists(os.path.join(self.base_path, 'tail', str(i)))):
+                os.makedirs(os.path.join(self.base_path, 'tail', str(i)))
+
+    def __remove(self, path):
+        """Remove a file, saving it to the journal first"""
+
+        if (self.journal is not None):
+            self.journal.save_file(path)
+        os.remove(path)
+
+    def truncate(self, num_cells, column_id, tail_flg=0, page_capacity=None):
+        """Shrink a column to its first cells
+
+        Blocks past the last remaining page are dropped
+        without writing them and their files are deleted.
+
+        Parameters
+        ----------
+        num_cells : int
+            The number of cells the column keeps
+        column_id : int
+            The column to shrink
+        tail_flg : int
+            Whether the column is a tail column or not
+        page_capacity : int | None
+            The cells used per page (Default is every cell of a page)
+        """
+
+        if (page_capacity is None):
+            page_capacity = Config.page_size // Config.page_cell_size
+        num_pages = -(-num_cells // page_capacity)
+        first_dropped = -(-num_pages // self.block_size)
+
+        keys = [key for key in self.shared_pool.keys(self.base_path) if key[1] == column_id and key[2] == tail_flg and key[3] >= first_dropped]
+        self.shared_pool.drop(keys)
+
+        for segment_num in self.shared_pool.segment_numbers(self.base_path, tail_flg):
+            segment = self._get_segment(tail_flg, segment_num * self.blocks_per_segment)
+            for key in segment.keys():
+                if key[0] == column_id and key[1] >= first_dropped:
+                    segment.free(*key)
+
+        # Block files of an older table
+        directory = os.path.join(self.base_path, ('base' if tail_flg == 0 else 'tail'), str(column_id))
+        if (os.path.exists(directory)):
+            for file_name in os.listdir(directory):
+                if int(file_name.split('.')[0]) >= first_dropped:
+                    self.__remove(os.path.join(directory, file_name))
+
+        if num_pages == 0:
+            return
+
+        # The last block keeps its first pages and the last page keeps its first cells
+        block_num = (num_pages - 1) // self.block_size
+        key = (self.base_path, column_id, tail_flg, block_num)
+        self._pin_block(key)
+        block = self._get_block(*key)
+        del block.pages[num_pages - block_num * self.block_size:]
+        block.pages[-1].num_cells = num_cells - (num_pages - 1) * page_capacity
+        self._unpin_block(key)
+        self._maintain_cache(*key, block)
+        self.shared_pool.dirty_blocks.add(key)
+
     def _pin_block(self, key):
-        with self.__lock:
-            self.pinned_blocks[key] += 1
+        self.shared_pool.pin(key)
             
     def _unpin_block(self, key):
-        with self.__lock:
-            self.pinned_blocks[key] -= 1
-            # we never should go below zero
-            assert self.pinned_blocks[key] >= 0
-            
-            # check if we should evict the block
-            if self.pinned_blocks[key] == 0 and self.to_evict_flag[key]:
-                # reverse eviction if key already in a queue
-                if key not in self.queue:
-                    block = self._get_block(*key)
-                    block.write()   
-                self.to_evict_flag[key] = 0
-                    
-                
-    
-    def _evict_block(self, key, block):
-        with self.__lock:
-            if self.pinned_blocks[key] == 0:
-                block.write()
-            else:
-                self.to_evict_flag[key] = 1
+        self.shared_pool.unpin(key)
 
     def add_page(self, page, page_num, column_id, tail_flg=0, cache_update=True):
         block_num = page_num // self.block_size
@@ -135,7 +819,7 @@ class BufferPool():
         if cache_update:
             # we use the combination of table path, column, tail and block_num as the unique identifier of the block
             self._maintain_cache(self.base_path, column_id, tail_flg, block_num, block)
-            self.dirty_blocks.add((self.base_path, column_id, tail_flg, block_num))
+            self.shared_pool.dirty_blocks.add(key)
         else:
             block.write()
 
@@ -173,29 +857,35 @@ class BufferPool():
         if cache_update:
             # we use the combination of table path, column, tail and block_num as the unique identifier of the block
             self._maintain_cache(self.base_path, column_id, tail_flg, block_num, block)
-            self.dirty_blocks.add((self.base_path, column_id, tail_flg, block_num))
+            self.shared_pool.dirty_blocks.add(key)
         else:
             block.write()
             
     def _get_block(self, path, column_id, tail_flg, block_num):
         key = (path, column_id, tail_flg, block_num)
         
-        if key in self.queue:
-            block = self.queue[key][2]
-        else:
-            path = os.path.join(self.base_path, ('base' if tail_flg == 0 else 'tail'), str(column_id))
-            block = Block(path, column=column_id, block_id=block_num, size=self.block_size)
-            block.read()
+        block = self.shared_pool.get(key)
+        self.shared_pool.record_access(block is not None)
+        if block is None:
+            block = self._read_block(path, column_id, tail_flg, block_num)
+        return block
+
+    def _read_block(self, path, column_id, tail_flg, block_num):
+        """Read a block from disk without looking in the pool"""
+
+        path = os.path.join(self.base_path, ('base' if tail_flg == 0 else 'tail'), str(column_id))
+        segment = self._get_segment(tail_flg, block_num) if self.use_segments else None
+        block = Block(path, column=column_id, block_id=block_num, size=self.block_size, segment=segment, journal=self.journal)
+        block.read()
         return block
+
+    def _get_segment(self, tail_flg, block_num):
+        """Get the SegmentFile that stores a block number, opening it if needed"""
+
+        return self.shared_pool.get_segment(self.base_path, tail_flg, block_num // self.blocks_per_segment, self.block_size, journal=self.journal)
     
     def _maintain_cache(self, path, column_id, tail_flg, block_num, block):
-        key = (path, column_id, tail_flg, block_num)
-        value = block
-        result = self.queue.push(key, value)
-        # check if the evicted block is dirty and remove it
-        if result is not None and (result[1] in self.dirty_blocks):
-            self._evict_block(result[1], result[2])
-            self.dirty_blocks.remove(result[1])            
+        self.shared_pool.admit((path, column_id, tail_flg, block_num), block)
         
 
 
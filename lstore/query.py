@@ -10,12 +10,27 @@ than parsing SQL queries.
 """
 
 from lstore.table import Table, Record
-from lstore.index import Index
 from lstore.page import Page
 import lstore.utils as utils
 from errors import *
 from config import Config
 import datetime
+import functools
+
+def logged(query_function):
+    """Keep a logged change from running during a checkpoint
+
+    The change and its log record happen together, so a
+    checkpoint sees both of them or neither.
+    """
+
+    @functools.wraps(query_function)
+    def wrapper(self, *args):
+        if self.table.wal is None:
+            return query_function(self, *args)
+        with self.table.checkpoint_latch.shared():
+            return query_function(self, *args)
+    return wrapper
 
 class Query:
     """
@@ -28,6 +43,7 @@ class Query:
         self.table = table
         pass
 
+    @logged
     def delete(self, primary_key):
         """Delete a record given a primary_key
 
@@ -51,9 +67,15 @@ class Query:
         else:
             assert len(rids) == 1
             rid = rids[0]
+            # the log keeps the deleted values so the delete can be undone
+            if self.table.wal is not None:
+                old_columns = self.table.page_directory.get_version_attributes(rid, list(range(self.table.num_columns)))
             self.table.index.maintain_delete(rid)
             # assert self.table.index.locate(column=self.table.primary_key, value=columns[0])[0] == new_rid
-            return self.table.delete(rid)
+            deleted = self.table.delete(rid)
+            if self.table.wal is not None:
+                self.table.wal.log_delete(self.table.name, primary_key, old_columns)
+            return deleted
         if (primary_key in self.table):
             # TODO: Eventually check for LOCK state
 
@@ -68,6 +90,7 @@ class Query:
     # Return True upon succesful insertion
     # Returns False if insert fails for whatever reason
     """
+    @logged
     def insert(self, *columns):
         # as is, this SHOULD insert a new record, however, this needs to be tested first
 
@@ -95,6 +118,8 @@ class Query:
         try:
             self.table.index.maintain_insert(columns, new_rid)
             self.table.page_directory.add_record(columns_values)
+            if self.table.wal is not None:
+                self.table.wal.log_insert(self.table.name, columns[self.table.primary_key], columns)
             return True
         except Exception as e:
             return False
@@ -149,24 +174,12 @@ class Query:
 
         for rid in relevant_rids:
             # check for tombstone
-            if self.table.page_directory.get_column_value(rid, Config.rid_column_idx) == -1:
+            if self.table.page_directory.is_deleted(rid):
                 continue
 
-            res_columns = []
-            # gather the column_values from the base record
-            for column_id in range(len(projected_columns_index)):
-                if projected_columns_index[column_id]:
-                    res_columns.append(self.table.page_directory.get_column_value(rid, column_id + Config.column_data_offset, tail_flg=0))
-
-            # get the rid corresponding to the relevant version
-            tail_flg, target_rid = self.table.page_directory.get_rid_for_version(rid, relative_version)
-            # if there is record in tail - do the updates, otherwise return the base record data since there is not updates
-            if tail_flg:
-                schema = self.table.page_directory.get_column_value(target_rid, Config.schema_encoding_column_idx, tail_flg)
-                for column_id in range(len(projected_columns_index)):
-                    if utils.get_bit(schema, column_id):
-                        # this means that the column has been updated
-                        res_columns[column_id] = self.table.page_directory.get_column_value(target_rid, column_id + Config.column_data_offset, tail_flg)
+            # gather the projected column values as of the requested version
+            projected_columns = [column_id for column_id in range(len(projected_columns_index)) if projected_columns_index[column_id]]
+            res_columns = self.table.page_directory.get_version_attributes(rid, projected_columns, relative_version)
 
             records.append(
                 Record(
@@ -185,6 +198,7 @@ class Query:
     # Returns True if update is succesful
     # Returns False if no records exist with given key or if the target record cannot be accessed due to 2PL locking
     """
+    @logged
     def update(self, primary_key, *columns):
         # found_rids = []
 
@@ -206,7 +220,7 @@ class Query:
 
         for rid in found_rids:
             # check for tombstone
-            if self.table.page_directory.get_column_value(rid, Config.rid_column_idx) != -1:
+            if not self.table.page_directory.is_deleted(rid):
                 relevant_rids.append(rid)
 
         if len(relevant_rids) == 0:
@@ -225,25 +239,26 @@ class Query:
         base_schema = self.table.page_directory.get_column_value(rid, Config.schema_encoding_column_idx, tail_flg=0)
 
         # create new tail record based off of base record data
-        new_rid = self.table.page_directory.num_tail_records
-
-        columns_values[Config.rid_column_idx] = new_rid
         # get current timestamp as an integer
         columns_values[Config.timestamp_column_idx] = int(datetime.datetime.now().timestamp())
         columns_values[Config.indirection_column_idx] = base_ind
         columns_values[Config.tps_and_brid_column_idx] = base_rid
 
         # code below maintains cumulative approach to tail records
-
-
-        # if there is another update
-        if base_ind != -1:
-            # get current values of record
-            old_record = self.select(primary_key, self.table.primary_key, [1]*len(columns))[0]
-
+        # the latest tail record already holds every column changed so far, so copy those forward
+        if self.table.page_directory.is_cumulative and base_ind != -1:
+            tail_schema = self.table.page_directory.get_column_value(base_ind, Config.schema_encoding_column_idx, tail_flg=1)
             for i in range(len(columns)):
-                if utils.get_bit(base_schema, i):
-                    columns_values[i + Config.column_data_offset] = old_record.columns[i]
+                if utils.get_bit(tail_schema, i):
+                    columns_values[i + Config.column_data_offset] = self.table.page_directory.get_tail_value(base_ind, i, tail_schema)
+
+        # the log keeps the overwritten values so the update can be undone
+        if self.table.wal is not None:
+            old_columns = [None] * len(columns)
+            updated = [i for i in range(len(columns)) if columns[i] is not None]
+            if updated:
+                for i, value in zip(updated, self.table.page_directory.get_version_attributes(rid, updated)):
+                    old_columns[i] = value
 
         try:
             self.table.index.maintain_update(rid, columns)
@@ -257,7 +272,9 @@ class Query:
         # for all columns passed in check if they are Nonetype,
         # if not add it tail record and adjust schema accordingly
         # else, add -1 as place holder
-        new_schema = base_schema
+        # a non-cumulative tail schema only has the bits of this update,
+        # while the base schema always keeps the union of every update
+        new_schema = base_schema if self.table.page_directory.is_cumulative else 0
         for i in range(len(columns)):
             if columns[i] is not None:
                 columns_values[i + Config.column_data_offset] = columns[i]
@@ -265,23 +282,18 @@ class Query:
         
         columns_values[Config.schema_encoding_column_idx] = new_schema
 
-        # add record to tail page
-        self.table.page_directory.add_record(columns_values, tail_flg=1)
-
-        self.table.page_directory.set_column_value(
-            rid,
-            Config.indirection_column_idx,
-            new_value=new_rid,
-            tail_flg=0
-        )
+        # add record to tail page, the page directory assigns its RID
+        new_rid = self.table.page_directory.add_record(columns_values, tail_flg=1)
+
+        # the indirection and schema share a header page when the table packs its metadata
+        self.table.page_directory.set_header_values(rid, {
+            Config.indirection_column_idx: new_rid,
+            Config.schema_encoding_column_idx: base_schema | new_schema,
+        })
+        self.table.page_directory.version_index.append(rid, new_rid)
+        if self.table.wal is not None:
+            self.table.wal.log_update(self.table.name, primary_key, columns, old_columns)
         # assert self.table.page_directory.get_column_value(rid, Config.indirection_column_idx, tail_flg=0) == new_rid
-
-        self.table.page_directory.set_column_value(
-            rid,
-            Config.schema_encoding_column_idx,
-            new_value=columns_values[Config.schema_encoding_column_idx],
-            tail_flg=0
-        )
         # assert self.table.page_directory.get_column_value(rid, Config.schema_encoding_column_idx, tail_flg=0) == columns_values[Config.schema_encoding_column_idx]
         
         # assert len(self.table.index.locate(self.table.primary_key, primary_key)) == 1
@@ -323,21 +335,10 @@ class Query:
         result = 0
 
         for rid in relevant_rids:
-            if self.table.page_directory.get_column_value(rid, Config.rid_column_idx) == -1:
+            if self.table.page_directory.is_deleted(rid):
                 continue
-            # get the column_value from the base record
-            value = self.table.page_directory.get_column_value(rid, aggregate_column_index + Config.column_data_offset, tail_flg=0)
-
-            # get the rid corresponding to the relevant version
-            tail_flg, target_rid = self.table.page_directory.get_rid_for_version(rid, relative_version)
-            # if there is record in tail - do the updates, otherwise return the base record data since there is not updates
-            if tail_flg:
-                schema = self.table.page_directory.get_column_value(target_rid, Config.schema_encoding_column_idx, tail_flg)
-                if utils.get_bit(schema, aggregate_column_index):
-                    # this means that the column has been updated
-                    value = self.table.page_directory.get_column_value(target_rid, aggregate_column_index + Config.column_data_offset, tail_flg)
-
-            result += value
+            # get the column value as of the requested version
+            result += self.table.page_directory.get_version_attributes(rid, [aggregate_column_index], relative_version)[0]
 
         return result
     
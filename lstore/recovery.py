@@ -0,0 +1,166 @@
+"""
+This is responsible for bringing a database back to
+its last committed state after a crash.
+
+Every table is first restored to its last checkpoint
+from its UndoJournal.  The WriteAheadLog is then read
+once and replayed logically, through the queries of
+each table, starting at the checkpoint of the table:
+
+  * records after the checkpoint are redone if their
+    Transaction committed (queries outside of a
+    Transaction always count as committed)
+  * records up to the checkpoint of Transactions that
+    aborted after it or never finished are undone in
+    reverse order, since the checkpoint included them
+
+Logical replay fits the table files, which carry no
+page LSNs to decide whether a page already holds a
+change.  A recovered table is closed, which checkpoints
+it, after which the log can be emptied.
+"""
+
+# System imports
+from collections import defaultdict, namedtuple
+import os
+import time
+
+# Local imports
+from lstore.journal import restore
+from lstore.query import Query
+from lstore.table import Table, read_checkpoint
+from lstore.wal import (
+    ABORT_RECORD, AUTOCOMMIT_TRANSACTION, COMMIT_RECORD,
+    DELETE_RECORD, INSERT_RECORD, UPDATE_RECORD, read_records
+)
+
+RecoveryStats = namedtuple('RecoveryStats', ['seconds', 'num_restored', 'num_records', 'num_redone', 'num_undone'])
+
+def restore_tables(path, names):
+    """Restore tables to their last checkpoint
+
+    Parameters
+    ----------
+    path : str
+        The path of the database
+    names : list<str>
+        The names of the tables
+
+    Returns
+    -------
+    cuts : dict<str, int>
+        The LSN of the checkpoint of every table
+    num_restored : int
+        The number of extents and files written back
+    """
+
+    cuts = {}
+    num_restored = 0
+    for name in names:
+        table_path = os.path.join(path, name)
+        generation, lsn = read_checkpoint(table_path)
+        num_restored += restore(table_path, generation)
+        cuts[name] = lsn
+    return cuts, num_restored
+
+def recover(path, wal, catalog, shared_pool=None):
+    """Recover every table of a database from its log
+
+    Parameters
+    ----------
+    path : str
+        The path of the database
+    wal : WriteAheadLog
+        The log of the database, emptied once every
+        table is recovered
+    catalog : Catalog
+        The tables of the database
+    shared_pool : SharedBufferPool | None
+        The memory the recovered tables use
+
+    Returns
+    -------
+    stats : RecoveryStats
+        How long recovery took and how much it did
+    """
+
+    start = time.perf_counter()
+    cuts, num_restored = restore_tables(path, catalog.names())
+
+    records = list(read_records(wal.path))
+    committed = {AUTOCOMMIT_TRANSACTION}
+    for record in records:
+        if (record.type == COMMIT_RECORD):
+            committed.add(record.transaction_id)
+
+    # The changes to make to each table, in order
+    redo = defaultdict(list)
+    pending = defaultdict(list)  # Transaction id mapped to its (table, record) up to a checkpoint
+    for record in records:
+        if (record.type == COMMIT_RECORD):
+            pending.pop(record.transaction_id, None)
+        elif (record.type == ABORT_RECORD):
+            for name, change in reversed(pending.pop(record.transaction_id, [])):
+                if (record.lsn > cuts[name]):
+                    redo[name].append((change, True))
+        elif (record.table in cuts):
+            if (record.lsn > cuts[record.table]):
+                if (record.transaction_id in committed):
+                    redo[record.table].append((record, False))
+            elif (record.transaction_id not in committed):
+                pending[record.transaction_id].append((record.table, record))
+
+    # Transactions that never finished are undone last, newest first
+    losers = sorted(((change.lsn, name, change) for changes in pending.values() for name, change in changes), reverse=True)
+    for _, name, change in losers:
+        redo[name].append((change, True))
+
+    num_redone = 0
+    num_undone = 0
+    for name in sorted(redo):
+        num_columns, primary_key = catalog.get(name)
+        table = Table(path, name, num_columns, primary_key, force_merge=True, shared_pool=shared_pool, wal=wal)
+        table.wal = None
+        query = Query(table)
+        for record, undo in redo[name]:
+            apply(query, record, undo)
+            if (undo):
+                num_undone += 1
+            else:
+                num_redone += 1
+        table.wal = wal
+        table.close()
+
+    wal.truncate()
+    return RecoveryStats(time.perf_counter() - start, num_restored, len(records), num_redone, num_undone)
+
+def apply(query, record, undo=False):
+    """Redo or undo a logged change
+
+    Parameters
+    ----------
+    query : Query
+        A Query on the table of the record
+    record : LogRecord
+        The change
+    undo : bool
+        Whether to undo the change instead
+    """
+
+    if (record.type == INSERT_RECORD):
+        if (undo):
+            query.delete(record.key)
+        else:
+            query.insert(*record.new_values)
+    elif (record.type == UPDATE_RECORD):
+        if (undo):
+            # An update of the primary key moved the record to its new key
+            key = record.new_values[query.table.primary_key]
+            query.update(record.key if key is None else key, *record.old_values)
+        else:
+            query.update(record.key, *record.new_values)
+    elif (record.type == DELETE_RECORD):
+        if (undo):
+            query.insert(*record.old_values)
+        else:
+            query.delete(record.key)
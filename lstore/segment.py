@@ -0,0 +1,270 @@
+"""
+This is responsible for storing the Blocks of a
+page range in a single file called a SegmentFile.
+Writing every Block to its own file leaves large
+tables with hundreds of thousands of tiny files and
+opening, flushing or copying them is dominated by
+metadata system calls.
+
+A SegmentFile is split into fixed size extents and
+each extent holds one Block of any column.  The
+file is opened once and Blocks are read and written
+in place with os.pread and os.pwrite.
+
+Data is stored on disk with the following format:
+
+[
+    column_id (4 Bytes)
+    block_num (4 Bytes)
+    n_pages (4 Bytes)
+    [
+        num_cells (4 Bytes)
+        data (M Bytes)
+    ] x block_size
+] x n_extents
+
+Where:
+  * column_id is -1 for an extent that is free
+  * only the first n_pages pages of an extent are used
+  * M is defined as the total number of bytes per page
+
+Extents carry their own header, so the extent map is
+rebuilt by reading the headers when the file is opened.
+
+A batch of Blocks is written in extent order and runs of
+full Blocks in adjacent extents are coalesced into one
+vectored os.pwritev call.
+
+A SegmentFile with an UndoJournal saves every extent
+to it before the extent is first overwritten.
+"""
+
+# System imports
+import os
+import struct
+import threading
+
+# Local imports
+from config import Config
+from lstore.page import Page
+
+HEADER = struct.Struct('<iii')
+PAGE_HEADER = struct.Struct('<i')
+
+try:
+    IOV_MAX = os.sysconf('SC_IOV_MAX')
+except (AttributeError, ValueError, OSError):
+    IOV_MAX = 1024
+
+class SegmentFile():
+    """A file holding the Blocks of a page range
+
+    Maps every (column, block number) pair that was
+    written to the extent that holds it.
+    """
+
+    def __init__(self, path, block_size=Config.pages_per_block, journal=None):
+        """Open or create a SegmentFile
+
+        Parameters
+        ----------
+        path : str
+            The path of the segment file on disk
+        block_size : int
+            The number of pages per Block
+        journal : UndoJournal | None
+            The journal extents are saved to before
+            they are overwritten
+        """
+
+        self.path = path
+        self.block_size = block_size
+        self.journal = journal
+        self.page_stride = PAGE_HEADER.size + Config.page_size
+        self.extent_size = HEADER.size + block_size * self.page_stride
+        self.extents = {}  # (column_id, block_num) mapped to an extent number
+        self.free_extents = []
+        self.lock = threading.Lock()
+
+        self.fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        size = os.fstat(self.fd).st_size
+        self.num_extents = -(-size // self.extent_size)
+        for extent in range(self.num_extents):
+            column_id, block_num, _ = HEADER.unpack(os.pread(self.fd, HEADER.size, extent * self.extent_size))
+            if (column_id == -1):
+                self.free_extents.append(extent)
+            else:
+                self.extents[(column_id, block_num)] = extent
+
+    def __contains__(self, key):
+        return key in self.extents
+
+    def read_pages(self, column_id, block_num):
+        """Read the pages of a Block
+
+        Parameters
+        ----------
+        column_id : int
+            The column of the Block
+        block_num : int
+            The Block number within the column
+
+        Returns
+        -------
+        pages : list<Page> | None
+            The stored pages or None if the
+            Block was never written
+        """
+
+        extent = self.extents.get((column_id, block_num))
+        if (extent is None):
+            return None
+
+        # The whole extent is read with one system call
+        data = os.pread(self.fd, self.extent_size, extent * self.extent_size)
+        n_pages = HEADER.unpack_from(data)[2]
+        pages = []
+        for i in range(n_pages):
+            start = HEADER.size + i * self.page_stride
+            p = Page(data=bytearray(data[start + PAGE_HEADER.size:start + self.page_stride]))
+            p.num_cells = PAGE_HEADER.unpack_from(data, start)[0]
+            pages.append(p)
+        return pages
+
+    def write_pages(self, column_id, block_num, pages):
+        """Write the pages of a Block into its extent
+
+        A Block that is written for the first time is
+        given a free extent or one at the end of the file.
+
+        Parameters
+        ----------
+        column_id : int
+            The column of the Block
+        block_num : int
+            The Block number within the column
+        pages : list<Page>
+            The pages of the Block
+        """
+
+        self.write_blocks([(column_id, block_num, pages)])
+
+    def write_blocks(self, blocks):
+        """Write the pages of several Blocks
+
+        The Blocks are written in the order of their
+        extents and full Blocks that sit in adjacent
+        extents share a single write.
+
+        Parameters
+        ----------
+        blocks : list<tuple>
+            The (column_id, block_num, pages) of every Block
+
+        Returns
+        -------
+        stats : tuple<int>
+            The number of bytes written and the
+            number of write calls it took
+        """
+
+        with self.lock:
+            placed = sorted((self.__allocate(column_id, block_num), column_id, block_num, pages) for column_id, block_num, pages in blocks)
+        if (self.journal is not None):
+            self.journal.save_extents(self, [item[0] for item in placed])
+
+        num_bytes = 0
+        num_writes = 0
+        run = []  # The buffers of the current run of adjacent extents
+        run_start = 0
+        next_extent = None
+        for extent, column_id, block_num, pages in placed:
+            assert len(pages) <= self.block_size
+            buffers = [HEADER.pack(column_id, block_num, len(pages))]
+            for p in pages:
+                buffers.append(PAGE_HEADER.pack(p.num_cells))
+                buffers.append(p.data)
+
+            # A run only continues into the very next extent and only if it ended in a full extent
+            if (run and (extent != next_extent or len(run) + len(buffers) > IOV_MAX)):
+                num_bytes += self.__write_run(run, run_start)
+                num_writes += 1
+                run = []
+            if (not run):
+                run_start = extent
+            run.extend(buffers)
+            next_extent = extent + 1 if len(pages) == self.block_size else None
+
+        if (run):
+            num_bytes += self.__write_run(run, run_start)
+            num_writes += 1
+        return num_bytes, num_writes
+
+    def __allocate(self, column_id, block_num):
+        """Get the extent of a Block, giving it one if it has none yet"""
+
+        key = (column_id, block_num)
+        extent = self.extents.get(key)
+        if (extent is None):
+            if (self.free_extents):
+                extent = self.free_extents.pop()
+            else:
+                extent = self.num_extents
+                self.num_extents += 1
+            self.extents[key] = extent
+        return extent
+
+    def __write_run(self, buffers, extent):
+        offset = extent * self.extent_size
+        size = sum(len(buffer) for buffer in buffers)
+        if (hasattr(os, 'pwritev')):
+            written = os.pwritev(self.fd, buffers, offset)
+        else:
+            written = 0
+
+        # Short writes finish with a plain write of the rest
+        if (written < size):
+            os.pwrite(self.fd, b''.join(buffers)[written:], offset + written)
+        return size
+
+    def free(self, column_id, block_num):
+        """Give the extent of a Block back for reuse
+
+        Parameters
+        ----------
+        column_id : int
+            The column of the Block
+        block_num : int
+            The Block number within the column
+        """
+
+        with self.lock:
+            extent = self.extents.pop((column_id, block_num), None)
+            if (extent is None):
+                return
+            self.free_extents.append(extent)
+        if (self.journal is not None):
+            self.journal.save_extents(self, [extent])
+        os.pwrite(self.fd, HEADER.pack(-1, -1, 0), extent * self.extent_size)
+
+    def sync(self):
+        """Make every write durable"""
+
+        os.fsync(self.fd)
+
+    def keys(self):
+        """Get every stored Block
+
+        Returns
+        -------
+        keys : list<tuple>
+            The (column_id, block_num) pairs
+        """
+
+        with self.lock:
+            return list(self.extents)
+
+    def close(self):
+        """Close the file handle"""
+
+        os.close(self.fd)
@@ -8,6 +8,7 @@ the periodical merge of its corresponding page ranges.
 """
 
 # System Imports
+from array import array
 import copy
 import math
 import os
@@ -17,15 +18,31 @@ import time
 
 # Local Imports
 from config import Config
+from data_structures.bitmap import Bitmap
 from data_structures.queue import Queue
 from errors import ColumnDoesNotExist, PrimaryKeyOutOfBoundsError, TotalColumnsInvalidError
-from lstore.index import Index
-from lstore.lock_manager import LockManager
+from lstore.compactor import TailCompactor
+from lstore.delta_buffer import DeltaBuffer
+from lstore.journal import UndoJournal
+from lstore.lock_manager import LockManager, TABLE_GRANULE
 from lstore.page import Page
 from lstore.pool import BufferPool
+from lstore.version_index import VersionIndex
 import lstore.utils as utils
+from utilities.latch import BlockingLatch
 import itertools
 
+CHECKPOINT_FILE = 'checkpoint.data'
+
+# Header of a resident metadata checkpoint the base pages may have moved past
+DIRTY_RESIDENT_COLUMNS = -1
+
+# Where the values of the first record of each sparse tail page start in the value stream
+TAIL_OFFSETS_FILE = 'tail_offsets.data'
+
+# Marks a vacuum whose saved slot map is newer than the base pages, which are truncated on open
+VACUUM_PENDING_FILE = 'vacuum.pending'
+
 class Record:
     """A Record stores multiple columns for a single row
     """
@@ -56,13 +73,42 @@ class PageDirectory:
     indexable.
     """
 
-    def __init__(self, db_path, table_name, num_columns, num_records=0, num_tail_records=0):
+    def __init__(self, db_path, table_name, num_columns, num_records=0, num_tail_records=0, is_cumulative=Config.lstore_is_cumulative, is_sparse=Config.lstore_sparse_tails, is_packed=Config.lstore_packed_headers, shared_pool=None, journal=None):
         self.db_path = db_path
         self.table_name = table_name
         self.num_records = num_records
         self.num_tail_records = num_tail_records
         self.num_columns = num_columns
-        self.num_tail_pages = 0
+        # Only sealed (full) tail pages are counted, those are the ones the merge may pick up
+        self.num_tail_pages = num_tail_records // (Config.page_size // 8)
+        # Cumulative tail records carry every column updated so far, so the latest
+        # version is always one hop away. Non-cumulative tail records only carry
+        # the columns of their own update and reads walk the chain instead.
+        self.is_cumulative = is_cumulative
+
+        # Sparse tail records only write their metadata and the schema encoded columns.
+        # The values are packed back to back into one extra physical column (the value stream).
+        # tail_page_offsets holds where the values of each tail page start in it and is saved
+        # with the meta data.  Within a page the offsets follow from the schema bits, so the
+        # offsets of each record are only kept for the active tail page and for the sealed
+        # pages read most recently, the others are worked out from their schema page again.
+        self.is_sparse = is_sparse
+        self.sparse_column_id = num_columns
+        self.tail_page_offsets = array('q')
+        self.active_tail_offsets = (-1, array('q'))  # The active tail page and the offsets of its records
+        self.sealed_tail_offsets = {}  # Sealed tail page mapped to the offsets of its records, oldest first
+        self.tail_offsets_lock = threading.Lock()
+        self.num_tail_values = 0
+
+        # Packed base records keep their metadata cells next to each other in one extra
+        # physical base column (the header pages), so updating the indirection and schema
+        # of a record reads and writes a single page instead of one page per column.
+        # Headers never straddle two pages, so a page holds 102 headers of five cells and
+        # its last two cells stay unused.  Header pages therefore do not line up with the
+        # data pages (512 records each), and a slot's header page is slot // header_capacity.
+        self.is_packed = is_packed
+        self.header_column_id = num_columns
+        self.header_capacity = (Config.page_size // 8) // Config.column_data_offset
             
         # assert self.num_columns == num_columns
         # self.data = []
@@ -70,40 +116,344 @@ class PageDirectory:
         #     self.data.append({'Base':[], 'Tail':[]})
         self.bufferpool = BufferPool(
             base_path=os.path.join(db_path, table_name),
-            num_columns=num_columns
+            num_columns=num_columns + 1,
+            shared_pool=shared_pool,
+            journal=journal
         )
 
+        # Tail RIDs of each deeply read record in version order
+        self.version_index = VersionIndex(self)
+
+        # Tail appends go into the active page of each column held by the delta buffer
+        self.delta_buffer = DeltaBuffer(self.bufferpool)
+        for column_id in range(Config.column_data_offset if self.is_sparse else self.num_columns):
+            self.delta_buffer.load(column_id, self.num_tail_records)
+        if self.is_sparse:
+            # the schema pages the offsets are worked out from may be in the delta buffer
+            self.__load_tail_page_offsets()
+            self.delta_buffer.load(self.sparse_column_id, self.num_tail_values)
+
+        # Base RIDs are logical, slots maps each one to its physical position in the base pages
+        # (-1 once vacuum reclaimed it) and dead_counts is the number of deleted slots per base page
+        self.slots = array('q')
+        self.dead_counts = array('q')
+        self.num_slots = 0
+        self.__load_slots()
+        self.__finish_vacuum()
+
+        # The base indirection, RID and schema columns are read by nearly every query,
+        # so they are also kept resident in one array per column indexed by RID.
+        # Writes go through to the pages and the arrays are checkpointed on close.
+        self.resident_columns = {
+            Config.indirection_column_idx: array('q'),
+            Config.rid_column_idx: array('q'),
+            Config.schema_encoding_column_idx: array('q'),
+        }
+        resident_loaded = self.__load_resident_columns()
+
+        # One bit per base RID that is set while the record is deleted
+        self.tombstones = Bitmap()
+        self.__load_tombstones(saved=resident_loaded)
+
+    def __load_slots(self):
+        """
+        Restore the slot map and free-space map, older tables never moved a record so their slots are their RIDs
+        """
+        page_capacity = Config.page_size // 8
+        slots_path = os.path.join(self.db_path, self.table_name, 'slots.data')
+        if os.path.exists(slots_path):
+            with open(slots_path, 'rb') as fp:
+                self.num_slots = struct.unpack('<q', fp.read(8))[0]
+                self.slots.fromfile(fp, self.num_records)
+                self.dead_counts.fromfile(fp, math.ceil(self.num_slots / page_capacity))
+            return
+
+        self.num_slots = self.num_records
+        self.slots = array('q', range(self.num_records))
+        self.dead_counts = array('q', [0]) * math.ceil(self.num_slots / page_capacity)
+        for slot in range(self.num_slots):
+            if self.__read_base_cell(slot, Config.rid_column_idx) == -1:
+                self.dead_counts[slot // page_capacity] += 1
+
+    def __finish_vacuum(self):
+        """
+        Truncate the base pages to the saved slot map if a crash interrupted a vacuum
+        """
+        pending_path = os.path.join(self.db_path, self.table_name, VACUUM_PENDING_FILE)
+        if os.path.exists(pending_path):
+            self.__truncate_base(self.num_slots)
+            self.bufferpool.checkpoint()
+            os.remove(pending_path)
+
+    def __load_resident_columns(self):
+        """
+        Restore the resident metadata arrays from their checkpoint or rebuild them from the base pages
+        Returns whether the checkpoint was used
+        """
+        metadata_path = os.path.join(self.db_path, self.table_name, 'metadata.data')
+        if os.path.exists(metadata_path):
+            with open(metadata_path, 'r+b') as fp:
+                # a checkpoint from another number of records, or marked dirty, is stale
+                if struct.unpack('<q', fp.read(8))[0] == self.num_records:
+                    for column_id in sorted(self.resident_columns):
+                        self.resident_columns[column_id].fromfile(fp, self.num_records)
+                    if self.bufferpool.journal is None:
+                        # without the undo journal the pages may change on disk before the next
+                        # checkpoint, so a crash until then has to rebuild the arrays
+                        fp.seek(0)
+                        fp.write(struct.pack('<q', DIRTY_RESIDENT_COLUMNS))
+                        fp.flush()
+                        os.fsync(fp.fileno())
+                    return True
+
+        for column_id, values in self.resident_columns.items():
+            del values[:]
+            for rid in range(self.num_records):
+                values.append(self.__read_base_cell(rid, column_id))
+        return False
+
+    def checkpoint_resident_columns(self):
+        """
+        Write the resident metadata arrays so that the next open does not have to scan the base pages
+        The header is the number of records, or DIRTY_RESIDENT_COLUMNS while the table is open without a journal
+        """
+        metadata_path = os.path.join(self.db_path, self.table_name, 'metadata.data')
+        with open(metadata_path, 'wb') as fp:
+            fp.write(struct.pack('<q', self.num_records))
+            for column_id in sorted(self.resident_columns):
+                self.resident_columns[column_id].tofile(fp)
+
+    def __load_tombstones(self, saved=True):
+        """
+        Restore the tombstone bitmap or rebuild it from the resident RID column
+        The saved bitmap is only used if the resident arrays came from their checkpoint as well
+        """
+        tombstones_path = os.path.join(self.db_path, self.table_name, 'tombstones.data')
+        if saved and os.path.exists(tombstones_path):
+            with open(tombstones_path, 'rb') as fp:
+                tombstones = Bitmap.fromfile(fp)
+            if len(tombstones) == self.num_records:
+                self.tombstones = tombstones
+                return
+
+        self.tombstones = Bitmap(self.num_records)
+        for rid, value in enumerate(self.resident_columns[Config.rid_column_idx]):
+            if value == -1:
+                self.tombstones.set(rid)
+
+    def save_tombstones(self):
+        """
+        Write the tombstone bitmap next to the table's meta data
+        """
+        tombstones_path = os.path.join(self.db_path, self.table_name, 'tombstones.data')
+        with open(tombstones_path, 'wb') as fp:
+            self.tombstones.tofile(fp)
+
+    def is_deleted(self, rid):
+        """
+        Whether a base record is deleted, without reading its RID column
+        """
+        return self.tombstones[rid]
+
+    def save_slots(self, sync=False):
+        """
+        Write the slot map and free-space map next to the table's meta data
+        With sync the file is on disk once this returns
+        """
+        slots_path = os.path.join(self.db_path, self.table_name, 'slots.data')
+        with open(slots_path, 'wb') as fp:
+            fp.write(struct.pack('<q', self.num_slots))
+            self.slots.tofile(fp)
+            self.dead_counts.tofile(fp)
+            if sync:
+                fp.flush()
+                os.fsync(fp.fileno())
+
+    def get_slot(self, rid):
+        """
+        Get the physical position of a base record or -1 if its space was reclaimed
+        """
+        return self.slots[rid]
+
+    def __load_tail_page_offsets(self):
+        """
+        Restore the value stream offsets of the tail pages, older tables and offsets saved with
+        another number of tail records are rebuilt with a scan of the tail schema pages
+        """
+        page_capacity = Config.page_size // 8
+        num_pages = math.ceil(self.num_tail_records / page_capacity)
+        offsets_path = os.path.join(self.db_path, self.table_name, TAIL_OFFSETS_FILE)
+        loaded = False
+        if os.path.exists(offsets_path):
+            with open(offsets_path, 'rb') as fp:
+                num_tail_records, num_tail_values = struct.unpack('<qq', fp.read(16))
+                if num_tail_records == self.num_tail_records:
+                    self.tail_page_offsets.fromfile(fp, num_pages)
+                    self.num_tail_values = num_tail_values
+                    loaded = True
+        if not loaded:
+            for page_num in range(num_pages):
+                self.tail_page_offsets.append(self.num_tail_values)
+                offsets = self.__read_tail_offsets(page_num)
+                last = page_num * page_capacity + len(offsets) - 1
+                schema = self.get_column_value(last, Config.schema_encoding_column_idx, tail_flg=1)
+                self.num_tail_values = offsets[-1] + utils.count_bits(schema)
+
+        # appends go on from the offsets of the last page unless it is full
+        if self.num_tail_records % page_capacity != 0:
+            self.active_tail_offsets = (num_pages - 1, self.__read_tail_offsets(num_pages - 1))
+
+    def save_tail_page_offsets(self):
+        """
+        Write the value stream offsets of the tail pages next to the table's meta data
+        """
+        offsets_path = os.path.join(self.db_path, self.table_name, TAIL_OFFSETS_FILE)
+        with open(offsets_path, 'wb') as fp:
+            fp.write(struct.pack('<qq', self.num_tail_records, self.num_tail_values))
+            self.tail_page_offsets.tofile(fp)
+
+    def __read_tail_offsets(self, page_num):
+        """
+        Work out the value stream offsets of the records of a tail page from its schema page
+        """
+        page_capacity = Config.page_size // 8
+        schema_page = self.get_tail_page(page_num, Config.schema_encoding_column_idx)
+        offset = self.tail_page_offsets[page_num]
+        offsets = array('q')
+        for cell in range(min(page_capacity, self.num_tail_records - page_num * page_capacity)):
+            offsets.append(offset)
+            offset += utils.count_bits(schema_page.read(cell))
+        return offsets
+
+    def __tail_value_offset(self, rid):
+        """
+        Get where the values of a sparse tail record start in the value stream
+        """
+        page_num, cell = divmod(rid, Config.page_size // 8)
+        active_page, offsets = self.active_tail_offsets
+        if page_num == active_page:
+            return offsets[cell]
+        offsets = self.sealed_tail_offsets.get(page_num)
+        if offsets is None:
+            # sealed pages never change, so building the offsets twice is harmless
+            offsets = self.__read_tail_offsets(page_num)
+            with self.tail_offsets_lock:
+                self.__cache_sealed_offsets(page_num, offsets)
+        return offsets[cell]
+
+    def __cache_sealed_offsets(self, page_num, offsets):
+        """
+        Keep the offsets of a sealed tail page, dropping the ones kept longest past the limit
+        Called with the tail offsets lock held
+        """
+        self.sealed_tail_offsets[page_num] = offsets
+        while len(self.sealed_tail_offsets) > Config.sparse_offset_cache_pages:
+            del self.sealed_tail_offsets[next(iter(self.sealed_tail_offsets))]
+
+    def __append_cell(self, column_id, tail_flg, position, value):
+        """
+        Write a value into the cell right after the last one of a physical column.
+        Returns True if a new page had to be created for it.
+        Tail cells are written into the delta buffer instead.
+        """
+        if tail_flg:
+            return self.delta_buffer.append(column_id, position, value)
+
+        # allocate new page if we are at full capacity
+        # if (not self.data[i][page_class]) or (not self.data[i][page_class][-1].has_capacity()):
+        #     self.data[i][page_class].append(Page())
+        # self.data[i][page_class][-1].write(column_value)
+        page_capacity = Config.page_size // 8
+        page_num = position // page_capacity
+        if position % page_capacity == 0: # this means we need to create a new page
+            new_page = Page()
+            new_page.write(value)
+            self.bufferpool.add_page(new_page, page_num, column_id=column_id, tail_flg=tail_flg)
+            return True
+
+        last_page = self.bufferpool.get_page(page_num=page_num, column_id=column_id, tail_flg=tail_flg)
+        last_page.write(value)
+        self.bufferpool.update_page(last_page, page_num, column_id=column_id, tail_flg=tail_flg)
+        return False
+
+    def __append_header(self, position, values):
+        """
+        Write the metadata cells of a new base record into the header page after the last record.
+        """
+        page_num = position // self.header_capacity
+        if position % self.header_capacity == 0:
+            page = Page()
+            for value in values:
+                page.write(value)
+            self.bufferpool.add_page(page, page_num, column_id=self.header_column_id, tail_flg=0)
+            return
+
+        page = self.bufferpool.get_page(page_num=page_num, column_id=self.header_column_id, tail_flg=0)
+        for value in values:
+            page.write(value)
+        self.bufferpool.update_page(page, page_num, column_id=self.header_column_id, tail_flg=0)
+
     def add_record(self, columns, tail_flg = 0):
         """
-        Accepts list of column values and adds the values to the latest base page of each column
+        Accepts list of column values and adds the values to the latest base page of each column.
+        A tail record gets its RID assigned here and it is returned.
         """
         assert len(columns) == self.num_columns
 
+        if tail_flg == 0:
+            self.__add_record(columns, tail_flg)
+            for column_id, values in self.resident_columns.items():
+                values.append(columns[column_id])
+            self.tombstones.append(columns[Config.rid_column_idx] == -1)
+            self.slots.append(self.num_slots)
+            if self.num_slots % (Config.page_size // 8) == 0:
+                self.dead_counts.append(0)
+            self.num_slots += 1
+            return self.num_records - 1
+
+        # the RID is taken and the record is written under one lock
+        with self.delta_buffer.lock:
+            rid = self.num_tail_records
+            columns[Config.rid_column_idx] = rid
+            self.__add_record(columns, tail_flg)
+        return rid
+
+    def __add_record(self, columns, tail_flg):
         # page_class = 'Base' if tail_flg == 0 else 'Tail'
+        # new base records always go into the first slot after the live ones
+        num_records = (self.num_slots if tail_flg == 0 else self.num_tail_records)
 
         new_page = False
-        for i, column_value in enumerate(columns):
-            # allocate new page if we are at full capacity
-            # if (not self.data[i][page_class]) or (not self.data[i][page_class][-1].has_capacity()):
-            #     self.data[i][page_class].append(Page())
-            # self.data[i][page_class][-1].write(column_value)
-            page_capacity = Config.page_size // 8
-            num_records = (self.num_records if tail_flg == 0 else self.num_tail_records)
-            # last_page = self.bufferpool.get_page(page_num=last_page_id, column_id=i, tail_flg=tail_flg)
-            if num_records % page_capacity == 0: # this means we need to create a new page
-                new_page = Page()
-                new_page.write(column_value)
-                page_num = num_records // page_capacity
-                self.bufferpool.add_page(new_page, page_num, column_id=i, tail_flg=tail_flg)
-                if not new_page:
-                    new_page = True
-            else:
-                last_page_num = num_records // page_capacity
-                last_page = self.bufferpool.get_page(page_num=last_page_num, column_id=i, tail_flg=tail_flg)
-                last_page.write(column_value)
-                self.bufferpool.update_page(last_page, last_page_num, column_id=i, tail_flg=tail_flg)
+        if tail_flg and self.is_sparse:
+            # the metadata is always written, the data columns only if they are in the schema
+            for i in range(Config.column_data_offset):
+                new_page = self.__append_cell(i, tail_flg, num_records, columns[i]) or new_page
+
+            schema = columns[Config.schema_encoding_column_idx]
+            page_num, cell = divmod(num_records, Config.page_size // 8)
+            if cell == 0:
+                # the active page is full, its offsets are kept like those of a read page
+                with self.tail_offsets_lock:
+                    active_page, offsets = self.active_tail_offsets
+                    if active_page != -1:
+                        self.__cache_sealed_offsets(active_page, offsets)
+                    self.tail_page_offsets.append(self.num_tail_values)
+                    self.active_tail_offsets = (page_num, array('q'))
+            self.active_tail_offsets[1].append(self.num_tail_values)
+            for column in range(self.num_columns - Config.column_data_offset):
+                if utils.get_bit(schema, column):
+                    self.__append_cell(self.sparse_column_id, tail_flg, self.num_tail_values, columns[column + Config.column_data_offset])
+                    self.num_tail_values += 1
+        elif tail_flg == 0 and self.is_packed:
+            self.__append_header(num_records, columns[:Config.column_data_offset])
+            for i in range(Config.column_data_offset, self.num_columns):
+                self.__append_cell(i, tail_flg, num_records, columns[i])
+        else:
+            for i, column_value in enumerate(columns):
+                new_page = self.__append_cell(i, tail_flg, num_records, column_value) or new_page
 
         if new_page and tail_flg:
+            # the record filled its page, which is now sealed
             self.num_tail_pages += 1
 
         if tail_flg == 0:
@@ -117,6 +467,13 @@ class PageDirectory:
         Returns rid and flag whether it is in base or tail
         """
         assert rid < self.num_records
+
+        # deep versions are a single lookup in the version index instead of one page read per hop
+        if relative_version <= -self.version_index.min_depth:
+            tail_rid = self.version_index.get(rid, relative_version)
+            if tail_rid == -1:
+                return 0, rid
+            return 1, tail_rid
         
         current_rid = rid
         
@@ -160,12 +517,67 @@ class PageDirectory:
 
         if tail_flg == 0:
             assert rid < self.num_records
-            # return self.data[column_id]['Base'][page_num].read(order_in_page)
-            return self.bufferpool.get_page(page_num, column_id, tail_flg=0, cache_update=cache_update).read(order_in_page)
+            # hot metadata never touches the bufferpool
+            resident = self.resident_columns.get(column_id)
+            if resident is not None:
+                return resident[rid]
+            return self.__read_base_cell(rid, column_id, cache_update=cache_update)
         else:
             assert rid < self.num_tail_records
+            if self.is_sparse and column_id >= Config.column_data_offset:
+                schema = self.get_column_value(rid, Config.schema_encoding_column_idx, tail_flg=1, cache_update=cache_update)
+                return self.get_tail_value(rid, column_id - Config.column_data_offset, schema, cache_update=cache_update)
             # return self.data[column_id]['Tail'][page_num].read(order_in_page)
-            return self.bufferpool.get_page(page_num, column_id, tail_flg=1, cache_update=cache_update).read(order_in_page)
+            return self.get_tail_page(page_num, column_id, cache_update=cache_update).read(order_in_page)
+
+    def __read_base_cell(self, rid, column_id, cache_update=True):
+        """
+        Read a base cell from its page
+        """
+        slot = self.slots[rid]
+        if slot == -1:
+            # the space of a deleted record was reclaimed, it reads as a tombstone
+            return -1
+        # return self.data[column_id]['Base'][page_num].read(order_in_page)
+        physical_column, page_num, cell = self.__locate_base_cell(slot, column_id)
+        return self.bufferpool.get_page(page_num, physical_column, tail_flg=0, cache_update=cache_update).read(cell)
+
+    def __locate_base_cell(self, slot, column_id):
+        """
+        Get the physical column, page number and cell that hold a column of the base record in a slot
+        """
+        if self.is_packed and column_id < Config.column_data_offset:
+            cell = (slot % self.header_capacity) * Config.column_data_offset + column_id
+            return self.header_column_id, slot // self.header_capacity, cell
+        page_capacity = Config.page_size // 8
+        return column_id, slot // page_capacity, slot % page_capacity
+
+    def get_tail_page(self, page_num, column_id, cache_update=True):
+        """
+        Get a tail page from the delta buffer if it is still being filled, otherwise from the bufferpool
+        """
+        page = self.delta_buffer.get_page(column_id, page_num)
+        if page is not None:
+            return page
+        return self.bufferpool.get_page(page_num, column_id, tail_flg=1, cache_update=cache_update)
+
+    def get_tail_value(self, rid, column, schema, cache_update=True):
+        """
+        Get a data attribute of a tail record whose schema encoding was already read.
+        column is a logical column. Don't use the column offset.
+        Columns that the tail record does not carry read as -1.
+        """
+        if not utils.get_bit(schema, column):
+            return -1
+
+        if not self.is_sparse:
+            return self.get_column_value(rid, column + Config.column_data_offset, tail_flg=1, cache_update=cache_update)
+
+        # the values of a sparse tail record are packed in schema bit order
+        position = self.__tail_value_offset(rid) + utils.count_bits(schema & ((1 << column) - 1))
+        page_capacity = Config.page_size // 8
+        page = self.get_tail_page(position // page_capacity, self.sparse_column_id, cache_update=cache_update)
+        return page.read(position % page_capacity)
         
     def get_data_attribute(self, rid, column):
         """
@@ -176,10 +588,198 @@ class PageDirectory:
         indirection = self.get_column_value(rid, Config.indirection_column_idx, tail_flg=False)
         if indirection == -1:
             return self.get_column_value(rid, column+Config.column_data_offset, tail_flg=False)
-        schema = self.get_column_value(indirection, Config.schema_encoding_column_idx, tail_flg=True)
-        if utils.get_bit(schema, column):  
-            return self.get_column_value(indirection, column+Config.column_data_offset, tail_flg=True)    
-        return self.get_column_value(rid, column+Config.column_data_offset, tail_flg=False)          
+
+        # The base schema is the union of every update, so untouched columns skip the tail entirely
+        base_schema = self.get_column_value(rid, Config.schema_encoding_column_idx, tail_flg=False)
+        if not utils.get_bit(base_schema, column):
+            return self.get_column_value(rid, column+Config.column_data_offset, tail_flg=False)
+
+        return self.get_version_attributes(rid, [column], relative_version=0, indirection=indirection)[0]
+
+    def get_version_attributes(self, rid, columns, relative_version=0, indirection=None):
+        """
+        Get the values of several logical columns of a base record at a relative version.
+
+        Parameters
+        ----------
+        rid : int
+            The base record's RID
+        columns : list<int>
+            The logical columns to read (no column offset)
+        relative_version : int (Default=0)
+            0 is the newest version, -1 the one before it, etc.
+        indirection : int | None
+            The base indirection if the caller already read it
+
+        Returns
+        -------
+        values : list<int>
+            The value of each requested column in the same order
+        """
+        values = [None] * len(columns)
+
+        if indirection is None:
+            indirection = self.get_column_value(rid, Config.indirection_column_idx, tail_flg=0)
+
+        if indirection != -1:
+            tail_flg, tail_rid = self.get_rid_for_version(rid, relative_version)
+            if tail_flg:
+                values = self.get_tail_attributes(tail_rid, columns)
+
+        # Anything that was never updated at this version comes from the base record
+        for i, column in enumerate(columns):
+            if values[i] is None:
+                values[i] = self.get_column_value(rid, column + Config.column_data_offset, tail_flg=0)
+
+        return values
+
+    def get_tail_attributes(self, tail_rid, columns):
+        """
+        Get the values of several logical columns as of the version written by a tail record.
+        Columns that were not updated up to that version are None.
+        """
+        values = [None] * len(columns)
+
+        if self.is_cumulative:
+            # A cumulative tail record already holds every column changed up to its version
+            schema = self.get_column_value(tail_rid, Config.schema_encoding_column_idx, tail_flg=1)
+            for i, column in enumerate(columns):
+                if utils.get_bit(schema, column):
+                    values[i] = self.get_tail_value(tail_rid, column, schema)
+            return values
+
+        # Walk back from the requested version until every column is found or the chain ends
+        missing = list(range(len(columns)))
+        while tail_rid != -1 and missing:
+            schema = self.get_column_value(tail_rid, Config.schema_encoding_column_idx, tail_flg=1)
+            still_missing = []
+            for i in missing:
+                if utils.get_bit(schema, columns[i]):
+                    values[i] = self.get_tail_value(tail_rid, columns[i], schema)
+                else:
+                    still_missing.append(i)
+            missing = still_missing
+            tail_rid = self.get_column_value(tail_rid, Config.indirection_column_idx, tail_flg=1)
+
+        return values
+
+    def num_dead_slots(self):
+        """
+        Total number of base slots held by deleted records
+        """
+        return sum(self.dead_counts)
+
+    def vacuum(self):
+        """
+        Move live base records into the slots of deleted ones and drop the emptied base pages.
+        Records keep their logical RIDs, only their slots change.
+        Without a journal the slot map is saved before any record moves and again before any page
+        is dropped, so a crash in between opens the table on a slot map that matches its pages.
+        Returns the number of slots that were reclaimed.
+        """
+        if self.num_dead_slots() == 0:
+            return 0
+        durable = self.bufferpool.journal is None
+
+        # find which logical record lives in each slot, deleted records lose their slot
+        owners = array('q', [-1]) * self.num_slots
+        for rid in range(self.num_records):
+            slot = self.slots[rid]
+            if slot == -1:
+                continue
+            if self.get_column_value(rid, Config.rid_column_idx) == -1:
+                self.slots[rid] = -1
+                # a reclaimed record reads as a tombstone in every column
+                for values in self.resident_columns.values():
+                    values[rid] = -1
+            else:
+                owners[slot] = rid
+        if durable:
+            # no saved slot points at the slots the live records are moved into
+            self.save_slots(sync=True)
+
+        # fill the first free slot with the last live record until they meet
+        hole = 0
+        last = self.num_slots - 1
+        while True:
+            while hole < self.num_slots and owners[hole] != -1:
+                hole += 1
+            while last >= 0 and owners[last] == -1:
+                last -= 1
+            if hole >= last:
+                break
+            rid = owners[last]
+            self.__move_slot(last, hole)
+            self.slots[rid] = hole
+            owners[hole] = rid
+            owners[last] = -1
+
+        num_live = last + 1
+        reclaimed = self.num_slots - num_live
+        self.num_slots = num_live
+        self.dead_counts = array('q', [0]) * math.ceil(num_live / (Config.page_size // 8))
+        if not durable:
+            self.__truncate_base(num_live)
+            return reclaimed
+
+        # the moved records are written before the slot map points at them, and the next
+        # open finishes the truncation until the dropped pages are gone from disk
+        self.bufferpool.checkpoint()
+        pending_path = os.path.join(self.db_path, self.table_name, VACUUM_PENDING_FILE)
+        with open(pending_path, 'wb') as fp:
+            os.fsync(fp.fileno())
+        self.save_slots(sync=True)
+        self.__truncate_base(num_live)
+        self.bufferpool.checkpoint()
+        os.remove(pending_path)
+        return reclaimed
+
+    def __truncate_base(self, num_slots):
+        """
+        Drop the base pages past the first slots of every column
+        """
+        first_column = 0
+        if self.is_packed:
+            # header pages use only the cells of their whole headers, not every cell like the other columns
+            header_cells = self.header_capacity * Config.column_data_offset
+            self.bufferpool.truncate(num_slots * Config.column_data_offset, self.header_column_id, tail_flg=0, page_capacity=header_cells)
+            first_column = Config.column_data_offset
+        for column_id in range(first_column, self.num_columns):
+            self.bufferpool.truncate(num_slots, column_id, tail_flg=0)
+
+    def __move_slot(self, source, destination):
+        """
+        Copy every base column of the record in one slot into another slot
+        """
+        for column_id in range(self.num_columns):
+            physical_column, page_num, cell = self.__locate_base_cell(source, column_id)
+            value = self.bufferpool.get_page(page_num, physical_column, tail_flg=0).read(cell)
+            physical_column, page_num, cell = self.__locate_base_cell(destination, column_id)
+            page = self.bufferpool.get_page(page_num, physical_column, tail_flg=0)
+            page.write_at_location(value, cell)
+            self.bufferpool.update_page(page, page_num, physical_column, tail_flg=0)
+
+    def rewrite_tail(self, records):
+        """
+        Replace every tail record with the given ones, which get the RIDs 0..n-1 in order.
+        Must be called with the delta buffer lock held.
+        Without a journal the old tail files are set aside until the table is closed,
+        so a crash before that reopens the table with them.
+        """
+        self.bufferpool.discard(tail_flg=1)
+        self.delta_buffer.clear()
+        self.num_tail_records = 0
+        self.num_tail_pages = 0
+        self.tail_page_offsets = array('q')
+        self.active_tail_offsets = (-1, array('q'))
+        self.sealed_tail_offsets = {}
+        self.num_tail_values = 0
+
+        for columns in records:
+            columns[Config.rid_column_idx] = self.num_tail_records
+            self.__add_record(columns, tail_flg=1)
+
+        self.version_index.invalidate()
         
     def set_column_value(self, rid, column_id, new_value, tail_flg = 0, cache_update=True):
         assert column_id >= 0 
@@ -190,18 +790,71 @@ class PageDirectory:
 
         if tail_flg == 0:
             assert rid < self.num_records
-            page = self.bufferpool.get_page(page_num, column_id, tail_flg=0, cache_update=cache_update)
+            slot = self.slots[rid]
+            assert slot != -1
+            physical_column, page_num, order_in_page = self.__locate_base_cell(slot, column_id)
+            page = self.bufferpool.get_page(page_num, physical_column, tail_flg=0, cache_update=cache_update)
             page.write_at_location(new_value, order_in_page)
-            self.bufferpool.update_page(page, page_num, column_id, tail_flg=0, cache_update=cache_update)
+            self.__track_base_write(rid, slot, column_id, new_value)
+            self.bufferpool.update_page(page, page_num, physical_column, tail_flg=0, cache_update=cache_update)
             # !!! Do we need to update explicitly here??? self.bufferpool.update
             # self.data[column_id]['Base'][page_num].write_at_location(new_value, order_in_page)
         else:
             assert rid < self.num_tail_records
+            # tail data is never rewritten in place, only its metadata
+            assert not (self.is_sparse and column_id >= Config.column_data_offset)
+            with self.delta_buffer.lock:
+                page = self.delta_buffer.get_page(column_id, page_num)
+                if page is not None:
+                    # the delta buffer hands the page to the bufferpool once it is sealed
+                    page.write_at_location(new_value, order_in_page)
+                    return True
             page = self.bufferpool.get_page(page_num, column_id, tail_flg=1, cache_update=cache_update)
             page.write_at_location(new_value, order_in_page)
             self.bufferpool.update_page(page, page_num, column_id, tail_flg=1, cache_update=cache_update)
         return True
 
+    def set_header_values(self, rid, values, cache_update=True):
+        """
+        Write several metadata columns of a base record, values maps a metadata column to its new value.
+        Packed headers share one page, so this costs a single page round trip.
+        """
+        if not self.is_packed:
+            for column_id, value in values.items():
+                self.set_column_value(rid, column_id, value, tail_flg=0, cache_update=cache_update)
+            return True
+
+        assert rid < self.num_records
+        slot = self.slots[rid]
+        assert slot != -1
+        page_num = slot // self.header_capacity
+        page = self.bufferpool.get_page(page_num, self.header_column_id, tail_flg=0, cache_update=cache_update)
+        for column_id, value in values.items():
+            assert column_id < Config.column_data_offset
+            _, _, cell = self.__locate_base_cell(slot, column_id)
+            page.write_at_location(value, cell)
+            self.__track_base_write(rid, slot, column_id, value)
+        self.bufferpool.update_page(page, page_num, self.header_column_id, tail_flg=0, cache_update=cache_update)
+        return True
+
+    def __track_base_write(self, rid, slot, column_id, new_value):
+        """
+        Keep the resident arrays, tombstones and free-space map in step with a base cell write
+        """
+        if column_id == Config.rid_column_idx:
+            # keep the free-space map in step with deletes and their roll backs
+            old_value = self.resident_columns[column_id][rid]
+            page_num = slot // (Config.page_size // 8)
+            if old_value != -1 and new_value == -1:
+                self.dead_counts[page_num] += 1
+                self.tombstones.set(rid)
+            elif old_value == -1 and new_value != -1:
+                self.dead_counts[page_num] -= 1
+                self.tombstones.clear(rid)
+        resident = self.resident_columns.get(column_id)
+        if resident is not None:
+            resident[rid] = new_value
+
 '''
   def get_page_copy(self, column, page_idx, tail_flg = 0):
         if tail_flg == 0:
@@ -234,7 +887,7 @@ class Table:
     for individual records to be retrieved by value.
     """
 
-    def __init__(self, db_path, name, num_columns=None, primary_key=None, force_merge=Config.force_merge, merge_interval=Config.merge_interval):
+    def __init__(self, db_path, name, num_columns=None, primary_key=None, force_merge=Config.force_merge, merge_interval=Config.merge_interval, is_cumulative=Config.lstore_is_cumulative, is_sparse=Config.lstore_sparse_tails, is_packed=Config.lstore_packed_headers, shared_pool=None, fast_start=Config.lstore_fast_start, wal=None):
         """Initialize a Table
 
         Parameters
@@ -245,6 +898,25 @@ class Table:
             The total number of columns to store in the table
         primary_key: int
             The index of the column to use as the primary key
+        is_cumulative: bool
+            Whether tail records carry every column updated so far.
+            An existing table keeps the mode it was created with.
+        is_sparse: bool
+            Whether tail records only write their schema encoded columns.
+            An existing table keeps the format it was created with.
+        is_packed: bool
+            Whether base records keep their metadata in packed header pages.
+            An existing table keeps the layout it was created with.
+        shared_pool: SharedBufferPool | None
+            The memory shared with the other tables of the database
+            (Default gives the table a pool of its own)
+        fast_start: bool
+            Whether building the index and starting the merge thread
+            wait for the first use of the index
+        wal: WriteAheadLog | None
+            The log of the database the changes are written to
+            (Default does not log the changes).  A logged table
+            keeps an UndoJournal and is checkpointed on close.
         
         Raises
         ------
@@ -258,6 +930,19 @@ class Table:
         self.primary_key = primary_key
         self.num_columns = num_columns
         self.lock_manager = LockManager()
+        self.wal = wal
+
+        # Transactions only hold intention locks on the table, so their queries
+        # hold the latch while they use the index and the pages
+        self.index_latch = threading.RLock()
+
+        # Changes hold the latch shared, a checkpoint holds it exclusively
+        self.checkpoint_latch = BlockingLatch()
+        self.journal = None
+        self.checkpoint_generation, self.checkpoint_lsn = read_checkpoint(os.path.join(db_path, name))
+        if wal is not None:
+            os.makedirs(os.path.join(db_path, name), exist_ok=True)
+            self.journal = UndoJournal(os.path.join(db_path, name), self.checkpoint_generation)
         
         # restore num_records and num_tail_records if they exist
         meta_path = os.path.join(db_path, name, 'meta.data')
@@ -267,11 +952,26 @@ class Table:
                 num_tail_records = struct.unpack('<i', fp.read(4))[0]
                 self.num_columns = struct.unpack('<i', fp.read(4))[0]
                 self.primary_key = struct.unpack('<i', fp.read(4))[0]
+
+                # Older tables do not store the tail mode and were always written cumulatively
+                mode = fp.read(4)
+                is_cumulative = bool(struct.unpack('<i', mode)[0]) if mode else True
+
+                # Older tables always wrote every column into their tail records
+                tail_format = fp.read(4)
+                is_sparse = bool(struct.unpack('<i', tail_format)[0]) if tail_format else False
+
+                # Older tables always stored one page per metadata column
+                base_layout = fp.read(4)
+                is_packed = bool(struct.unpack('<i', base_layout)[0]) if base_layout else False
         else:
             num_records = 0
             num_tail_records = 0
             self.num_columns_file = num_columns
             self.primary_key = primary_key
+        self.is_cumulative = is_cumulative
+        self.is_sparse = is_sparse
+        self.is_packed = is_packed
             
         # Validate that the primary key column is within the range of columns
         if (self.primary_key >= self.num_columns):
@@ -288,10 +988,20 @@ class Table:
             self.num_columns + Config.column_data_offset,
             num_records=num_records,
             num_tail_records=num_tail_records,
+            is_cumulative=self.is_cumulative,
+            is_sparse=self.is_sparse,
+            is_packed=self.is_packed,
+            shared_pool=shared_pool,
+            journal=self.journal,
         )
         
 
-        self.index = Index(self)
+        self._index = None
+        self.start_lock = threading.Lock()
+
+        # The merge and the compactor never run at the same time
+        self.maintenance_lock = threading.Lock()
+        self.compactor = TailCompactor(self)
 
         # Merge policy features
 
@@ -302,10 +1012,36 @@ class Table:
 
             # DO NOT TOUCH
             self.running = True
-            self.num_tail_pages = 0
+            self.num_tail_pages = self.page_directory.num_tail_pages
             self.tail_queue = Queue()
-            thread = threading.Thread(target=self.__run, daemon=True)
-            thread.start()
+
+        if not fast_start:
+            self.start()
+
+    @property
+    def index(self):
+        """The Index of the table, built by the first query of a fast start"""
+
+        if self._index is None:
+            self.start()
+        return self._index
+
+    def start(self):
+        """Build the index and start the merge thread
+
+        Only the first call does anything.
+        """
+
+        with self.start_lock:
+            if self._index is not None:
+                return
+            # Imported here, the index data structures are slow to import and a fast start may never query
+            from lstore.index import Index
+            self._index = Index(self)
+
+            if self.force_merge == False and self.running:
+                thread = threading.Thread(target=self.__run, daemon=True)
+                thread.start()
 
 
     def __contains__(self, key):
@@ -397,11 +1133,7 @@ class Table:
         # Data
         #s += "|"
         num_logical_records = 0
-        for r in range(self.page_directory.num_records):
-            rid = self.page_directory.get_column_value(r, Config.rid_column_idx)
-            if (rid == -1):
-                continue
-
+        for r in self.page_directory.tombstones.iter_clear():
             s += "|"
             for c in range(self.num_columns):
                     v = self.page_directory.get_data_attribute(r, c)
@@ -582,16 +1314,8 @@ class Table:
             # Immediately return None to prevent looping
             return None
 
-        # Loop through all possible rows and yield a value
-        for i in range(len(self)):
-            # Resolve the true RID
-            rid_column = Config.rid_column_idx
-            indirection_column = Config.indirection_column_idx
-            rid = self.page_directory.get_column_value(rid=i, column_id=rid_column, tail_flg=0)
-            if rid == -1:
-                # if a tombstone is found, continue
-                continue
-
+        # Loop through all live rows and yield a value, deleted ones are skipped a word of the bitmap at a time
+        for rid in self.page_directory.tombstones.iter_clear(0, len(self)):
             yield self.page_directory.get_data_attribute(rid, column), rid
         
     def get_column(self, column_index):
@@ -615,7 +1339,85 @@ class Table:
         # Set the RID column value to -1 (invalid)
         return self.page_directory.set_column_value(rid, Config.rid_column_idx, -1, 0)
         
+    def compact(self):
+        """Reclaim dead and expired tail records
+
+        Like vacuum, compaction is never started in the
+        background and must not run at the same time as
+        plain Query calls on an unlogged table.
+
+        Returns
+        -------
+        reclaimed : int | None
+            The number of tail records that were dropped
+            or None if transactions are holding the table
+        """
+
+        return self.compactor.compact()
+
+    def vacuum(self):
+        """Reclaim the base slots of deleted records
+
+        Live records are moved into the slots of deleted
+        ones and the emptied base pages are dropped.  The
+        index latch keeps the queries of transactions out and
+        the checkpoint latch the logged Query calls.  Plain
+        Query calls on an unlogged table take neither, so
+        vacuum is never started in the background and must not
+        run at the same time as them.
+
+        Returns
+        -------
+        reclaimed : int | None
+            The number of slots that were reclaimed
+            or None if transactions are holding the table
+        """
+
+        # Every call owns its lock, so a second vacuum cannot share it
+        owner = object()
+        if (self.lock_manager.request(Config.EXCLUSIVE_LOCK, TABLE_GRANULE, owner, timeout=0) is None):
+            self.lock_manager.release_all(owner)
+            return None
+
+        try:
+            with self.index_latch, self.checkpoint_latch.exclusive(), self.maintenance_lock:
+                return self.page_directory.vacuum()
+        finally:
+            self.lock_manager.release_all(owner)
+
+    def stop(self):
+        """Stop the merge thread
+
+        Waits for a merge or compaction that is
+        already running to finish.
+        """
+
+        if self.force_merge == False:
+            self.running = False
+            with self.maintenance_lock:
+                pass
+
     def close(self):
+        self.stop()
+
+        if self.wal is not None:
+            # The checkpoint makes the log records of the table unnecessary
+            self.checkpoint()
+            self.page_directory.bufferpool.close()
+            self.journal.close()
+            return
+
+        self.__save_meta()
+
+        #flush the pool
+        # TODO do we even need this? the object is deleted automatically
+        self.page_directory.delta_buffer.flush()
+        self.page_directory.bufferpool.close()
+
+        # The saved meta data describes the rewritten tail pages now
+        self.page_directory.bufferpool.drop_set_aside()
+
+    def __save_meta(self):
         # dump record data
         meta_path = os.path.join(self.db_path, self.name, 'meta.data')
         with open(meta_path, 'wb') as fp:
@@ -623,13 +1425,67 @@ class Table:
                 fp.write(struct.pack('<i', self.page_directory.num_tail_records))
                 fp.write(struct.pack('<i', self.num_columns))
                 fp.write(struct.pack('<i', self.primary_key))
+                fp.write(struct.pack('<i', int(self.is_cumulative)))
+                fp.write(struct.pack('<i', int(self.is_sparse)))
+                fp.write(struct.pack('<i', int(self.is_packed)))
             
-        #flush the pool
-        # TODO do we even need this? the object is deleted automatically
-        self.page_directory.bufferpool.flush()
+        self.page_directory.save_slots()
+        if self.is_sparse:
+            self.page_directory.save_tail_page_offsets()
+        self.page_directory.checkpoint_resident_columns()
+        self.page_directory.save_tombstones()
+
+    def checkpoint(self):
+        """Make the table files match the log up to its end
+
+        Changes wait while the buffered tail pages, the dirty
+        blocks and the meta data are written and synced.  The
+        table then records the LSN it is current up to, after
+        which recovery only replays the records that follow,
+        and its UndoJournal starts over.  The checkpoint is
+        fuzzy towards transactions, changes of running ones
+        are included and undone by recovery after a crash.
+
+        Returns
+        -------
+        lsn : int
+            The LSN the table is current up to
+        """
+
+        table_path = os.path.join(self.db_path, self.name)
+        meta_files = ['meta.data', 'slots.data', 'metadata.data', 'tombstones.data'] + ([TAIL_OFFSETS_FILE] if self.is_sparse else [])
+        meta_paths = [os.path.join(table_path, file_name) for file_name in meta_files]
+
+        with self.checkpoint_latch.exclusive(), self.maintenance_lock:
+            lsn = self.wal.next_lsn
+
+            # Until the new checkpoint is recorded, recovery restores the old files
+            for path in meta_paths:
+                self.journal.save_file(path)
+            self.page_directory.delta_buffer.flush()
+            self.page_directory.bufferpool.checkpoint()
+            self.__save_meta()
+            for path in meta_paths:
+                fd = os.open(path, os.O_RDONLY)
+                try:
+                    os.fsync(fd)
+                finally:
+                    os.close(fd)
+
+            # Records up to the checkpoint must survive, recovery may undo them
+            self.wal.flush()
+            write_checkpoint(table_path, self.checkpoint_generation + 1, lsn)
+            self.journal.reset(self.checkpoint_generation + 1)
+            self.checkpoint_generation += 1
+            self.checkpoint_lsn = lsn
+            return lsn
         
 
     def __merge(self, tail_page_indices):
+        with self.maintenance_lock:
+            self.__merge_pages(tail_page_indices)
+
+    def __merge_pages(self, tail_page_indices):
         # Which tail pages are going to be merged
         # This needs to be discussed
 
@@ -645,11 +1501,11 @@ class Table:
             # get the tail page rid and schema columms
             # page_rid = self.page_directory.get_page(Config.tps_and_brid_column_idx, tail_page_idx, 1)
             # page_schema = self.page_directory.get_page(Config.schema_encoding_column_idx, tail_page_idx, 1)
-            page_rid = self.page_directory.bufferpool.get_page(tail_page_idx, Config.tps_and_brid_column_idx, tail_flg=1, cache_update=True)
-            page_schema = self.page_directory.bufferpool.get_page(tail_page_idx, Config.schema_encoding_column_idx, tail_flg=1, cache_update=True)
+            page_rid = self.page_directory.get_tail_page(tail_page_idx, Config.tps_and_brid_column_idx)
+            page_schema = self.page_directory.get_tail_page(tail_page_idx, Config.schema_encoding_column_idx)
+            tail_rid = self.page_directory.get_tail_page(tail_page_idx, Config.rid_column_idx)
 
             # initialize base_copies, this will be where we manage the copied pages
-            tps_copies = {}
             base_copies = []
             for i in range(self.num_columns):
                 base_copies.append({})
@@ -657,16 +1513,26 @@ class Table:
             for i in range(self.num_columns):
                 # get the column we will work on
                 # tail = self.page_directory.get_page(i + Config.column_data_offset, tail_page_idx, 1)
-                tail = self.page_directory.bufferpool.get_page(tail_page_idx,i + Config.column_data_offset, tail_flg=1, cache_update=True)
+                # sparse tail records have no page per column, their values are read from the value stream
+                tail = None
+                if not self.page_directory.is_sparse:
+                    tail = self.page_directory.get_tail_page(tail_page_idx, i + Config.column_data_offset)
                 # track if an RID has been seen yet, we iterate backwards so we only merge the most recent update
                 # instead of seen I would like to use TPS, this may prevent some possible errors
                 seen = set() 
 
-                for j in range(tail.num_cells-1, -1, -1):
-                    record_value = tail.read(j) # value we might update
+                for j in range(page_rid.num_cells-1, -1, -1):
+                    # rolled back tail records are tombstoned and never merged
+                    if tail_rid.read(j) == -1:
+                        continue
+
                     rid = page_rid.read(j) # rid of base record we might update
+                    # the record is merged into its slot, which vacuum may have reclaimed
+                    slot = self.page_directory.get_slot(rid)
+                    if slot == -1:
+                        continue
                     # get the page index so we know which base page will be updated
-                    base_page_idx = int(rid // (Config.page_size / Config.page_cell_size))
+                    base_page_idx = int(slot // (Config.page_size / Config.page_cell_size))
 
                     # if the base page has not been copied and brought in, do so
                     if base_page_idx not in base_copies[i]:
@@ -678,36 +1544,26 @@ class Table:
                             cache_update=True
                         )
                         base = copy.deepcopy(base_source)
-                        
-                        # tps = self.page_directory.get_page_copy(Config.tps_and_brid_column_idx, base_page_idx)
-                        tps_source = self.page_directory.bufferpool.get_page(
-                            base_page_idx,
-                            Config.tps_and_brid_column_idx,
-                            tail_flg=0,
-                            cache_update=True
-                        )
-                        tps = copy.deepcopy(tps_source)
-                        
-                        tps_copies[base_page_idx] = tps
                         base_copies[i][base_page_idx] = base
                     
-                    # if the record has not been updated yet
-                    if rid not in seen:
+                    # only the newest tail record that actually carries this column is merged,
+                    # non-cumulative tail records may skip columns that older records still hold
+                    schema = page_schema.read(j)
+                    if rid not in seen and utils.get_bit(schema, i):
                         seen.add(rid)
-                        # if the column has been updated at this spot, update it
-                        if utils.get_bit(page_schema.read(j), i):
-                            location = int(rid % (Config.page_size / Config.page_cell_size))
-                            base_copies[i][base_page_idx].write_at_location(record_value, location)
-
+                        if tail is None:
+                            record_value = self.page_directory.get_tail_value(tail_page_idx * page_capacity + j, i, schema)
+                        else:
+                            record_value = tail.read(j) # value we might update
+                        location = int(slot % (Config.page_size / Config.page_cell_size))
+                        base_copies[i][base_page_idx].write_at_location(record_value, location)
+
+                    # the tps does not depend on the column, so it is only checked in the first pass
+                    if i > 0:
+                        continue
                     tps = self.page_directory.get_column_value(rid, Config.tps_and_brid_column_idx)
                     if not tps >= rid:
                         # tail_rid = self.page_directory.get_page(Config.rid_column_idx, tail_page_idx, 1)
-                        tail_rid = self.page_directory.bufferpool.get_page(
-                            tail_page_idx,
-                            Config.rid_column_idx,
-                            tail_flg=1,
-                            cache_update=True
-                        )
                         new_tps = tail_rid.read(j)
                         self.page_directory.set_column_value(rid, Config.tps_and_brid_column_idx, new_tps)
             
@@ -726,11 +1582,20 @@ class Table:
     def merge(self):
         self.__merge(tail_page_indices = [0, 1, 2])
 
+    def reset_merge(self):
+        """
+        Queue every sealed tail page again after the tail pages were rewritten
+        """
+        if self.force_merge == False:
+            self.num_tail_pages = 0
+            self.tail_queue = Queue()
+
     def __run(self):
         while self.running:
             old_num_tails = self.num_tail_pages 
             new_num_tails = self.page_directory.num_tail_pages
-            if new_num_tails >= 2:
+            # only sealed tail pages are queued, the active ones are still being filled
+            if new_num_tails > old_num_tails:
                 self.num_tail_pages = new_num_tails
                 for i in range(old_num_tails, new_num_tails):
                     self.tail_queue.push(i)
@@ -745,3 +1610,40 @@ class Table:
 
                 self.__merge(tails_to_merge)
             time.sleep(self.interval)
+
+
+def read_checkpoint(path):
+    """Read the last checkpoint of a table
+
+    Parameters
+    ----------
+    path : str
+        The path of the table
+
+    Returns
+    -------
+    checkpoint : tuple<int>
+        The (generation, lsn) of the checkpoint, (0, 0)
+        for a table that was never checkpointed
+    """
+
+    checkpoint_path = os.path.join(path, CHECKPOINT_FILE)
+    if not os.path.exists(checkpoint_path):
+        return 0, 0
+    with open(checkpoint_path, 'rb') as fp:
+        return struct.unpack('<qq', fp.read(16))
+
+def write_checkpoint(path, generation, lsn):
+    """Record a checkpoint of a table
+
+    The file is synced and then replaces the old one,
+    so a crash leaves either checkpoint in place.
+    """
+
+    checkpoint_path = os.path.join(path, CHECKPOINT_FILE)
+    temp_path = checkpoint_path + '.tmp'
+    with open(temp_path, 'wb') as fp:
+        fp.write(struct.pack('<qq', generation, lsn))
+        fp.flush()
+        os.fsync(fp.fileno())
+    os.replace(temp_path, checkpoint_path)
@@ -1,20 +1,37 @@
 # System Imports
+from contextlib import ExitStack
+import itertools
 import time
 
 # Local Imports
 from lstore.table import Table, Record
-from lstore.index import Index
+from lstore.undo_log import UndoLog
+from lstore.wal import transaction_context
 from lstore.wrapper import QueryWrapper
 
+# Transaction ids, 0 is left for queries outside of transactions
+_transaction_ids = itertools.count(1)
+
+# Timestamps of first runs, which order Transactions by age
+_transaction_timestamps = itertools.count(1)
+
 class Transaction:
 
     """
     # Creates a transaction object.
     """
     def __init__(self):
+        self.id = next(_transaction_ids)  # Changes on every retry, recovery tells the runs apart by it
         self.queries = []
-        self.log = []  # Log of each query in the order they were done
+        self.undo_log = UndoLog()  # Before-images of every change of the queries
         self.lock_managers = set()
+        self.wals = set()  # Logs of the databases the queries write to
+        self.logged_tables = {}  # Id of every logged table mapped to the table
+        self.written_tables = set()  # Tables that queries insert into, update or delete from
+        self.timestamp = None  # Set on the first run and kept over retries, so a retry keeps its priority
+        self.wounded = False  # Whether an older Transaction waits for this one to abort
+        self.num_aborts = 0  # Aborts from lock conflicts
+        self.record_locks = {}  # (table id, key range Granule) mapped to the keys locked in it, for lock escalation
 
     def add_query(self, query, table, *args):
         """
@@ -40,10 +57,16 @@ class Transaction:
         # Add the query to the query list
         wrapper = QueryWrapper(table, query, self, args)
         self.queries.append(wrapper)
+        if (wrapper.writes):
+            self.written_tables.add(table)
 
         # Add the lock manager to the lock manager set
         self.lock_managers.add(table.lock_manager)
 
+        if (table.wal is not None):
+            self.wals.add(table.wal)
+            self.logged_tables[id(table)] = table
+
         # use grades_table for aborting
         
     # If you choose to implement this differently this method must still return True if transaction commits or False on abort
@@ -58,18 +81,32 @@ class Transaction:
             Whether or not the transaction was successful
             False will be returned on abort
         """
-        # Loop through all queries
-        for wrapper in self.queries:
-            # Try to run the wrapped query
-            result = wrapper.try_run()
-            
-            # If the query has failed the transaction should abort
-            if result == False:
-                # The lock failed to be obtained
-                return self.abort()
-            elif result == None:
-                # An actual error occurred in the transaction
-                return self.abort(failure=True)
+        if (self.timestamp is None):
+            self.timestamp = next(_transaction_timestamps)
+        else:
+            # The records of an aborted run stay in the log, a retry is logged
+            # under a new id so its commit does not make recovery redo them
+            self.id = next(_transaction_ids)
+        self.wounded = False
+
+        # Log the changes of the queries as part of this transaction
+        with transaction_context(self.id):
+            # Loop through all queries
+            for wrapper in self.queries:
+                # An older transaction waits for the locks this one holds
+                if (self.wounded):
+                    return self.abort()
+
+                # Try to run the wrapped query
+                result = wrapper.try_run()
+                
+                # If the query has failed the transaction should abort
+                if result == False:
+                    # The lock failed to be obtained
+                    return self.abort()
+                elif result == None:
+                    # An actual error occurred in the transaction
+                    return self.abort(failure=True)
         
         return self.commit()
     
@@ -93,12 +130,26 @@ class Transaction:
             is actually invalid.
         """
 
-        #TODO: do roll-back and any other necessary operations
-        for wrapper in reversed(self.queries):
-            wrapper.roll_back()
+        # A checkpoint sees the changes either rolled back and
+        # aborted in the log or neither, the latches are taken in
+        # one order so concurrent aborts do not wait on each other.
+        # Queries take the index latch before the checkpoint latch.
+        with ExitStack() as stack:
+            for table in sorted(self.written_tables, key=id):
+                stack.enter_context(table.index_latch)
+            for key in sorted(self.logged_tables):
+                stack.enter_context(self.logged_tables[key].checkpoint_latch.shared())
+
+            self.undo_log.roll_back()
+
+            # Recovery skips the logged changes
+            for wal in self.wals:
+                wal.abort(self.id)
 
         # Release all held locks
         self.__release_all()
+        if (not failure):
+            self.num_aborts += 1
 
         # Force a context switch
         time.sleep(1e-4)
@@ -112,8 +163,14 @@ class Transaction:
         all locks that were granted.
         """
 
-        # TODO: commit to database
+        # The changes are committed once the commit record is appended
+        commit_lsns = [(wal, wal.append_commit(self.id)) for wal in self.wals]
+        self.undo_log.clear()
 
+        # Other transactions must not see the changes before they are durable,
+        # concurrent commits that do not conflict still share the sync
+        for wal, lsn in commit_lsns:
+            wal.wait_durable(lsn)
 
         # Release all held locks
         self.__release_all()
@@ -130,3 +187,4 @@ class Transaction:
         # Loop through all lock managers
         for manager in self.lock_managers:
             manager.release_all(self)
+        self.record_locks = {}
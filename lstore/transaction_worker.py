@@ -1,9 +1,11 @@
 # System Imports
+import random
 from threading import Thread
+import time
 
 # Local Importsimport threading
+from config import Config
 from lstore.table import Table, Record
-from lstore.index import Index
 
 class TransactionWorker:
     def __init__(self, transactions = None):
@@ -22,6 +24,8 @@ class TransactionWorker:
         self.result = 0
         self.commit_set = set()  # A set of successful Transaction objects
         self.fail_set = set()  # A set of failed Transaction objects (errored)
+        self.latencies = {}  # Committed Transactions mapped to the seconds from their first run to their commit
+        self.__random = random.Random()
 
         # Current running thread
         self.current_thread = None
@@ -56,6 +60,18 @@ class TransactionWorker:
         if (self.current_thread is not None):
             self.current_thread.join()
 
+    def __back_off(self, transaction):
+        """Internal wait before retrying an aborted transaction
+
+        The longest delay doubles with every abort of the
+        transaction up to Config.transaction_backoff_max and
+        the delay is drawn below it, so transactions that
+        conflicted retry at different times.
+        """
+
+        limit = Config.transaction_backoff_base * 2 ** (transaction.num_aborts - 1)
+        time.sleep(self.__random.uniform(0, min(limit, Config.transaction_backoff_max)))
+
     def __run(self):
         """Internal run
 
@@ -75,14 +91,22 @@ class TransactionWorker:
         while (len(self.transactions) > 0):
             # Loop through all transactions and try to run them
             for transaction in self.transactions:
-                # each transaction returns True if committed or False if aborted
-                result = transaction.run()
-                self.stats.append(result)
+                # An aborted transaction retries after its backoff, keeping its
+                # timestamp, instead of waiting for the rest of the list
+                start = time.perf_counter()
+                result = False
+                while (result == False):
+                    # each transaction returns True if committed or False if aborted
+                    result = transaction.run()
+                    self.stats.append(result)
+                    if (result == False):
+                        self.__back_off(transaction)
 
                 # Record which transactions committed/failed
                 if (result == True):
                     # Commit condition
                     self.commit_set.add(transaction)
+                    self.latencies[transaction] = time.perf_counter() - start
                 elif (result == None):
                     # Failure condition
                     self.fail_set.add(transaction)
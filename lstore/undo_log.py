@@ -0,0 +1,114 @@
+"""
+This is responsible for the UndoLog of a Transaction,
+the in-memory before-images of every change its
+queries made.
+
+Each query records what it overwrote right after it
+ran: the old value of every cell it wrote, with the
+RID and column, and every entry it added to, removed
+from or moved within an index.  An abort applies the
+entries in reverse order, so rolling back never looks
+a record up again or reads columns it did not change.
+"""
+
+WRITE_ENTRY = 0
+HEADER_ENTRY = 1
+INDEX_INSERT_ENTRY = 2
+INDEX_REMOVE_ENTRY = 3
+INDEX_UPDATE_ENTRY = 4
+CHAIN_ENTRY = 5
+
+class UndoLog():
+    """The changes of a Transaction in the order they were made
+
+    Every entry is a tuple starting with its kind
+    and the Table it belongs to.
+    """
+
+    def __init__(self):
+        self.entries = []
+
+    def __len__(self):
+        return len(self.entries)
+
+    def record_write(self, table, rid, column_id, old_value, tail_flg=0):
+        """Record a cell before it is overwritten
+
+        Parameters
+        ----------
+        table : Table
+            The table of the cell
+        rid : int
+            The RID of the record
+        column_id : int
+            The physical column of the cell
+        old_value : int
+            The value to write back, -1 in the RID
+            column for a record that did not exist
+        tail_flg : int
+            Whether the record is a tail record
+        """
+
+        self.entries.append((WRITE_ENTRY, table, rid, column_id, old_value, tail_flg))
+
+    def record_header(self, table, rid, values):
+        """Record metadata cells of a base record
+
+        Parameters
+        ----------
+        table : Table
+            The table of the record
+        rid : int
+            The base RID
+        values : dict<int, int>
+            The old value of each metadata column
+        """
+
+        self.entries.append((HEADER_ENTRY, table, rid, values))
+
+    def record_index_insert(self, table, column, value, rid):
+        """Record an entry added to the index of a column"""
+
+        self.entries.append((INDEX_INSERT_ENTRY, table, column, value, rid))
+
+    def record_index_remove(self, table, column, value, rid):
+        """Record an entry removed from the index of a column"""
+
+        self.entries.append((INDEX_REMOVE_ENTRY, table, column, value, rid))
+
+    def record_index_update(self, table, column, old_value, new_value, rid):
+        """Record an entry moved to a new value in the index of a column"""
+
+        self.entries.append((INDEX_UPDATE_ENTRY, table, column, old_value, new_value, rid))
+
+    def record_chain(self, table, rid):
+        """Record that the version chain of a record grew"""
+
+        self.entries.append((CHAIN_ENTRY, table, rid))
+
+    def clear(self):
+        self.entries = []
+
+    def roll_back(self):
+        """Undo every recorded change, newest first, and clear the log"""
+
+        for entry in reversed(self.entries):
+            kind, table = entry[0], entry[1]
+            if kind == WRITE_ENTRY:
+                _, _, rid, column_id, old_value, tail_flg = entry
+                table.page_directory.set_column_value(rid, column_id, old_value, tail_flg=tail_flg)
+            elif kind == HEADER_ENTRY:
+                table.page_directory.set_header_values(entry[2], entry[3])
+            elif kind == INDEX_INSERT_ENTRY:
+                _, _, column, value, rid = entry
+                table.index.indices[column].remove(value, rid)
+            elif kind == INDEX_REMOVE_ENTRY:
+                _, _, column, value, rid = entry
+                table.index.indices[column].insert(value, rid)
+            elif kind == INDEX_UPDATE_ENTRY:
+                _, _, column, old_value, new_value, rid = entry
+                table.index.indices[column].update(new_value, old_value, rid)
+            elif kind == CHAIN_ENTRY:
+                # A rolled back tail record leaves the chain, which is rebuilt on its next read
+                table.page_directory.version_index.invalidate(entry[2])
+        self.entries = []
@@ -14,3 +14,7 @@ def get_bit(value, bit_position):
     """Returns the value of the bit at the given position."""
     return (value >> bit_position) & 1
 
+
+def count_bits(value):
+    """Returns the number of bits set to 1."""
+    return bin(value).count("1")
@@ -0,0 +1,207 @@
+"""
+This is responsible for an auxiliary index over
+version chains called the VersionIndex.  Walking
+the indirection column costs one page read per
+version, so deep select_version and sum_version
+queries are O(k) random reads.
+
+The VersionIndex stores, for each base record that
+has been read deeply, an array of its tail RIDs
+ordered from oldest to newest.  Any relative version
+is then a single array lookup.  Arrays are built
+lazily the first time a record is read deeply and
+kept up to date by appending on every update, so
+nothing has to be persisted: a reopened table simply
+rebuilds them on demand.
+
+Memory is bounded in two ways.  An array keeps only
+the newest version_index_max_depth tail RIDs (up to
+twice that between trims), and older versions are
+walked to from the oldest RID it still has.  Only the
+arrays of the version_index_max_records records read
+most recently are kept.
+"""
+
+# System imports
+from array import array
+from collections import OrderedDict
+import threading
+
+# Local imports
+from config import Config
+
+class VersionIndex():
+    """A per-record version-offset array
+
+    Maps a base RID to the array of its tail RIDs
+    in version order (oldest first).
+    """
+
+    def __init__(self, page_directory, min_depth=Config.version_index_min_depth,
+                 max_depth=Config.version_index_max_depth, max_records=Config.version_index_max_records):
+        """Initialize the VersionIndex
+
+        Parameters
+        ----------
+        page_directory : PageDirectory
+            The PageDirectory whose version chains are indexed
+        min_depth : int
+            Relative versions closer than this are cheaper to
+            walk than to index, so they bypass the VersionIndex
+        max_depth : int
+            The newest tail RIDs kept per record
+        max_records : int
+            The records whose chains are kept
+        """
+
+        self.page_directory = page_directory
+        self.min_depth = min_depth
+        self.max_depth = max_depth
+        self.max_records = max_records
+        self.chains = OrderedDict()  # Base RID mapped to an array of tail RIDs, least recently read first
+        self.truncated = set()  # Base RIDs whose array lacks their oldest tail RIDs
+        self.__lock = threading.Lock()
+
+    def __contains__(self, rid):
+        return rid in self.chains
+
+    def __len__(self):
+        return len(self.chains)
+
+    def append(self, rid, tail_rid):
+        """Record a new newest version
+
+        Only records that are already indexed are updated,
+        the rest will include the new version when built.
+
+        Parameters
+        ----------
+        rid : int
+            The base RID that was updated
+        tail_rid : int
+            The tail RID of the new newest version
+        """
+
+        with self.__lock:
+            chain = self.chains.get(rid)
+            if (chain is not None):
+                chain.append(tail_rid)
+                # Trimming in batches keeps appends amortized O(1)
+                if (len(chain) >= 2 * self.max_depth):
+                    del chain[:len(chain) - self.max_depth]
+                    self.truncated.add(rid)
+
+    def invalidate(self, rid=None):
+        """Forget the chain of a record
+
+        Used whenever a chain is changed in a way other
+        than appending (roll backs, compaction).
+
+        Parameters
+        ----------
+        rid : int | None
+            The base RID to forget or None to forget all of them
+        """
+
+        with self.__lock:
+            if (rid is None):
+                self.chains = OrderedDict()
+                self.truncated = set()
+            else:
+                self.chains.pop(rid, None)
+                self.truncated.discard(rid)
+
+    def get(self, rid, relative_version):
+        """Find the tail RID of a relative version
+
+        Parameters
+        ----------
+        rid : int
+            The base RID
+        relative_version : int
+            0 is the newest version, -1 the one before it, etc.
+
+        Returns
+        -------
+        tail_rid : int
+            The tail RID of the version or -1 if the
+            version is the base record
+        """
+
+        # Appends trim the arrays, so the lookup is done before the lock is let go
+        with self.__lock:
+            chain = self.chains.get(rid)
+            if (chain is not None):
+                self.chains.move_to_end(rid)
+                tail_rid, position = self.__locate(chain, rid in self.truncated, relative_version)
+        if (chain is None):
+            tail_rids, truncated = self.__build(rid)
+            tail_rid, position = self.__locate(tail_rids, truncated, relative_version)
+
+        # Versions older than the array are walked to from its oldest tail RID
+        while (position < 0 and tail_rid != -1):
+            tail_rid = self.page_directory.get_column_value(tail_rid, Config.indirection_column_idx, tail_flg=1)
+            position += 1
+        return tail_rid
+
+    def __locate(self, chain, truncated, relative_version):
+        """Look a relative version up in the tail RIDs of a record
+
+        Returns
+        -------
+        tail_rid : int
+            The tail RID of the version, the oldest one
+            the chain has if it is older, or -1 if the
+            version is the base record
+        position : int
+            The versions left to walk back from tail_rid
+        """
+
+        position = len(chain) - 1 + relative_version
+        if (position >= 0):
+            return chain[position], 0
+        if (not truncated or len(chain) == 0):
+            return -1, 0
+        return chain[0], position
+
+    def __build(self, rid):
+        """Walk the newest part of the indirection chain of a record once
+
+        Parameters
+        ----------
+        rid : int
+            The base RID
+
+        Returns
+        -------
+        tail_rids : list<int>
+            The newest tail RIDs of the record from oldest to
+            newest, a copy of the kept array that appends do
+            not change
+        truncated : bool
+            Whether the record has older tail RIDs than the chain
+        """
+
+        newest = self.page_directory.get_column_value(rid, Config.indirection_column_idx, tail_flg=0)
+
+        tail_rids = []
+        tail_rid = newest
+        while (tail_rid != -1 and len(tail_rids) < self.max_depth):
+            tail_rids.append(tail_rid)
+            tail_rid = self.page_directory.get_column_value(tail_rid, Config.indirection_column_idx, tail_flg=1)
+        tail_rids.reverse()
+        chain = array('q', tail_rids)
+        truncated = tail_rid != -1
+
+        # Only keep the chain if no update slipped in while walking it
+        with self.__lock:
+            current = self.page_directory.get_column_value(rid, Config.indirection_column_idx, tail_flg=0)
+            if (current == newest):
+                self.chains[rid] = chain
+                if (truncated):
+                    self.truncated.add(rid)
+                while (len(self.chains) > self.max_records):
+                    evicted, _ = self.chains.popitem(last=False)
+                    self.truncated.discard(evicted)
+
+        return tail_rids, truncated
@@ -0,0 +1,537 @@
+"""
+This is responsible for the WriteAheadLog of a
+database, an append-only file of every insert,
+update and delete.  A Transaction is durable once
+its commit record reaches the disk, without waiting
+for the BufferPool to write its pages back.
+
+Concurrent commits share one fsync (group commit).
+The first commit of a group holds the log for a short
+commit delay so commits of other threads can join it,
+then writes and syncs every record buffered so far.
+
+A Transaction appends its commit record and waits for
+the sync before it releases its locks, so no other
+Transaction sees changes that a crash could still lose.
+Commits that do not conflict still append while the
+first one waits and share its sync.
+
+Data is stored on disk with the following format:
+
+base_lsn (8 Bytes)
+[
+    length (4 Bytes)
+    checksum (4 Bytes)
+    type (1 Byte)
+    transaction_id (8 Bytes)
+    name_length (2 Bytes)
+    name (name_length Bytes)
+    key (8 Bytes)
+    [
+        num_values (2 Bytes)
+        mask (ceil(num_values / 8) Bytes)
+        values (8 Bytes) x values set in the mask
+    ] x 2
+] x n_records
+
+Where:
+  * length counts the bytes after the checksum
+  * the checksum is the crc32 of those bytes
+  * the first value group holds the new column values
+    and the second one the old column values, None
+    values are left out of the mask
+  * the LSN of a record is base_lsn plus the offset of
+    its end after the header, so LSNs keep growing when
+    the start of the log is cut off after a checkpoint
+
+Queries that run outside a Transaction are logged
+with transaction id 0 and count as committed.
+"""
+
+# System imports
+from collections import namedtuple
+from contextlib import contextmanager
+import os
+import struct
+import threading
+import time
+import zlib
+
+# Local imports
+from config import Config
+
+WAL_FILE = 'wal.log'
+
+INSERT_RECORD = 0
+UPDATE_RECORD = 1
+DELETE_RECORD = 2
+COMMIT_RECORD = 3
+ABORT_RECORD = 4
+
+AUTOCOMMIT_TRANSACTION = 0
+
+BASE_LSN = struct.Struct('<q')
+FRAME = struct.Struct('<II')
+HEADER = struct.Struct('<BqH')
+KEY = struct.Struct('<q')
+NUM_VALUES = struct.Struct('<H')
+
+LogRecord = namedtuple('LogRecord', ['lsn', 'type', 'transaction_id', 'table', 'key', 'new_values', 'old_values'])
+
+# The Transaction run by each thread
+_context = threading.local()
+
+def current_transaction():
+    """Get the id of the Transaction run by this thread
+
+    Returns
+    -------
+    transaction_id : int
+        The id or AUTOCOMMIT_TRANSACTION outside a Transaction
+    """
+
+    return getattr(_context, 'transaction_id', AUTOCOMMIT_TRANSACTION)
+
+@contextmanager
+def transaction_context(transaction_id):
+    """Log the queries of this thread as part of a Transaction
+
+    Parameters
+    ----------
+    transaction_id : int
+        The id of the Transaction
+    """
+
+    previous = current_transaction()
+    _context.transaction_id = transaction_id
+    try:
+        yield
+    finally:
+        _context.transaction_id = previous
+
+def _encode_values(values):
+    mask = 0
+    present = []
+    for i, value in enumerate(values):
+        if value is not None:
+            mask |= 1 << i
+            present.append(value)
+    return (NUM_VALUES.pack(len(values))
+        + mask.to_bytes((len(values) + 7) // 8, 'little')
+        + struct.pack(f'<{len(present)}q', *present))
+
+def _decode_values(data, offset):
+    num_values = NUM_VALUES.unpack_from(data, offset)[0]
+    offset += NUM_VALUES.size
+    mask_size = (num_values + 7) // 8
+    mask = int.from_bytes(data[offset:offset + mask_size], 'little')
+    offset += mask_size
+
+    values = [None] * num_values
+    for i in range(num_values):
+        if (mask >> i) & 1:
+            values[i] = KEY.unpack_from(data, offset)[0]
+            offset += KEY.size
+    return values, offset
+
+def encode_record(record_type, transaction_id, table_name, key=0, new_values=(), old_values=()):
+    """Encode a log record with its frame
+
+    Returns
+    -------
+    data : bytes
+        The record as it is written to the log
+    """
+
+    name = table_name.encode()
+    payload = (HEADER.pack(record_type, transaction_id, len(name)) + name
+        + KEY.pack(key) + _encode_values(new_values) + _encode_values(old_values))
+    return FRAME.pack(len(payload), zlib.crc32(payload)) + payload
+
+def _frames(data):
+    """Iterate over the end offset and payload of every complete record"""
+
+    offset = BASE_LSN.size
+    while (offset + FRAME.size <= len(data)):
+        length, checksum = FRAME.unpack_from(data, offset)
+        start = offset + FRAME.size
+        payload = data[start:start + length]
+        if (len(payload) < length or zlib.crc32(payload) != checksum):
+            return
+        offset = start + length
+        yield offset, payload
+
+def read_records(path):
+    """Read the records of a log
+
+    Reading stops at the first torn or corrupt
+    record, which was never acknowledged as durable.
+
+    Parameters
+    ----------
+    path : str
+        The path of the log file
+
+    Yields
+    ------
+    record : LogRecord
+        Every complete record in the order it was logged
+    """
+
+    if (not os.path.exists(path)):
+        return
+
+    with open(path, 'rb') as fp:
+        data = fp.read()
+    if (len(data) < BASE_LSN.size):
+        return
+    base_lsn = BASE_LSN.unpack_from(data)[0] - BASE_LSN.size
+
+    for offset, payload in _frames(data):
+        record_type, transaction_id, name_length = HEADER.unpack_from(payload, 0)
+        position = HEADER.size
+        name = payload[position:position + name_length].decode()
+        position += name_length
+        key = KEY.unpack_from(payload, position)[0]
+        new_values, position = _decode_values(payload, position + KEY.size)
+        old_values, position = _decode_values(payload, position)
+        yield LogRecord(base_lsn + offset, record_type, transaction_id, name, key, new_values, old_values)
+
+class WriteAheadLog():
+    """The log of every change to a database
+
+    Records are buffered in memory and written by a
+    single writer at a time.  A commit returns once
+    every record up to its commit record is synced.
+    """
+
+    def __init__(self, path, group_commit=Config.wal_group_commit, commit_delay=Config.wal_commit_delay, buffer_size=Config.wal_buffer_size, checkpoint_size=Config.checkpoint_log_size, base_lsn=0):
+        """Open the log of a database
+
+        Parameters
+        ----------
+        path : str
+            The path of the log file
+        group_commit : bool
+            Whether concurrent commits share one fsync
+            instead of syncing once per commit
+        commit_delay : float
+            Seconds the first commit of a group waits
+            for other commits to join it
+        buffer_size : int
+            Bytes of records buffered before they are
+            written out without waiting for a commit
+        checkpoint_size : int
+            Bytes of records after which checkpoint_needed is set
+        base_lsn : int
+            The first LSN of a new log, which must not be
+            below the LSN of any checkpoint
+        """
+
+        directory = os.path.dirname(path)
+        if (directory != '' and not os.path.exists(directory)):
+            os.makedirs(directory)
+
+        self.path = path
+        self.group_commit = group_commit
+        self.commit_delay = commit_delay
+        self.buffer_size = buffer_size
+        self.checkpoint_size = checkpoint_size
+
+        # A new log starts with its header, a header that never made it to disk is rewritten
+        if (not os.path.exists(path) or os.path.getsize(path) < BASE_LSN.size):
+            self.__replace(BASE_LSN.pack(base_lsn))
+        with open(path, 'rb') as fp:
+            data = fp.read()
+        self.base_lsn = BASE_LSN.unpack_from(data)[0]
+
+        # A torn record at the end would hide every record appended after it
+        end = BASE_LSN.size
+        for end, _ in _frames(data):
+            pass
+        if (end < len(data)):
+            with open(path, 'r+b') as fp:
+                fp.truncate(end)
+                os.fsync(fp.fileno())
+        self.fp = open(path, 'ab')
+
+        self.lock = threading.Lock()
+        self.written = threading.Condition(self.lock)
+        self.buffer = []  # Encoded records that are not written yet
+        self.buffered_bytes = 0
+        self.writing = False  # Whether a thread is writing the buffer
+        self.next_lsn = self.base_lsn + self.fp.tell() - BASE_LSN.size  # LSN of the last record appended
+        self.durable_lsn = self.next_lsn  # LSN of the last record synced
+        self.active = {}  # Transactions with records but no commit or abort yet mapped to the LSN their records start at
+        self.commit_lsn = self.next_lsn  # LSN of the last commit record appended
+        self.checkpoint_lsn = self.next_lsn  # LSN of the last checkpoint
+        self.checkpoint_needed = threading.Event()  # Set once checkpoint_size bytes were logged since the last checkpoint
+
+        # Statistics
+        self.num_records = 0
+        self.num_commits = 0
+        self.num_syncs = 0
+
+    def append(self, record_type, table_name, key=0, new_values=(), old_values=(), transaction_id=None):
+        """Append a record to the log
+
+        Parameters
+        ----------
+        record_type : int
+            INSERT_RECORD, UPDATE_RECORD or DELETE_RECORD
+        table_name : str
+            The table that was changed
+        key : int
+            The primary key of the record
+        new_values : list<int | None>
+            The column values written
+        old_values : list<int | None>
+            The column values that were overwritten
+        transaction_id : int | None
+            (Default is the Transaction of this thread)
+
+        Returns
+        -------
+        lsn : int
+            The LSN of the record
+        """
+
+        if (transaction_id is None):
+            transaction_id = current_transaction()
+        data = encode_record(record_type, transaction_id, table_name, key, new_values, old_values)
+
+        with self.lock:
+            if (transaction_id != AUTOCOMMIT_TRANSACTION and transaction_id not in self.active):
+                self.active[transaction_id] = self.next_lsn
+            lsn = self.__buffer(data)
+            if (lsn - self.checkpoint_lsn >= self.checkpoint_size):
+                self.checkpoint_needed.set()
+
+            # Queries outside of Transactions never commit, bound the memory they hold
+            if (self.buffered_bytes >= self.buffer_size and not self.writing):
+                self.writing = True
+                self.__write(sync=False)
+        return lsn
+
+    def log_insert(self, table_name, key, columns):
+        return self.append(INSERT_RECORD, table_name, key, columns)
+
+    def log_update(self, table_name, key, columns, old_columns):
+        return self.append(UPDATE_RECORD, table_name, key, columns, old_columns)
+
+    def log_delete(self, table_name, key, old_columns):
+        return self.append(DELETE_RECORD, table_name, key, (), old_columns)
+
+    def commit(self, transaction_id):
+        """Make the records of a Transaction durable
+
+        Returns once the commit record is synced.
+
+        Parameters
+        ----------
+        transaction_id : int
+            The id of the Transaction
+
+        Returns
+        -------
+        lsn : int
+            The LSN the Transaction is durable at
+        """
+
+        lsn = self.append_commit(transaction_id)
+        self.wait_durable(lsn)
+        return lsn
+
+    def append_commit(self, transaction_id):
+        """Append the commit record of a Transaction
+
+        The Transaction is not durable until wait_durable
+        returns for the LSN, unless group commit is off and
+        every commit syncs on its own before it returns.
+        A Transaction that changed
+        nothing is not logged and is durable once every
+        commit it may have read from is.
+
+        Parameters
+        ----------
+        transaction_id : int
+            The id of the Transaction
+
+        Returns
+        -------
+        lsn : int
+            The LSN to wait for
+        """
+
+        with self.lock:
+            if (transaction_id not in self.active):
+                return self.commit_lsn
+            del self.active[transaction_id]
+            self.commit_lsn = lsn = self.__buffer(encode_record(COMMIT_RECORD, transaction_id, ''))
+            self.num_commits += 1
+
+            if (not self.group_commit):
+                while (self.writing):
+                    self.written.wait()
+                self.writing = True
+                self.__write(sync=True)
+            return lsn
+
+    def wait_durable(self, lsn):
+        """Wait until every record up to an LSN is synced
+
+        Parameters
+        ----------
+        lsn : int
+            The LSN returned by append_commit
+        """
+
+        with self.lock:
+            while (self.durable_lsn < lsn):
+                if (self.writing):
+                    self.written.wait()
+                    continue
+
+                # Lead a group, commits arriving during the delay wait for this sync
+                self.writing = True
+                if (self.group_commit and self.commit_delay > 0):
+                    self.lock.release()
+                    time.sleep(self.commit_delay)
+                    self.lock.acquire()
+                self.__write(sync=True)
+
+    def abort(self, transaction_id):
+        """Mark the records of a Transaction as rolled back
+
+        Parameters
+        ----------
+        transaction_id : int
+            The id of the Transaction
+        """
+
+        with self.lock:
+            if (transaction_id not in self.active):
+                return
+            del self.active[transaction_id]
+            self.__buffer(encode_record(ABORT_RECORD, transaction_id, ''))
+
+    def flush(self):
+        """Write and sync every buffered record"""
+
+        with self.lock:
+            while (self.writing):
+                self.written.wait()
+            if (self.durable_lsn < self.next_lsn):
+                self.writing = True
+                self.__write(sync=True)
+
+    def oldest_needed_lsn(self, lsn):
+        """Get the LSN the log must be kept from
+
+        Parameters
+        ----------
+        lsn : int
+            The oldest checkpoint of every table
+
+        Returns
+        -------
+        lsn : int
+            The oldest checkpoint or the first record of a
+            Transaction that is still running, which may
+            have to be undone, whichever comes first
+        """
+
+        with self.lock:
+            return min([lsn] + list(self.active.values()))
+
+    def trim(self, lsn):
+        """Drop the records up to an LSN
+
+        The rest of the log is copied to a new file that
+        replaces the log, so a crash keeps either one.
+
+        Parameters
+        ----------
+        lsn : int
+            An LSN at the end of a record
+        """
+
+        with self.lock:
+            while (self.writing):
+                self.written.wait()
+            if (self.buffer):
+                self.fp.write(b''.join(self.buffer))
+                self.buffer = []
+                self.buffered_bytes = 0
+            self.fp.flush()
+            lsn = max(self.base_lsn, min(lsn, self.next_lsn))
+
+            with open(self.path, 'rb') as fp:
+                fp.seek(BASE_LSN.size + lsn - self.base_lsn)
+                rest = fp.read()
+            self.fp.close()
+            self.__replace(BASE_LSN.pack(lsn) + rest)
+            self.fp = open(self.path, 'ab')
+            self.base_lsn = lsn
+            self.durable_lsn = self.next_lsn
+
+    def truncate(self):
+        """Empty the log
+
+        Only safe once every change it holds is in
+        the table files, such as after every table
+        of the database was closed.
+        """
+
+        self.trim(self.next_lsn)
+        with self.lock:
+            self.active.clear()
+
+    def __replace(self, data):
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'wb') as fp:
+            fp.write(data)
+            fp.flush()
+            os.fsync(fp.fileno())
+        os.replace(temp_path, self.path)
+
+    def close(self):
+        self.flush()
+        self.fp.close()
+
+    def __buffer(self, data):
+        """Add an encoded record to the buffer, the lock must be held"""
+
+        self.buffer.append(data)
+        self.buffered_bytes += len(data)
+        self.next_lsn += len(data)
+        self.num_records += 1
+        return self.next_lsn
+
+    def __write(self, sync):
+        """Write the buffer out
+
+        The lock must be held and self.writing set.  The
+        lock is released during the write, so records
+        appended meanwhile wait for the next writer.
+        """
+
+        buffer = self.buffer
+        end = self.next_lsn
+        self.buffer = []
+        self.buffered_bytes = 0
+
+        self.lock.release()
+        try:
+            if (buffer):
+                self.fp.write(b''.join(buffer))
+                self.fp.flush()
+            if (sync):
+                os.fsync(self.fp.fileno())
+        finally:
+            self.lock.acquire()
+            self.writing = False
+            if (sync):
+                self.durable_lsn = end
+                self.num_syncs += 1
+            self.written.notify_all()
@@ -3,8 +3,13 @@ This contains various wrappers for handling
 threaded queries.
 """
 
+from lstore.lock_manager import ColumnMask, Granule, GRANULE_COVERS, TABLE_GRANULE, range_granule
 from lstore.query import Query
 from config import Config
+import math
+
+# The record lock of the gap after the last key of an index
+SUPREMUM_KEY = math.inf
 
 
 class QueryWrapper():
@@ -41,30 +46,15 @@ class QueryWrapper():
         self.transaction = transaction
         self.args = args
         self.lock_manager = self.table.lock_manager
-        self.work_flag = False
-
-        # While we could find these values at initialization
-        # it requires the index lock, so wait until try_run.
-        # Also saves some work.
+        self.writes = self.query_function_type in [Query.insert, Query.delete, Query.update, Query.increment]
 
-        # In case of delete roll back
-        if self.query_function_type == Query.insert:
-            self.primary_key = self.args[self.table.primary_key]
+        # Found by try_run under the index lock, the base RID the query changes
+        self.rid = None
 
-        if self.query_function_type == Query.delete:
-            self.delete_rid = None
-
-        # in case of update roll back
-        if self.query_function_type in [Query.update, Query.increment]:
-            self.update_schema = None
-            primary_key_location_in_args = self.table.primary_key + 1
-            if self.args[primary_key_location_in_args] is None:
-                self.primary_key = self.args[0]
-            else:
-                self.primary_key = self.args[primary_key_location_in_args]
-            self.delete_rid = None
-            self.old_record = [None] * self.table.num_columns
-        # Determine hooks
+        # The gap before a key is locked like one more column of its record
+        self.gap_column = self.table.num_columns + Config.column_data_offset
+        primary_index = self.index.indices[self.table.primary_key]
+        self.next_key_locking = hasattr(primary_index, 'keys_from')
 
     def try_run(self):
         """Try run
@@ -82,52 +72,217 @@ class QueryWrapper():
         """
 
         # Find which resources are accessed
-
         resources = self.__find_resources(*self.args)
 
-        
-        # request index lock first
-        # Do this seperately from the rest in case query is delete
-        # and we have to find RID before query in case of roll back
-        lock_type, unique_id, transaction = resources[0]
-        lock = self.table.lock_manager.request(lock_type, unique_id, transaction)
-        if lock == None:
-            return False
-        
-        # request lock on primary key
-        for i in range(1, len(resources)):
-            lock_type, unique_id, transaction = resources[i]
+        # Request the locks from the table down to the records
+        for lock_type, unique_id, transaction in resources:
             lock = self.table.lock_manager.request(lock_type, unique_id, transaction)
-        
             if lock == None:
                 return False
 
-        # Update the query rid
-        if self.query_function_type == Query.delete:
+        # The gaps to lock depend on the keys in the index, so they are locked with
+        # the latch held and the query runs under it once every lock is granted
+        while True:
+            # Other transactions may run queries on the table at the same time
+            with self.table.index_latch:
+                blocked = None
+                for lock_type, unique_id, transaction, instant in self.__gap_resources(*self.args):
+                    if self.lock_manager.request(lock_type, unique_id, transaction, timeout=0, instant=instant) is None:
+                        blocked = (lock_type, unique_id, transaction, instant)
+                        break
+                if blocked is None:
+                    return self.__run_latched()
+
+            # Wait for the conflicting lock without the latch, then look at the index again
+            lock_type, unique_id, transaction, instant = blocked
+            if self.lock_manager.request(lock_type, unique_id, transaction, instant=instant) is None:
+                return False
+
+    def __run_latched(self):
+        """Run the query with its locks held and record its before-images"""
+
+        # Find the record a delete or update changes and what it will overwrite
+        page_directory = self.table.page_directory
+        if self.query_function_type == Query.insert:
+            # The latch keeps other inserts from taking the next RID first
+            self.rid = page_directory.num_records
+
+        elif self.query_function_type == Query.delete:
             rids = self.table.index.locate(column=self.table.primary_key, value=self.args[0])
             if len(rids) != 1:
                 return None
-            self.delete_rid = rids[0]
+            self.rid = rids[0]
+            old_values = self.__indexed_values(range(self.table.num_columns))
 
-        # update the query schema
-        elif self.query_function_type in [Query.update, Query.increment] :
+        elif self.query_function_type in [Query.update, Query.increment]:
             rids = self.table.index.locate(column=self.table.primary_key, value=self.args[0])
             if len(rids) != 1:
                 return None
-            rid = rids[0]
-            self.delete_rid = rid
-            self.update_schema = self.table.page_directory.get_column_value(rid, Config.schema_encoding_column_idx)
-
-            for column in range(self.table.num_columns):
-                self.old_record[column] = self.table.page_directory.get_data_attribute(rid, column)
+            self.rid = rids[0]
+            old_header = {
+                Config.indirection_column_idx: page_directory.get_column_value(self.rid, Config.indirection_column_idx),
+                Config.schema_encoding_column_idx: page_directory.get_column_value(self.rid, Config.schema_encoding_column_idx),
+            }
+            if self.query_function_type == Query.increment:
+                updated = [self.args[1]]
+            else:
+                updated = [column for column, value in enumerate(self.args[1:]) if value is not None]
+            old_values = self.__indexed_values(updated)
 
         query_result = self.query_function(*self.args)
         if query_result == False:
             return None
-        else:
-            self.work_flag = True
-            return query_result != False
+
+        # Record the before-images in the order the query made its changes
+        undo_log = self.transaction.undo_log
+        if self.query_function_type == Query.insert:
+            for column, index in enumerate(self.index.indices):
+                if index is not None:
+                    undo_log.record_index_insert(self.table, column, self.args[column], self.rid)
+            undo_log.record_write(self.table, self.rid, Config.rid_column_idx, -1)
+
+        elif self.query_function_type == Query.delete:
+            for column, value in old_values:
+                undo_log.record_index_remove(self.table, column, value, self.rid)
+            undo_log.record_write(self.table, self.rid, Config.rid_column_idx, self.rid)
+
+        elif self.query_function_type in [Query.update, Query.increment]:
+            for column, value in old_values:
+                new_value = page_directory.get_data_attribute(self.rid, column)
+                undo_log.record_index_update(self.table, column, value, new_value, self.rid)
+            # The new tail record did not exist before
+            tail_rid = page_directory.get_column_value(self.rid, Config.indirection_column_idx)
+            undo_log.record_write(self.table, tail_rid, Config.rid_column_idx, -1, tail_flg=1)
+            undo_log.record_header(self.table, self.rid, old_header)
+            undo_log.record_chain(self.table, self.rid)
+
+        return query_result != False
+
+    def __indexed_values(self, columns):
+        """Read the values of the indexed columns among some columns of the record"""
+
+        return [
+            (column, self.table.page_directory.get_data_attribute(self.rid, column))
+            for column in columns if self.index.indices[column] is not None
+        ]
     
+    def __record_resources(self, key, read_columns=(), write_columns=()):
+        """The locks a query takes on a record and its key range
+
+        Once a Transaction has locked more records of a key
+        range than Config.lock_escalation_threshold, it locks
+        the whole range instead.  A range it holds in a mode
+        covering the query needs no record lock at all.
+        """
+
+        granule = range_granule(key)
+        range_mode = Config.EXCLUSIVE_LOCK if write_columns else Config.SHARED_LOCK
+        held = self.lock_manager.held_mode(granule, self.transaction)
+        if held is not None and range_mode in GRANULE_COVERS[held]:
+            return []
+
+        keys = self.transaction.record_locks.setdefault((id(self.table), granule), set())
+        if key not in keys and len(keys) >= Config.lock_escalation_threshold:
+            return [(range_mode, granule, self.transaction)]
+        keys.add(key)
+
+        intention = Config.INTENTION_EXCLUSIVE_LOCK if write_columns else Config.INTENTION_SHARED_LOCK
+        return [(intention, granule, self.transaction)] + self.__record_locks(key, read_columns, write_columns)
+
+    def __record_locks(self, primary, read_columns=(), write_columns=()):
+        """The locks a query takes on the physical columns of a record
+
+        With Config.lock_column_masks this is a single
+        record lock with a bit for every column, otherwise
+        a shared or exclusive lock per column.
+        """
+
+        if Config.lock_column_masks:
+            read_mask = sum(1 << i for i in read_columns)
+            write_mask = sum(1 << i for i in write_columns)
+            if read_mask == 0 and write_mask == 0:
+                return []
+            return [(ColumnMask(read_mask, write_mask), primary, self.transaction)]
+
+        resources = [(Config.EXCLUSIVE_LOCK, (primary, i), self.transaction) for i in write_columns]
+        resources.extend((Config.SHARED_LOCK, (primary, i), self.transaction) for i in read_columns)
+        return resources
+
+    def __next_key(self, key):
+        """The key after a key in the primary index, or SUPREMUM_KEY after the last one"""
+
+        _, next_key = self.index.locate_keys(key, key, self.table.primary_key)
+        return SUPREMUM_KEY if next_key is None else next_key
+
+    def __gap_locks(self, key, read=False, instant=False):
+        """The locks on the gap before a key
+
+        A gap held until the commit is under the key range
+        of its key like a record lock, while an instant one
+        only checks that no other transaction reads or
+        changes the gap.
+        """
+
+        columns = [self.gap_column]
+        if key == SUPREMUM_KEY:
+            resources = self.__record_locks(key, read_columns=columns) if read else self.__record_locks(key, write_columns=columns)
+        elif instant:
+            resources = [(Config.INTENTION_EXCLUSIVE_LOCK, range_granule(key), self.transaction)]
+            resources.extend(self.__record_locks(key, write_columns=columns))
+        elif read:
+            resources = self.__record_resources(key, read_columns=columns)
+        else:
+            resources = self.__record_resources(key, write_columns=columns)
+        return [(lock_type, unique_id, transaction, instant) for lock_type, unique_id, transaction in resources]
+
+    def __locks_keys(self, *args):
+        """Whether a sum locks its keys and gaps, wide sums lock their key ranges whole"""
+
+        return self.next_key_locking and args[1] - args[0] < Config.lock_escalation_threshold
+
+    def __gap_resources(self, *args):
+        """Find the next-key locks of a query
+
+        Called with the index latch held.  A sum locks every
+        key of its range with the gap before it and the gap
+        after the last one, so no key can be inserted into
+        the range.  An insert checks the gap it goes into and
+        a delete locks the gap it widens until the commit.
+
+        Returns
+        -------
+        resources
+            list of locks and whether they are instant
+        """
+
+        if not self.next_key_locking:
+            return []
+
+        resources = []
+        if self.query_function_type in [Query.sum, Query.sum_version]:
+            if not self.__locks_keys(*args):
+                return []
+            keys, next_key = self.index.locate_keys(args[0], args[1], self.table.primary_key)
+            for key in keys:
+                for lock_type, unique_id, transaction in self.__record_resources(key, read_columns=[Config.rid_column_idx, self.gap_column]):
+                    resources.append((lock_type, unique_id, transaction, False))
+            resources.extend(self.__gap_locks(SUPREMUM_KEY if next_key is None else next_key, read=True))
+
+        elif self.query_function_type == Query.insert:
+            resources.extend(self.__gap_locks(self.__next_key(args[self.table.primary_key]), instant=True))
+
+        elif self.query_function_type == Query.delete:
+            resources.extend(self.__gap_locks(self.__next_key(args[0])))
+
+        elif self.query_function_type == Query.update:
+            # A new primary key deletes the old key and inserts the new one
+            new_primary = args[1 + self.table.primary_key]
+            if new_primary is not None and new_primary != args[0]:
+                resources.extend(self.__gap_locks(self.__next_key(args[0])))
+                resources.extend(self.__gap_locks(self.__next_key(new_primary), instant=True))
+
+        return resources
+
     def __find_resources(self, *args):
         """Find resources
 
@@ -146,29 +301,26 @@ class QueryWrapper():
             list of locks needed for query.
         """
 
-        # Store a list of resources
-        resources = []
+        # Store a list of resources, writes and reads announce their record locks on the table
+        table_mode = Config.INTENTION_EXCLUSIVE_LOCK if self.writes else Config.INTENTION_SHARED_LOCK
+        resources = [(table_mode, TABLE_GRANULE, self.transaction)]
+        all_columns = range(self.table.num_columns + Config.column_data_offset)
+        # Removing a key also widens the gap before it
+        key_columns = range(self.gap_column + 1)
         
         # Compare which function to use
         if self.query_function_type == Query.delete:
-            # Write only that affects only one column
-            resources.append((Config.EXCLUSIVE_LOCK, ('Index'), self.transaction))
-            resources.append((Config.EXCLUSIVE_LOCK, (args[0], Config.rid_column_idx), self.transaction))
             primary = args[0]
-            for i in range(self.table.num_columns + Config.column_data_offset):
-                resources.append((Config.EXCLUSIVE_LOCK, (primary, i), self.transaction))
+            resources.extend(self.__record_resources(primary, write_columns=key_columns))
 
         elif self.query_function_type == Query.insert:
             primary = args[self.table.primary_key]
 
-            # Write only on all columns
-            resources.append((Config.EXCLUSIVE_LOCK, ('Index'), self.transaction))
-            for i in range(self.table.num_columns + Config.column_data_offset):
-                resources.append((Config.EXCLUSIVE_LOCK, (primary, i), self.transaction))
+            # Write only on all columns, the instant gap lock checks the gap it splits
+            resources.extend(self.__record_resources(primary, write_columns=all_columns))
 
         elif self.query_function_type in [Query.update, Query.increment]:
             # IMPORTANT: In an update the exclusive lock might not always be needed
-            resources.append((Config.EXCLUSIVE_LOCK, ('Index'), self.transaction))
             primary = args[0]
             # TODO: Shared lock on RID to increase speed
 
@@ -176,73 +328,37 @@ class QueryWrapper():
             # an exclusive lock will eventually be needed on all columns
             # so just get exclusive instead of exclsuive and shared for 
             # the read operations
-            for i in range(self.table.num_columns+Config.column_data_offset):
-                resources.append((Config.EXCLUSIVE_LOCK, (primary, i), self.transaction))
+            # A new primary key moves the record to another key
+            new_primary = args[1 + self.table.primary_key] if self.query_function_type == Query.update else None
+            if new_primary is not None and new_primary != primary:
+                resources.extend(self.__record_resources(primary, write_columns=key_columns))
+                resources.extend(self.__record_resources(new_primary, write_columns=all_columns))
+            else:
+                resources.extend(self.__record_resources(primary, write_columns=all_columns))
 
         elif self.query_function_type == Query.select or self.query_function_type == Query.select_version:
             project_columns = args[2]
             primary = args[0]
 
+            if args[1] != self.table.primary_key:
+                # Any record may match a value of another column
+                return [(Config.SHARED_LOCK, TABLE_GRANULE, self.transaction)]
+
             # read only on just the columns required in the select args
-            resources.append((Config.SHARED_LOCK, ('Index'), self.transaction))
-            # just in case we want to get rid of phantom reads
-            # resources.append((Config.SHARED_LOCK, (primary, Config.rid_column_idx), self.transaction))
-            for i in range(len(project_columns)):
-                if project_columns[i]:
-                    resources.append((Config.SHARED_LOCK, (primary, i+Config.column_data_offset), self.transaction))
+            read_columns = [i + Config.column_data_offset for i in range(len(project_columns)) if project_columns[i]]
+            resources.extend(self.__record_resources(primary, read_columns=read_columns))
 
         elif self.query_function_type == Query.sum or self.query_function_type == Query.sum_version:
-            # read only on just the primary key column
-            # WARNING: sum may function on a range that includes the final value
-            # If so, must change range to (args[0], args[1]+1)
-            resources.append((Config.SHARED_LOCK, ('Index'), self.transaction))
-            for i in range(args[0], args[1]):
-                resources.append((Config.SHARED_LOCK, (i, Config.rid_column_idx), self.transaction))
+            if self.__locks_keys(*args):
+                # The keys and gaps are locked with the index latch held
+                return resources
+
+            # The key ranges of the inclusive range are locked whole, which
+            # also keeps other transactions from inserting into them
+            first, last = range_granule(args[0]).id, range_granule(args[1]).id
+            if last - first >= Config.lock_escalation_threshold:
+                return [(Config.SHARED_LOCK, TABLE_GRANULE, self.transaction)]
+            for number in range(first, last + 1):
+                resources.append((Config.SHARED_LOCK, Granule('Range', number), self.transaction))
         
         return resources
-
-    def roll_back(self):
-        """Roll back changes
-
-        If the query is one that must
-        be reverted if transaction
-        aborts, roll back changes.
-        """        
-        if self.work_flag:
-
-            if self.query_function_type == Query.delete:
-                # Set deleted row rid back to original rid
-                # WARNING: I don't know if set_column_value will find the location given it's gravestone
-                # however, logically the location should still be able to be found based on how rid is made
-                self.table.page_directory.set_column_value(self.delete_rid, Config.rid_column_idx, self.delete_rid)
-                
-                num_columns = self.table.num_columns
-                record = [None] * num_columns
-                for column in range(num_columns):
-                    record[column] = self.table.page_directory.get_data_attribute(self.delete_rid, column)
-                self.index.maintain_insert(record, self.delete_rid)
-
-            elif self.query_function_type == Query.insert:
-                # Get rid of new record and set its rid to -1
-                rid = self.table.index.locate(column=self.table.primary_key, value=self.primary_key)[0]
-
-                self.table.page_directory.set_column_value(rid, Config.rid_column_idx, -1)
-                self.index.maintain_delete(rid)
-
-            elif self.query_function_type in [Query.update, Query.increment]:
-                # Get necessary data for roll back
-                rid = self.table.index.locate(column=self.table.primary_key, value = self.primary_key)[0]
-
-                ind = self.table.page_directory.get_column_value(rid, Config.indirection_column_idx)
-                old_ind = self.table.page_directory.get_column_value(ind, Config.indirection_column_idx, tail_flg=1)
-
-                # Update the index
-                self.index.maintain_update(rid, self.old_record)
-
-                # gravestone tail page
-                self.table.page_directory.set_column_value(ind, Config.rid_column_idx, -1, tail_flg=1)
-
-                # revert old base meta data back to original
-                self.table.page_directory.set_column_value(rid, Config.schema_encoding_column_idx, self.update_schema)
-                self.table.page_directory.set_column_value(rid, Config.indirection_column_idx, old_ind)
-
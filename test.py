@@ -8,6 +8,24 @@ from tests.test_priorityqueue import TestPriorityQueue
 from tests.test_everything import TestLstoreIndex, TestLstoreDB, TestTransactionUndo, UltimateLstoreTest, UltimateLstoreConcurrencyTest
 from tests.mergeTest import TestMerge
 from tests.mergeThreadTest import TestMergeThread
+from tests.test_tail_modes import TestCumulativeTails, TestNonCumulativeTails
+from tests.test_version_index import TestVersionIndex
+from tests.test_sparse_tails import TestSparseTails
+from tests.test_delta_buffer import TestDeltaBuffer
+from tests.test_compaction import TestCompaction, TestNonCumulativeCompaction
+from tests.test_vacuum import TestVacuum
+from tests.test_resident_metadata import TestResidentMetadata
+from tests.test_bitmap import TestBitmap, TestTombstones
+from tests.test_packed_headers import TestPackedHeaders
+from tests.test_segment import TestSegmentFile
+from tests.test_shared_pool import TestSharedBufferPool
+from tests.test_warm_set import TestWarmSet
+from tests.test_catalog import TestCatalog
+from tests.test_fast_start import TestFastStart
+from tests.test_wal import TestWriteAheadLog
+from tests.test_recovery import TestRecovery
+from tests.test_undo_log import TestUndoLog
+from tests.test_lock_manager import TestLockManager
 
 import unittest
 import argparse
@@ -42,7 +60,28 @@ TEST_LIST = [
     "UltimateLstoreTest",
     "UltimateLstoreConcurrencyTest",
     "TestMerge",
-    "TestMergeThread"
+    "TestMergeThread",
+    "TestCumulativeTails",
+    "TestNonCumulativeTails",
+    "TestVersionIndex",
+    "TestSparseTails",
+    "TestDeltaBuffer",
+    "TestCompaction",
+    "TestNonCumulativeCompaction",
+    "TestVacuum",
+    "TestResidentMetadata",
+    "TestBitmap",
+    "TestTombstones",
+    "TestPackedHeaders",
+    "TestSegmentFile",
+    "TestSharedBufferPool",
+    "TestWarmSet",
+    "TestCatalog",
+    "TestFastStart",
+    "TestWriteAheadLog",
+    "TestRecovery",
+    "TestUndoLog",
+    "TestLockManager"
     ]
 
 def main():
@@ -94,6 +133,27 @@ def main():
         suite.addTests(loader.loadTestsFromTestCase(TestTransactionUndo))
         suite.addTests(loader.loadTestsFromTestCase(UltimateLstoreTest))
         suite.addTests(loader.loadTestsFromTestCase(UltimateLstoreConcurrencyTest))
+        suite.addTests(loader.loadTestsFromTestCase(TestCumulativeTails))
+        suite.addTests(loader.loadTestsFromTestCase(TestNonCumulativeTails))
+        suite.addTests(loader.loadTestsFromTestCase(TestVersionIndex))
+        suite.addTests(loader.loadTestsFromTestCase(TestSparseTails))
+        suite.addTests(loader.loadTestsFromTestCase(TestDeltaBuffer))
+        suite.addTests(loader.loadTestsFromTestCase(TestCompaction))
+        suite.addTests(loader.loadTestsFromTestCase(TestNonCumulativeCompaction))
+        suite.addTests(loader.loadTestsFromTestCase(TestVacuum))
+        suite.addTests(loader.loadTestsFromTestCase(TestResidentMetadata))
+        suite.addTests(loader.loadTestsFromTestCase(TestBitmap))
+        suite.addTests(loader.loadTestsFromTestCase(TestTombstones))
+        suite.addTests(loader.loadTestsFromTestCase(TestPackedHeaders))
+        suite.addTests(loader.loadTestsFromTestCase(TestSegmentFile))
+        suite.addTests(loader.loadTestsFromTestCase(TestSharedBufferPool))
+        suite.addTests(loader.loadTestsFromTestCase(TestWarmSet))
+        suite.addTests(loader.loadTestsFromTestCase(TestCatalog))
+        suite.addTests(loader.loadTestsFromTestCase(TestFastStart))
+        suite.addTests(loader.loadTestsFromTestCase(TestWriteAheadLog))
+        suite.addTests(loader.loadTestsFromTestCase(TestRecovery))
+        suite.addTests(loader.loadTestsFromTestCase(TestUndoLog))
+        suite.addTests(loader.loadTestsFromTestCase(TestLockManager))
         
     # Run the tests
     runner = unittest.TextTestRunner()
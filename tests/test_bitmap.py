@@ -0,0 +1,133 @@
+from data_structures.bitmap import Bitmap
+from lstore.db import Database
+from lstore.query import Query
+from lstore.transaction import Transaction
+import unittest
+import io
+import os
+import random
+import shutil
+
+class TestBitmap(unittest.TestCase):
+
+    def setUp(self):
+        random.seed(451)
+        self.n = 1000
+        self.bitmap = Bitmap(self.n)
+        self.expected = set(random.sample(range(self.n), 300))
+        for i in self.expected:
+            self.bitmap.set(i)
+
+    def test_get(self):
+        for i in range(self.n):
+            self.assertEqual(self.bitmap[i], i in self.expected)
+
+        with self.assertRaises(IndexError):
+            self.bitmap[self.n]
+
+    def test_clear(self):
+        for i in list(self.expected)[:100]:
+            self.bitmap.clear(i)
+            self.expected.remove(i)
+        self.assertEqual(self.bitmap.count(), len(self.expected))
+        self.assertListEqual(list(self.bitmap.iter_set()), sorted(self.expected))
+
+    def test_append(self):
+        bitmap = Bitmap()
+        bits = [random.random() < 0.5 for _ in range(200)]
+        for bit in bits:
+            bitmap.append(bit)
+        self.assertEqual(len(bitmap), 200)
+        self.assertListEqual([bitmap[i] for i in range(200)], bits)
+
+    def test_iterate(self):
+        self.assertListEqual(list(self.bitmap.iter_set()), sorted(self.expected))
+        self.assertListEqual(list(self.bitmap.iter_clear()), [i for i in range(self.n) if i not in self.expected])
+        self.assertListEqual(list(self.bitmap.iter_clear(70, 500)), [i for i in range(70, 500) if i not in self.expected])
+        self.assertListEqual(list(self.bitmap.iter_set(999, 5000)), [i for i in [999] if i in self.expected])
+
+    def test_iterate_full_words(self):
+        bitmap = Bitmap(300)
+        for i in range(64, 256):
+            bitmap.set(i)
+        self.assertListEqual(list(bitmap.iter_clear()), list(range(64)) + list(range(256, 300)))
+        self.assertListEqual(list(Bitmap(100).iter_set()), [])
+
+    def test_file(self):
+        fp = io.BytesIO()
+        self.bitmap.tofile(fp)
+        fp.seek(0)
+        bitmap = Bitmap.fromfile(fp)
+        self.assertEqual(len(bitmap), self.n)
+        self.assertListEqual(list(bitmap.iter_set()), sorted(self.expected))
+
+
+class TestTombstones(unittest.TestCase):
+    """Unit testing the tombstone bitmap of a table"""
+
+    def setUp(self):
+        self.db_path = './TEMP'
+        if (os.path.exists(self.db_path)):
+            shutil.rmtree(self.db_path, ignore_errors=True)
+
+        self.db = Database()
+        self.db.open(self.db_path)
+        self.table = self.db.create_table('Test', 3, 0, force_merge=True)
+        self.query = Query(self.table)
+        self.tombstones = self.table.page_directory.tombstones
+
+    def tearDown(self):
+        self.db = None
+        if (os.path.exists(self.db_path)):
+            shutil.rmtree(self.db_path, ignore_errors=True)
+
+    def test_delete_and_roll_back(self):
+        for i in range(10):
+            self.query.insert(i, i, i)
+        self.query.delete(3)
+        self.assertListEqual(list(self.tombstones.iter_set()), [3])
+
+        txn = Transaction()
+        txn.add_query(self.query.delete, self.table, 4)
+        txn.add_query(self.query.insert, self.table, *[10, 10, 10])
+        for wrapper in txn.queries:
+            wrapper.try_run()
+        self.assertListEqual(list(self.tombstones.iter_set()), [3, 4])
+        txn.abort()
+
+        # The rolled back insert leaves a deleted record behind
+        self.assertListEqual(list(self.tombstones.iter_set()), [3, 10])
+        self.assertFalse(self.table.page_directory.is_deleted(4))
+
+    def test_scans_skip_deleted_records(self):
+        for i in range(200):
+            self.query.insert(i, i, i)
+        for i in range(64, 192):
+            self.query.delete(i)
+
+        rids = [rid for _, rid in self.table.column_iterator(1)]
+        self.assertListEqual(rids, list(range(64)) + list(range(192, 200)))
+
+    def test_persisted(self):
+        for i in range(100):
+            self.query.insert(i, i, i)
+        for i in range(0, 100, 7):
+            self.query.delete(i)
+        self.db.close()
+
+        db = Database()
+        db.open(self.db_path)
+        table = db.get_table('Test')
+        self.assertListEqual(list(table.page_directory.tombstones.iter_set()), list(range(0, 100, 7)))
+        self.assertListEqual(Query(table).select(7, 0, [1, 1, 1]), [])
+
+        # Tables saved without a bitmap rebuild it from the RID column
+        db.close()
+        os.remove(os.path.join(self.db_path, 'Test', 'tombstones.data'))
+        db = Database()
+        db.open(self.db_path)
+        self.assertListEqual(list(db.get_table('Test').page_directory.tombstones.iter_set()), list(range(0, 100, 7)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -203,6 +203,15 @@ class TestBPlusTree(unittest.TestCase):
 
         self.assertEqual(tree.get_range(97, None), [(97, None), (98, None), (99, None)])
 
+    def test_keys_from(self):
+        tree = self.tree
+        for i in range(0, 300, 3):
+            tree.insert(i, None)
+
+        self.assertEqual(list(tree.keys_from(10))[:3], [12, 15, 18])
+        self.assertEqual(list(tree.keys_from(297)), [297])
+        self.assertEqual(list(tree.keys_from(298)), [])
+
     # This test revealed a flaw in my duplicate key approach.
     # As it was, we insert duplicate keys at will, and when we look for one of the items
     #   , we find the furthest left occurence of the key, and follow the link until we 
@@ -0,0 +1,115 @@
+from errors import TableDoesNotExistError, TableNotUniqueError
+from lstore.catalog import Catalog, CATALOG_FILE
+from lstore.db import Database
+from lstore.query import Query
+import unittest
+import os
+import shutil
+
+class TestCatalog(unittest.TestCase):
+    """Unit testing the Catalog and the table handles
+
+    Tables are listed in one file, opened on first
+    use and closed when their last user is done.
+    """
+
+    def setUp(self):
+        self.db_path = './TEMP'
+        if (os.path.exists(self.db_path)):
+            shutil.rmtree(self.db_path, ignore_errors=True)
+
+        self.db = Database()
+        self.db.open(self.db_path)
+
+    def tearDown(self):
+        self.db = None
+        if (os.path.exists(self.db_path)):
+            shutil.rmtree(self.db_path, ignore_errors=True)
+
+    def fill(self, name, num_columns=3):
+        table = self.db.create_table(name, num_columns, 0, force_merge=True)
+        query = Query(table)
+        for i in range(100):
+            query.insert(*[i] * num_columns)
+        return table
+
+    def test_catalog_persists(self):
+        self.fill('First')
+        self.fill('Second', 5)
+        self.db.close()
+
+        catalog = Catalog(self.db_path)
+        self.assertListEqual(catalog.names(), ['First', 'Second'])
+        self.assertEqual(catalog.get('Second'), (5, 0))
+        self.assertIsNone(catalog.get('Third'))
+
+        # Nothing is opened until it is used
+        db = Database()
+        db.open(self.db_path)
+        self.assertListEqual(db.table_names(), ['First', 'Second'])
+        self.assertDictEqual(db.tables, {})
+        self.assertListEqual(Query(db.get_table('Second')).select(7, 0, [1] * 5)[0].columns, [7] * 5)
+        self.assertListEqual(list(db.tables), ['Second'])
+
+    def test_handle_is_cached(self):
+        table = self.fill('Test')
+        self.assertIs(self.db.get_table('Test'), table)
+        self.assertIs(self.db.get_table('Test'), table)
+        self.assertEqual(self.db.references['Test'], 3)
+
+    def test_reference_counted_close(self):
+        self.fill('Test')
+        self.db.close()
+
+        db = Database()
+        db.open(self.db_path)
+        first = db.get_table('Test')
+        second = db.get_table('Test')
+        self.assertIs(first, second)
+
+        self.assertFalse(db.close_table('Test'))
+        self.assertIn('Test', db.tables)
+        self.assertTrue(db.close_table('Test'))
+        self.assertNotIn('Test', db.tables)
+        with self.assertRaises(TableDoesNotExistError):
+            db.close_table('Test')
+
+        # The closed table wrote its data back and opens again
+        self.assertListEqual(Query(db.get_table('Test')).select(42, 0, [1, 1, 1])[0].columns, [42, 42, 42])
+
+    def test_rebuild_catalog(self):
+        self.fill('First')
+        self.fill('Second', 2)
+        self.db.close()
+
+        # Databases written before the catalog find their tables from the meta data
+        os.remove(os.path.join(self.db_path, CATALOG_FILE))
+        db = Database()
+        db.open(self.db_path)
+        self.assertListEqual(db.table_names(), ['First', 'Second'])
+        self.assertTrue(os.path.exists(os.path.join(self.db_path, CATALOG_FILE)))
+        self.assertListEqual(Query(db.get_table('Second')).select(3, 0, [1, 1])[0].columns, [3, 3])
+
+    def test_drop_unopened_table(self):
+        self.fill('First')
+        self.fill('Second')
+        self.db.close()
+
+        db = Database()
+        db.open(self.db_path)
+        db.drop_table('First')
+        self.assertListEqual(db.table_names(), ['Second'])
+        self.assertFalse(os.path.exists(os.path.join(self.db_path, 'First')))
+        with self.assertRaises(TableDoesNotExistError):
+            db.get_table('First')
+
+        # The name can be used again
+        db.create_table('First', 1, 0, force_merge=True)
+        with self.assertRaises(TableNotUniqueError):
+            db.create_table('Second', 1, 0)
+        db.close()
+        self.assertListEqual(Catalog(self.db_path).names(), ['First', 'Second'])
+
+
+if __name__ == '__main__':
+    unittest.main()
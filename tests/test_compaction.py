@@ -0,0 +1,237 @@
+from lstore.db import Database
+from lstore.query import Query
+from lstore.transaction import Transaction
+import unittest
+import os
+import shutil
+import threading
+import time
+from config import Config
+
+class TestCompaction(unittest.TestCase):
+    """Unit testing the TailCompactor
+
+    Compaction drops dead and expired tail records
+    without changing what queries return.
+    """
+
+    is_cumulative = True
+
+    def setUp(self):
+        self.db_path = './TEMP'
+        if (os.path.exists(self.db_path)):
+            shutil.rmtree(self.db_path, ignore_errors=True)
+
+        self.db = Database()
+        self.db.open(self.db_path)
+        self.table = self.db.create_table('Test', 3, 0, force_merge=True, is_cumulative=self.is_cumulative)
+        self.query = Query(self.table)
+        self.compactor = self.table.compactor
+
+    def tearDown(self):
+        self.db = None
+        if (os.path.exists(self.db_path)):
+            shutil.rmtree(self.db_path, ignore_errors=True)
+
+    def roll_back_update(self, *args):
+        txn = Transaction()
+        txn.add_query(self.query.update, self.table, *args)
+        for wrapper in txn.queries:
+            wrapper.try_run()
+        txn.abort()
+
+    def test_nothing_to_reclaim(self):
+        self.query.insert(0, 0, 0)
+        for i in range(1, 6):
+            self.query.update(0, *[None, i, None])
+
+        self.assertEqual(self.table.compact(), 0)
+        self.assertEqual(self.table.page_directory.num_tail_records, 5)
+
+    def test_rolled_back_updates_are_reclaimed(self):
+        for i in range(3):
+            self.query.insert(i, 0, 0)
+        self.query.update(0, *[None, 1, None])
+        self.roll_back_update(0, None, 99, None)
+        self.query.update(1, *[None, None, 2])
+        self.roll_back_update(1, None, 98, 97)
+        self.query.update(0, *[None, None, 3])
+
+        self.assertEqual(self.table.compact(), 2)
+        self.assertEqual(self.table.page_directory.num_tail_records, 3)
+        self.assertListEqual(self.query.select(0, 0, [1, 1, 1])[0].columns, [0, 1, 3])
+        self.assertListEqual(self.query.select(1, 0, [1, 1, 1])[0].columns, [1, 0, 2])
+        self.assertListEqual(self.query.select_version(0, 0, [1, 1, 1], -1)[0].columns, [0, 1, 0])
+        self.assertListEqual(self.query.select_version(0, 0, [1, 1, 1], -2)[0].columns, [0, 0, 0])
+
+        # Tail RIDs are dense again
+        for tail_rid in range(3):
+            self.assertEqual(self.table.page_directory.get_column_value(tail_rid, Config.rid_column_idx, tail_flg=1), tail_rid)
+
+    def test_deleted_records_are_reclaimed(self):
+        self.query.insert(0, 0, 0)
+        self.query.insert(1, 0, 0)
+        for i in range(1, 6):
+            self.query.update(0, *[None, i, None])
+            self.query.update(1, *[None, None, i])
+        self.query.delete(0)
+
+        self.assertEqual(self.table.compact(), 5)
+        self.assertListEqual(self.query.select(1, 0, [1, 1, 1])[0].columns, [1, 0, 5])
+        self.assertListEqual(self.query.select_version(1, 0, [1, 1, 1], -4)[0].columns, [1, 0, 1])
+
+    def test_retained_versions(self):
+        self.compactor.retention_versions = 3
+        self.query.insert(0, 0, 0)
+        self.query.insert(1, 0, 0)
+        for i in range(1, 11):
+            self.query.update(0, *[None, i, None])
+        self.query.update(0, *[None, None, 5])
+        self.query.update(1, *[None, None, 1])
+
+        self.assertEqual(self.table.compact(), 8)
+        self.assertEqual(self.table.page_directory.num_tail_records, 4)
+
+        # The newest expired version is folded into the base record,
+        # so older versions read as the oldest version that was dropped
+        expected = {0: [0, 10, 5], -1: [0, 10, 0], -2: [0, 9, 0], -3: [0, 8, 0], -8: [0, 8, 0]}
+        for version, columns in expected.items():
+            self.assertListEqual(self.query.select_version(0, 0, [1, 1, 1], version)[0].columns, columns)
+        self.assertListEqual(self.query.select(1, 0, [1, 1, 1])[0].columns, [1, 0, 1])
+        self.assertEqual(self.query.sum_version(0, 1, 1, -1), 10)
+
+    def test_young_versions_are_retained(self):
+        self.compactor.retention_versions = 1
+        self.compactor.retention_seconds = 3600
+        self.query.insert(0, 0, 0)
+        for i in range(1, 11):
+            self.query.update(0, *[None, i, None])
+
+        self.assertEqual(self.table.compact(), 0)
+
+        self.compactor.retention_seconds = None
+        self.assertEqual(self.table.compact(), 9)
+        self.assertListEqual(self.query.select(0, 0, [1, 1, 1])[0].columns, [0, 10, 0])
+        self.assertListEqual(self.query.select_version(0, 0, [1, 1, 1], -1)[0].columns, [0, 9, 0])
+
+    def test_updates_after_compaction(self):
+        self.compactor.retention_versions = 2
+        self.query.insert(0, 0, 0)
+        for i in range(1, 600):
+            self.query.update(0, *[None, i, None])
+        self.table.compact()
+
+        for i in range(600, 1200):
+            self.query.update(0, *[None, i, i])
+        self.assertListEqual(self.query.select(0, 0, [1, 1, 1])[0].columns, [0, 1199, 1199])
+        self.assertListEqual(self.query.select_version(0, 0, [1, 1, 1], -600)[0].columns, [0, 599, 0])
+        self.assertListEqual(self.query.select_version(0, 0, [1, 1, 1], -601)[0].columns, [0, 598, 0])
+        self.assertListEqual(self.query.select_version(0, 0, [1, 1, 1], -700)[0].columns, [0, 597, 0])
+
+    def test_reopen_after_compaction(self):
+        self.compactor.retention_versions = 2
+        for i in range(5):
+            self.query.insert(i, 0, 0)
+        for j in range(1, 4):
+            for i in range(5):
+                self.query.update(i, *[None, i * j, None])
+        self.assertEqual(self.table.compact(), 5)
+        self.db.close()
+
+        db = Database()
+        db.open(self.db_path)
+        table = db.get_table('Test')
+        self.assertEqual(table.page_directory.num_tail_records, 10)
+        for i in range(5):
+            self.assertListEqual(Query(table).select(i, 0, [1, 1, 1])[0].columns, [i, i * 3, 0])
+            self.assertListEqual(Query(table).select_version(i, 0, [1, 1, 1], -2)[0].columns, [i, i, 0])
+
+    def test_crash_after_compaction_keeps_old_tail(self):
+        wal_enabled = Config.wal_enabled
+        Config.wal_enabled = False
+        try:
+            db = Database()
+            db.open(self.db_path + '_NO_WAL')
+            table = db.create_table('Test', 3, 0, force_merge=True)
+            for i in range(5):
+                Query(table).insert(i, 0, 0)
+            for j in range(1, 4):
+                for i in range(5):
+                    Query(table).update(i, *[None, i * j, None])
+            db.close()
+
+            db = Database()
+            db.open(self.db_path + '_NO_WAL')
+            table = db.get_table('Test')
+            table.compactor.retention_versions = 1
+            self.assertEqual(table.compact(), 10)
+
+            # Crash without closing, the saved meta data still describes the old tail files
+            db = Database()
+            db.open(self.db_path + '_NO_WAL')
+            table = db.get_table('Test')
+            self.assertEqual(table.page_directory.num_tail_records, 15)
+            for i in range(5):
+                self.assertListEqual(Query(table).select_version(i, 0, [1, 1, 1], -2)[0].columns, [i, i, 0])
+            db.close()
+        finally:
+            Config.wal_enabled = wal_enabled
+            shutil.rmtree(self.db_path + '_NO_WAL', ignore_errors=True)
+
+    def test_busy_table_is_not_compacted(self):
+        self.query.insert(0, 0, 0)
+        txn = Transaction()
+        txn.add_query(self.query.update, self.table, *[0, None, 1, None])
+        for wrapper in txn.queries:
+            wrapper.try_run()
+
+        self.assertIsNone(self.table.compact())
+        txn.commit()
+        self.assertEqual(self.table.compact(), 0)
+
+    def test_compaction_waits_for_latched_queries(self):
+        self.query.insert(0, 0, 0)
+        self.query.update(0, *[None, 1, None])
+        self.roll_back_update(0, None, 99, None)
+
+        # A query of a transaction in another thread holds the index latch
+        latched, release = threading.Event(), threading.Event()
+        def run_query():
+            with self.table.index_latch:
+                latched.set()
+                release.wait()
+        thread = threading.Thread(target=run_query)
+        thread.start()
+        latched.wait()
+
+        result = []
+        compaction = threading.Thread(target=lambda: result.append(self.table.compact()))
+        compaction.start()
+        time.sleep(0.05)
+        self.assertListEqual(result, [])
+        release.set()
+        compaction.join()
+        thread.join()
+        self.assertListEqual(result, [1])
+
+    def test_merge_skips_rolled_back_updates(self):
+        self.query.insert(0, 0, 0)
+        self.query.update(0, *[None, 1, None])
+        self.roll_back_update(0, None, 99, None)
+
+        self.table.merge()
+        self.assertEqual(self.table.page_directory.get_column_value(0, Config.column_data_offset + 1), 1)
+
+
+class TestNonCumulativeCompaction(TestCompaction):
+    """Unit testing the TailCompactor on non-cumulative tail records
+
+    Expired versions have to fold every column that the
+    kept versions do not carry into the base record.
+    """
+
+    is_cumulative = False
+
+
+if __name__ == '__main__':
+    unittest.main()
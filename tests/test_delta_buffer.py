@@ -0,0 +1,112 @@
+from lstore.db import Database
+from lstore.query import Query
+import unittest
+import os
+import shutil
+from config import Config
+
+class TestDeltaBuffer(unittest.TestCase):
+    """Unit testing the DeltaBuffer
+
+    Tail records are appended into in-memory pages
+    which are sealed into the BufferPool once full.
+    """
+
+    def setUp(self):
+        self.db_path = './TEMP'
+        if (os.path.exists(self.db_path)):
+            shutil.rmtree(self.db_path, ignore_errors=True)
+
+        self.db = Database()
+        self.db.open(self.db_path)
+        self.page_capacity = Config.page_size // Config.page_cell_size
+
+    def tearDown(self):
+        self.db = None
+        if (os.path.exists(self.db_path)):
+            shutil.rmtree(self.db_path, ignore_errors=True)
+
+    def test_buffered_records_are_visible(self):
+        table = self.db.create_table('Test', 3, 0, force_merge=True)
+        query = Query(table)
+        query.insert(0, 0, 0)
+        for i in range(1, 11):
+            query.update(0, *[None, i, None])
+
+        delta_buffer = table.page_directory.delta_buffer
+        self.assertIn(Config.rid_column_idx, delta_buffer)
+        self.assertEqual(delta_buffer.num_sealed, 0)
+        self.assertEqual(table.page_directory.num_tail_pages, 0)
+        self.assertListEqual(query.select(0, 0, [1, 1, 1])[0].columns, [0, 10, 0])
+        self.assertListEqual(query.select_version(0, 0, [1, 1, 1], -3)[0].columns, [0, 7, 0])
+
+    def test_full_pages_are_sealed(self):
+        table = self.db.create_table('Test', 3, 0, force_merge=True, is_sparse=False)
+        query = Query(table)
+        query.insert(0, 0, 0)
+        for i in range(1, self.page_capacity + 2):
+            query.update(0, *[None, i, None])
+
+        page_directory = table.page_directory
+        self.assertEqual(page_directory.num_tail_pages, 1)
+        self.assertEqual(page_directory.delta_buffer.num_sealed, page_directory.num_columns)
+
+        # The sealed page lives in the bufferpool, the next one is still buffered
+        sealed = page_directory.bufferpool.get_page(0, Config.rid_column_idx, tail_flg=1)
+        self.assertEqual(sealed.num_cells, self.page_capacity)
+        self.assertIsNotNone(page_directory.delta_buffer.get_page(Config.rid_column_idx, 1))
+        self.assertIsNone(page_directory.delta_buffer.get_page(Config.rid_column_idx, 0))
+        self.assertListEqual(query.select(0, 0, [1, 1, 1])[0].columns, [0, self.page_capacity + 1, 0])
+
+    def test_tail_rids_are_assigned(self):
+        table = self.db.create_table('Test', 3, 0, force_merge=True)
+        query = Query(table)
+        for i in range(5):
+            query.insert(i, 0, 0)
+        for i in range(5):
+            query.update(i, *[None, i, None])
+
+        for i in range(5):
+            rid = table.page_directory.get_column_value(i, Config.indirection_column_idx)
+            self.assertEqual(rid, i)
+            self.assertEqual(table.page_directory.get_column_value(rid, Config.rid_column_idx, tail_flg=1), i)
+
+    def test_reopen_resumes_active_pages(self):
+        table = self.db.create_table('Test', 3, 0, force_merge=True)
+        query = Query(table)
+        query.insert(0, 0, 0)
+        for i in range(1, 11):
+            query.update(0, *[None, i, None])
+        self.db.close()
+
+        db = Database()
+        db.open(self.db_path)
+        table = db.get_table('Test')
+        query = Query(table)
+        self.assertListEqual(query.select(0, 0, [1, 1, 1])[0].columns, [0, 10, 0])
+
+        for i in range(11, self.page_capacity + 11):
+            query.update(0, *[None, i, None])
+        self.assertEqual(table.page_directory.num_tail_pages, 1)
+        for version in [0, -5, -self.page_capacity]:
+            expected = self.page_capacity + 10 + version
+            self.assertListEqual(query.select_version(0, 0, [1, 1, 1], version)[0].columns, [0, expected, 0])
+        db.close()
+
+    def test_merge_reads_buffered_pages(self):
+        table = self.db.create_table('Test', 3, 0, force_merge=True)
+        query = Query(table)
+        for i in range(10):
+            query.insert(i, i, i)
+        for i in range(10):
+            query.update(i, *[None, None, i + 1])
+
+        table.merge()
+
+        for i in range(10):
+            record = [table.page_directory.get_column_value(i, j + Config.column_data_offset) for j in range(3)]
+            self.assertListEqual(record, [i, i, i + 1])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+from lstore.db import Database
+from lstore.query import Query
+from lstore.table import Table
+import unittest
+import os
+import shutil
+import subprocess
+import sys
+
+class TestFastStart(unittest.TestCase):
+    """Unit testing the fast start of tables
+
+    Opening a table leaves the index and the merge
+    thread to the first query.
+    """
+
+    def setUp(self):
+        self.db_path = './TEMP'
+        if (os.path.exists(self.db_path)):
+            shutil.rmtree(self.db_path, ignore_errors=True)
+
+        db = Database()
+        db.open(self.db_path)
+        query = Query(db.create_table('Test', 3, 0, force_merge=True))
+        for i in range(200):
+            query.insert(i, i * 2, i * 3)
+        db.close()
+
+    def tearDown(self):
+        if (os.path.exists(self.db_path)):
+            shutil.rmtree(self.db_path, ignore_errors=True)
+
+    def test_index_built_on_first_query(self):
+        table = Table(self.db_path, 'Test', fast_start=True)
+        self.assertIsNone(table._index)
+
+        self.assertListEqual(Query(table).select(150, 0, [1, 1, 1])[0].columns, [150, 300, 450])
+        index = table._index
+        self.assertIsNotNone(index)
+        self.assertIs(table.index, index)
+        table.close()
+
+    def test_background_threads_deferred(self):
+        table = Table(self.db_path, 'Test', force_merge=False, fast_start=True)
+        self.assertTrue(table.running)
+        self.assertIsNone(table._index)
+
+        query = Query(table)
+        query.update(5, *[None, -5, None])
+        self.assertListEqual(query.select(5, 0, [1, 1, 1])[0].columns, [5, -5, 15])
+        table.close()
+        self.assertFalse(table.running)
+
+        # A table closed before its first query never starts its threads
+        table = Table(self.db_path, 'Test', force_merge=False, fast_start=True)
+        table.close()
+        self.assertIsNone(table._index)
+
+    def test_lazy_imports(self):
+        code = "import sys, config, lstore.db; print(' '.join(sorted(sys.modules)))"
+        modules = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True).stdout.split()
+        self.assertNotIn('data_structures.binary_search_tree', modules)
+        self.assertNotIn('data_structures.hash_map', modules)
+        self.assertNotIn('concurrent.futures', modules)
+
+
+if __name__ == '__main__':
+    unittest.main()
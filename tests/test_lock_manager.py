@@ -0,0 +1,459 @@
+from lstore.lock_manager import LockManager, ColumnMask, Granule, TABLE_GRANULE
+from lstore.db import Database
+from lstore.query import Query
+from lstore.transaction import Transaction
+from config import Config
+import unittest
+import threading
+import time
+import os
+import shutil
+
+S = Config.SHARED_LOCK
+X = Config.EXCLUSIVE_LOCK
+IS = Config.INTENTION_SHARED_LOCK
+IX = Config.INTENTION_EXCLUSIVE_LOCK
+SIX = Config.SHARED_INTENTION_EXCLUSIVE_LOCK
+
+class FakeTransaction():
+    """A Transaction with the fields the lock priorities are decided by"""
+
+    def __init__(self, id, num_changes=0):
+        self.id = id
+        self.wounded = False
+        self.undo_log = [None] * num_changes
+
+    def __repr__(self):
+        return f'T{self.id}'
+
+class TestLockManager(unittest.TestCase):
+    """Unit testing blocking lock requests
+
+    Conflicting requests wait in FIFO order until
+    a release grants them or their timeout passes.
+    """
+
+    def setUp(self):
+        self.lock_manager = LockManager()
+        self.granted = []
+
+    def request_in_thread(self, lock_type, unique_id, transaction, timeout=1):
+        def run():
+            key = self.lock_manager.request(lock_type, unique_id, transaction, timeout=timeout)
+            self.granted.append((transaction, key))
+        thread = threading.Thread(target=run)
+        thread.start()
+        # Wait for the request to queue up
+        while (unique_id not in self.lock_manager.queues and thread.is_alive()):
+            time.sleep(0.001)
+        return thread
+
+    def test_wait_for_release(self):
+        self.assertEqual(self.lock_manager.request(X, 'a', 'T1'), (X, 'a'))
+        thread = self.request_in_thread(X, 'a', 'T2')
+        self.assertListEqual(self.granted, [])
+
+        self.lock_manager.release(X, 'a', 'T1')
+        thread.join()
+        self.assertListEqual(self.granted, [('T2', (X, 'a'))])
+        self.assertEqual(self.lock_manager.x_locks[(X, 'a')], 'T2')
+        self.assertEqual(self.lock_manager.num_waits, 1)
+
+    def test_timeout(self):
+        self.lock_manager.request(S, 'a', 'T1')
+        start = time.monotonic()
+        self.assertIsNone(self.lock_manager.request(X, 'a', 'T2', timeout=0.05))
+        self.assertGreaterEqual(time.monotonic() - start, 0.05)
+        self.assertEqual(self.lock_manager.num_timeouts, 1)
+        self.assertNotIn('a', self.lock_manager.queues)
+
+        # Without a timeout a conflict fails right away
+        self.assertIsNone(self.lock_manager.request(X, 'a', 'T2', timeout=0))
+        self.assertEqual(self.lock_manager.num_waits, 1)
+
+    def test_fifo_order(self):
+        self.lock_manager.request(S, 'a', 'T1')
+        writer = self.request_in_thread(X, 'a', 'T2')
+        # A shared request does not pass the waiting writer
+        reader = self.request_in_thread(S, 'a', 'T3')
+        while (len(self.lock_manager.queues['a']) < 2):
+            time.sleep(0.001)
+
+        self.lock_manager.release_all('T1')
+        writer.join()
+        self.assertListEqual(self.granted, [('T2', (X, 'a'))])
+        self.lock_manager.release_all('T2')
+        reader.join()
+        self.assertListEqual(self.granted[1:], [('T3', (S, 'a'))])
+
+    def test_upgrade(self):
+        self.lock_manager.request(S, 'a', 'T1')
+        self.lock_manager.request(S, 'a', 'T2')
+        waiting = self.request_in_thread(X, 'a', 'T3')
+        upgrade = self.request_in_thread(X, 'a', 'T1')
+        while (len(self.lock_manager.queues['a']) < 2):
+            time.sleep(0.001)
+        self.assertTrue(self.lock_manager.queues['a'][0].upgrade)
+
+        # A second upgrade would wait on the first one forever, so it is the deadlock victim
+        self.assertIsNone(self.lock_manager.request(X, 'a', 'T2'))
+
+        self.lock_manager.release_all('T2')
+        upgrade.join()
+        self.assertListEqual(self.granted, [('T1', (X, 'a'))])
+        self.assertNotIn((S, 'a'), self.lock_manager.s_locks)
+        self.lock_manager.release_all('T1')
+        waiting.join()
+        self.assertEqual(self.lock_manager.x_locks[(X, 'a')], 'T3')
+
+    def test_held_locks(self):
+        self.assertEqual(self.lock_manager.request(X, 'a', 'T1'), (X, 'a'))
+        self.assertEqual(self.lock_manager.request(S, 'a', 'T1', timeout=0), (X, 'a'))
+        self.assertEqual(self.lock_manager.request(S, 'b', 'T1'), (S, 'b'))
+        self.assertEqual(self.lock_manager.request(S, 'b', 'T1', timeout=0), (S, 'b'))
+        self.assertTrue(self.lock_manager.release_all('T1'))
+        self.assertDictEqual(self.lock_manager.transaction_dictionary, {})
+
+    def test_deadlock_youngest_victim(self):
+        t1, t2 = FakeTransaction(1), FakeTransaction(2)
+        self.lock_manager.request(X, 'a', t1)
+        self.lock_manager.request(X, 'b', t2)
+        waiting = self.request_in_thread(X, 'b', t1, timeout=5)
+
+        # Closing the cycle fails the younger Transaction long before the timeout
+        start = time.monotonic()
+        self.assertIsNone(self.lock_manager.request(X, 'a', t2, timeout=5))
+        self.assertLess(time.monotonic() - start, 1)
+        self.assertEqual(self.lock_manager.num_deadlocks, 1)
+        self.assertEqual(self.lock_manager.num_victims, 1)
+        self.assertNotIn('a', self.lock_manager.queues)
+
+        self.lock_manager.release_all(t2)
+        waiting.join()
+        self.assertListEqual(self.granted, [(t1, (X, 'b'))])
+        self.assertDictEqual(self.lock_manager.waiting, {})
+
+    def test_deadlock_waiting_victim(self):
+        # The younger Transaction already waits when the older one closes the cycle
+        t1, t2 = FakeTransaction(1), FakeTransaction(2)
+        self.lock_manager.request(S, 'a', t1)
+        self.lock_manager.request(S, 'b', t2)
+        victim = self.request_in_thread(X, 'a', t2, timeout=5)
+        granted = self.request_in_thread(X, 'b', t1, timeout=5)
+
+        victim.join()
+        self.assertListEqual(self.granted, [(t2, None)])
+        self.lock_manager.release_all(t2)
+        granted.join()
+        self.assertListEqual(self.granted[1:], [(t1, (X, 'b'))])
+        self.assertEqual(self.lock_manager.num_timeouts, 0)
+
+    def test_deadlock_cheapest_victim(self):
+        self.lock_manager = LockManager(victim_policy='cheapest')
+        t1, t2 = FakeTransaction(1), FakeTransaction(2, num_changes=10)
+        self.lock_manager.request(X, 'a', t1)
+        self.lock_manager.request(X, 'b', t2)
+        waiting = self.request_in_thread(X, 'a', t2, timeout=5)
+
+        # The older Transaction has less work to redo
+        self.assertIsNone(self.lock_manager.request(X, 'b', t1, timeout=5))
+        self.lock_manager.release_all(t1)
+        waiting.join()
+        self.assertListEqual(self.granted, [(t2, (X, 'a'))])
+
+    def test_no_deadlock(self):
+        t1, t2, t3 = FakeTransaction(1), FakeTransaction(2), FakeTransaction(3)
+        self.lock_manager.request(X, 'a', t1)
+        self.lock_manager.request(X, 'b', t2)
+        first = self.request_in_thread(X, 'b', t1)
+        # A chain of waits without a cycle only waits
+        second = self.request_in_thread(X, 'a', t3)
+        while (len(self.lock_manager.waiting) < 2):
+            time.sleep(0.001)
+        self.assertEqual(self.lock_manager.num_deadlocks, 0)
+        self.assertEqual(self.lock_manager.num_detections, 2)
+        self.assertGreater(self.lock_manager.detection_latency(), 0)
+
+        self.lock_manager.release_all(t2)
+        first.join()
+        self.lock_manager.release_all(t1)
+        second.join()
+        self.assertListEqual(self.granted, [(t1, (X, 'b')), (t3, (X, 'a'))])
+
+    def test_shard_deadlock(self):
+        # Integers hash to themselves, so the two resources are in different shards
+        self.lock_manager = LockManager(num_shards=2)
+        t1, t2 = FakeTransaction(1), FakeTransaction(2)
+        self.lock_manager.request(X, 0, t1)
+        self.lock_manager.request(X, 1, t2)
+        self.assertIn((X, 0), self.lock_manager.shards[0].x_locks)
+        self.assertIn((X, 1), self.lock_manager.shards[1].x_locks)
+        waiting = self.request_in_thread(X, 1, t1, timeout=5)
+
+        # The cycle goes through both shards
+        self.assertIsNone(self.lock_manager.request(X, 0, t2, timeout=5))
+        self.assertEqual(self.lock_manager.num_deadlocks, 1)
+        self.lock_manager.release_all(t2)
+        waiting.join()
+        self.assertListEqual(self.granted, [(t1, (X, 1))])
+
+        self.assertTrue(self.lock_manager.release_all(t1))
+        self.assertDictEqual(self.lock_manager.transaction_dictionary, {})
+        self.assertDictEqual(self.lock_manager.transaction_shards, {})
+
+    def test_wait_die(self):
+        self.lock_manager = LockManager(priority_policy='wait-die')
+        old, young = FakeTransaction(1), FakeTransaction(2)
+        self.lock_manager.request(X, 'a', old)
+        self.lock_manager.request(X, 'b', young)
+
+        # The younger Transaction dies instead of waiting for the older one
+        self.assertIsNone(self.lock_manager.request(X, 'a', young, timeout=5))
+        self.assertEqual(self.lock_manager.num_dies, 1)
+
+        # The older Transaction waits
+        waiting = self.request_in_thread(X, 'b', old, timeout=5)
+        self.lock_manager.release_all(young)
+        waiting.join()
+        self.assertListEqual(self.granted, [(old, (X, 'b'))])
+
+    def test_wound_wait(self):
+        self.lock_manager = LockManager(priority_policy='wound-wait')
+        old, young = FakeTransaction(1), FakeTransaction(2)
+        self.lock_manager.request(X, 'a', old)
+        self.lock_manager.request(X, 'b', young)
+
+        # The younger Transaction waits for the older one
+        waiting = self.request_in_thread(X, 'a', young, timeout=5)
+        self.assertFalse(young.wounded)
+
+        # The older one wounds it, which fails its waiting request
+        granted = self.request_in_thread(X, 'b', old, timeout=5)
+        waiting.join()
+        self.assertListEqual(self.granted, [(young, None)])
+        self.assertTrue(young.wounded)
+        self.assertEqual(self.lock_manager.num_wounds, 1)
+
+        # A wounded Transaction does not wait again
+        self.assertIsNone(self.lock_manager.request(X, 'a', young, timeout=5))
+        self.lock_manager.release_all(young)
+        granted.join()
+        self.assertListEqual(self.granted[1:], [(old, (X, 'b'))])
+
+    def test_column_masks(self):
+        C = Config.COLUMN_LOCK
+        self.assertEqual(self.lock_manager.request(ColumnMask(0b0011, 0), 1, 'T1'), (C, 1))
+        # Reads of other columns and of the same ones share the record
+        self.assertEqual(self.lock_manager.request(ColumnMask(0b0110, 0), 1, 'T2', timeout=0), (C, 1))
+        self.assertEqual(self.lock_manager.request(ColumnMask(0, 0b1000), 1, 'T3', timeout=0), (C, 1))
+        # A write of a column another Transaction uses conflicts
+        self.assertIsNone(self.lock_manager.request(ColumnMask(0, 0b0100), 1, 'T3', timeout=0))
+        self.assertIsNone(self.lock_manager.request(ColumnMask(0b1000, 0), 1, 'T1', timeout=0))
+
+        # Columns already held need no new lock
+        self.assertEqual(self.lock_manager.request(ColumnMask(0b0001, 0), 1, 'T1', timeout=0), (C, 1))
+        self.assertEqual(len(self.lock_manager.transaction_dictionary['T1']), 1)
+
+        # Asking for more columns waits like an upgrade
+        waiting = self.request_in_thread(ColumnMask(0, 0b1110), 1, 'T2')
+        self.lock_manager.release_all('T1')
+        self.assertTrue(self.lock_manager.queues[1][0].upgrade)
+        self.lock_manager.release(C, 1, 'T3')
+        waiting.join()
+        self.assertListEqual(self.granted, [('T2', (C, 1))])
+        self.assertEqual(self.lock_manager.column_locks[1]['T2'], ColumnMask(0b0110, 0b1110))
+        self.lock_manager.release_all('T2')
+        self.assertDictEqual(self.lock_manager.column_locks, {})
+
+    def test_column_mask_deadlock(self):
+        t1, t2 = FakeTransaction(1), FakeTransaction(2)
+        self.lock_manager.request(ColumnMask(0, 0b01), 1, t1)
+        self.lock_manager.request(ColumnMask(0, 0b10), 1, t2)
+        waiting = self.request_in_thread(ColumnMask(0b10, 0), 1, t1, timeout=5)
+
+        # Both wait to read the column the other one writes
+        self.assertIsNone(self.lock_manager.request(ColumnMask(0b01, 0), 1, t2, timeout=5))
+        self.assertEqual(self.lock_manager.num_deadlocks, 1)
+        self.lock_manager.release_all(t2)
+        waiting.join()
+        self.assertListEqual(self.granted, [(t1, (Config.COLUMN_LOCK, 1))])
+
+    def test_granule_modes(self):
+        G = Config.GRANULE_LOCK
+        self.assertEqual(self.lock_manager.request(IX, TABLE_GRANULE, 'T1'), (G, TABLE_GRANULE))
+        self.assertEqual(self.lock_manager.request(IS, TABLE_GRANULE, 'T2', timeout=0), (G, TABLE_GRANULE))
+        self.assertEqual(self.lock_manager.request(IX, TABLE_GRANULE, 'T3', timeout=0), (G, TABLE_GRANULE))
+        # A scan of the table conflicts with the writers below it
+        self.assertIsNone(self.lock_manager.request(S, TABLE_GRANULE, 'T4', timeout=0))
+
+        # Shared and intention exclusive make SIX, which only allows intention shared
+        self.assertIsNone(self.lock_manager.request(S, TABLE_GRANULE, 'T1', timeout=0))
+        self.lock_manager.release_all('T3')
+        self.assertEqual(self.lock_manager.request(S, TABLE_GRANULE, 'T1', timeout=0), (G, TABLE_GRANULE))
+        self.assertEqual(self.lock_manager.held_mode(TABLE_GRANULE, 'T1'), SIX)
+        self.assertIsNone(self.lock_manager.request(IX, TABLE_GRANULE, 'T3', timeout=0))
+
+        # Modes already covered need no new lock
+        self.assertEqual(self.lock_manager.request(IX, TABLE_GRANULE, 'T1', timeout=0), (G, TABLE_GRANULE))
+        self.assertTrue(self.lock_manager.release(IS, TABLE_GRANULE, 'T1'))
+        self.assertTrue(self.lock_manager.release_all('T2'))
+        self.assertDictEqual(self.lock_manager.granule_locks, {})
+
+    def test_instant_locks(self):
+        G = Config.GRANULE_LOCK
+        # A lock nothing held before is given back
+        self.assertEqual(self.lock_manager.request(X, 'a', 'T1', instant=True), (X, 'a'))
+        self.assertNotIn('T1', self.lock_manager.transaction_dictionary)
+
+        # Locks already held are kept
+        self.lock_manager.request(X, 'a', 'T1')
+        self.assertEqual(self.lock_manager.request(X, 'a', 'T1', instant=True), (X, 'a'))
+        self.assertEqual(self.lock_manager.x_locks[(X, 'a')], 'T1')
+        self.lock_manager.request(S, 'b', 'T1')
+        self.assertEqual(self.lock_manager.request(S, 'b', 'T1', instant=True), (S, 'b'))
+        self.assertIn('T1', self.lock_manager.s_locks[(S, 'b')])
+
+        # An upgrade goes back to the shared lock
+        self.assertEqual(self.lock_manager.request(X, 'b', 'T1', instant=True), (X, 'b'))
+        self.assertNotIn((X, 'b'), self.lock_manager.x_locks)
+        self.assertIn('T1', self.lock_manager.s_locks[(S, 'b')])
+        self.assertEqual(self.lock_manager.request(S, 'b', 'T2', timeout=0), (S, 'b'))
+
+        self.lock_manager.request(IS, TABLE_GRANULE, 'T1')
+        self.assertEqual(self.lock_manager.request(IX, TABLE_GRANULE, 'T1', instant=True), (G, TABLE_GRANULE))
+        self.assertEqual(self.lock_manager.held_mode(TABLE_GRANULE, 'T1'), IS)
+
+        self.assertTrue(self.lock_manager.release_all('T1'))
+        self.assertTrue(self.lock_manager.release_all('T2'))
+        self.assertDictEqual(self.lock_manager.transaction_dictionary, {})
+
+    def test_escalation(self):
+        db_path = './TEMP'
+        if (os.path.exists(db_path)):
+            shutil.rmtree(db_path, ignore_errors=True)
+        db = Database()
+        db.open(db_path)
+        table = db.create_table('Test', 3, 0, force_merge=True)
+        query = Query(table)
+        for i in range(200):
+            query.insert(i, i, i)
+
+        transaction = Transaction()
+        for i in range(100):
+            transaction.add_query(query.select, table, i, 0, [1, 1, 1])
+        for wrapper in transaction.queries:
+            self.assertTrue(wrapper.try_run())
+
+        # After the threshold the key range is locked whole
+        lock_manager = table.lock_manager
+        key_range = Granule('Range', 0)
+        self.assertEqual(lock_manager.held_mode(key_range, transaction), S)
+        column_locks = [key for key in lock_manager.transaction_dictionary[transaction] if key[0] == Config.COLUMN_LOCK]
+        self.assertEqual(len(column_locks), Config.lock_escalation_threshold)
+
+        # A writer of another key range still runs beside it
+        writer = Transaction()
+        writer.add_query(query.update, table, 0 + Config.lock_range_size, None, 1, None)
+        query.insert(Config.lock_range_size, 0, 0)
+        self.assertTrue(writer.run())
+        blocked = Transaction()
+        blocked.add_query(query.update, table, 150, None, 1, None)
+        lock_timeout = Config.lock_timeout
+        Config.lock_timeout = 0.01
+        try:
+            self.assertFalse(blocked.queries[0].try_run())
+        finally:
+            Config.lock_timeout = lock_timeout
+        blocked.abort()
+
+        transaction.commit()
+        db.close()
+        shutil.rmtree(db_path, ignore_errors=True)
+
+    def test_next_key_locking(self):
+        db_path = './TEMP'
+        if (os.path.exists(db_path)):
+            shutil.rmtree(db_path, ignore_errors=True)
+        db = Database()
+        db.open(db_path)
+        table = db.create_table('Test', 3, 0, force_merge=True)
+        query = Query(table)
+        for i in range(0, 300, 10):
+            query.insert(i, i, i)
+
+        # The sum locks the keys 100 to 150 and the gaps up to 160
+        scan = Transaction()
+        scan.add_query(query.sum, table, 100, 155, 1)
+        self.assertTrue(scan.queries[0].try_run())
+
+        def run(query_function, *args):
+            transaction = Transaction()
+            transaction.add_query(query_function, table, *args)
+            result = transaction.queries[0].try_run()
+            if (result):
+                transaction.commit()
+            else:
+                transaction.abort()
+            return result
+
+        lock_timeout = Config.lock_timeout
+        Config.lock_timeout = 0.01
+        try:
+            # Phantoms inside the range wait
+            self.assertFalse(run(query.insert, 155, 0, 0))
+            self.assertFalse(run(query.insert, 95, 0, 0))
+            self.assertFalse(run(query.delete, 160))
+            self.assertFalse(run(query.update, 120, None, 1, None))
+
+            # Writers outside of it do not
+            self.assertTrue(run(query.insert, 165, 0, 0))
+            self.assertTrue(run(query.insert, 85, 0, 0))
+            self.assertTrue(run(query.update, 170, None, 1, None))
+            self.assertTrue(run(query.delete, 200))
+            self.assertTrue(run(query.insert, 1000, 0, 0))
+        finally:
+            Config.lock_timeout = lock_timeout
+
+        scan.commit()
+        self.assertTrue(run(query.insert, 155, 0, 0))
+        db.close()
+        shutil.rmtree(db_path, ignore_errors=True)
+
+
+    def test_next_key_locking_without_masks(self):
+        db_path = './TEMP'
+        if (os.path.exists(db_path)):
+            shutil.rmtree(db_path, ignore_errors=True)
+        lock_column_masks = Config.lock_column_masks
+        lock_timeout = Config.lock_timeout
+        Config.lock_column_masks = False
+        Config.lock_timeout = 0.01
+        try:
+            db = Database()
+            db.open(db_path)
+            table = db.create_table('Test', 3, 0, force_merge=True)
+            query = Query(table)
+            for i in range(0, 300, 10):
+                query.insert(i, i, i)
+
+            # The insert checks the gap the delete holds until the commit
+            writer = Transaction()
+            writer.add_query(query.delete, table, 160)
+            writer.add_query(query.insert, table, 165, 0, 0)
+            for wrapper in writer.queries:
+                self.assertTrue(wrapper.try_run())
+
+            other = Transaction()
+            other.add_query(query.insert, table, 166, 0, 0)
+            self.assertFalse(other.queries[0].try_run())
+            other.abort()
+            writer.commit()
+            db.close()
+        finally:
+            Config.lock_column_masks = lock_column_masks
+            Config.lock_timeout = lock_timeout
+            shutil.rmtree(db_path, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    unittest.main()
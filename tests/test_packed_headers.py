@@ -0,0 +1,122 @@
+from lstore.db import Database
+from lstore.query import Query
+from lstore.transaction import Transaction
+import unittest
+import os
+import shutil
+from config import Config
+
+class TestPackedHeaders(unittest.TestCase):
+    """Unit testing packed record headers
+
+    The metadata cells of a base record share one
+    header page and must read back like the per
+    column layout.
+    """
+
+    def setUp(self):
+        self.db_path = './TEMP'
+        if (os.path.exists(self.db_path)):
+            shutil.rmtree(self.db_path, ignore_errors=True)
+
+        self.db = Database()
+        self.db.open(self.db_path)
+        self.table = self.db.create_table('Test', 3, 0, force_merge=True, is_packed=True)
+        self.query = Query(self.table)
+        self.page_directory = self.table.page_directory
+
+    def tearDown(self):
+        self.db = None
+        if (os.path.exists(self.db_path)):
+            shutil.rmtree(self.db_path, ignore_errors=True)
+
+    def base_files(self, column_id):
+        """Block numbers of a base column stored on disk"""
+        segment = self.page_directory.bufferpool._get_segment(0, 0)
+        return [block_num for key_column, block_num in segment.keys() if key_column == column_id]
+
+    def test_metadata_lives_in_header_pages(self):
+        for i in range(300):
+            self.query.insert(i, i * 2, i * 3)
+        self.page_directory.bufferpool.flush()
+
+        for column_id in range(Config.column_data_offset):
+            self.assertListEqual(self.base_files(column_id), [])
+        self.assertNotEqual(self.base_files(self.page_directory.header_column_id), [])
+
+        # Every record after the first header page starts a new page at the right cell
+        header_capacity = self.page_directory.header_capacity
+        for rid in [0, header_capacity - 1, header_capacity, 299]:
+            self.assertEqual(self.page_directory.get_column_value(rid, Config.rid_column_idx), rid)
+            self.assertEqual(self.page_directory.get_column_value(rid, Config.tps_and_brid_column_idx), -1)
+            self.assertListEqual(self.query.select(rid, 0, [1, 1, 1])[0].columns, [rid, rid * 2, rid * 3])
+
+    def test_update_and_versions(self):
+        self.query.insert(0, 0, 0)
+        self.query.insert(1, 1, 1)
+        for i in range(1, 6):
+            self.query.update(0, *[None, i, None])
+        self.query.update(1, *[None, None, 10])
+
+        self.assertListEqual(self.query.select(0, 0, [1, 1, 1])[0].columns, [0, 5, 0])
+        self.assertListEqual(self.query.select_version(0, 0, [1, 1, 1], -2)[0].columns, [0, 3, 0])
+        self.assertListEqual(self.query.select(1, 0, [1, 1, 1])[0].columns, [1, 1, 10])
+
+        # The neighbouring header of the same page is untouched
+        self.assertEqual(self.page_directory.get_column_value(1, Config.schema_encoding_column_idx), 0b100)
+        self.assertEqual(self.page_directory.get_column_value(0, Config.schema_encoding_column_idx), 0b010)
+
+    def test_roll_backs(self):
+        for i in range(5):
+            self.query.insert(i, i, i)
+
+        txn = Transaction()
+        txn.add_query(self.query.update, self.table, *[2, None, 20, None])
+        txn.add_query(self.query.delete, self.table, 3)
+        for wrapper in txn.queries:
+            wrapper.try_run()
+        self.assertTrue(self.page_directory.is_deleted(3))
+        txn.abort()
+
+        self.assertFalse(self.page_directory.is_deleted(3))
+        self.assertEqual(self.page_directory.num_dead_slots(), 0)
+        self.assertListEqual(self.query.select(2, 0, [1, 1, 1])[0].columns, [2, 2, 2])
+        self.assertListEqual(self.query.select(3, 0, [1, 1, 1])[0].columns, [3, 3, 3])
+
+    def test_merge_and_vacuum(self):
+        for i in range(600):
+            self.query.insert(i, i, i)
+        for i in range(600):
+            self.query.update(i, *[None, None, i + 1])
+        self.table.merge()
+        for i in range(0, 600, 2):
+            self.query.delete(i)
+
+        self.assertEqual(self.table.vacuum(), 300)
+        for i in range(1, 600, 2):
+            self.assertListEqual(self.query.select(i, 0, [1, 1, 1])[0].columns, [i, i, i + 1])
+
+        # The header column shrinks along with the data columns
+        self.page_directory.bufferpool.flush()
+        self.assertEqual(self.page_directory.num_slots, 300)
+        self.query.insert(1000, 1, 2)
+        self.assertListEqual(self.query.select(1000, 0, [1, 1, 1])[0].columns, [1000, 1, 2])
+
+    def test_reopen(self):
+        for i in range(200):
+            self.query.insert(i, i, i)
+        for i in range(0, 200, 3):
+            self.query.update(i, *[None, -i, None])
+        self.db.close()
+
+        db = Database()
+        db.open(self.db_path)
+        table = db.get_table('Test')
+        self.assertTrue(table.is_packed)
+        for i in range(200):
+            expected = [i, -i, i] if i % 3 == 0 else [i, i, i]
+            self.assertListEqual(Query(table).select(i, 0, [1, 1, 1])[0].columns, expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -305,5 +305,21 @@ class TestPriorityQueue(unittest.TestCase):
         # Check all elements are removed
         self.assertTrue(len(p) == 0)
 
+    def test_pop_after_remove(self):
+        """
+        Test that removing an item keeps the
+        lowest priority item first.
+        """
+
+        priorities = [1, 2, 4, 5, 3, 6]
+        p = PriorityQueue(len(priorities))
+        for i, priority in enumerate(priorities):
+            p.push(i, str(i), priority)
+
+        # Removing the root shifts every other item one place
+        p.remove(0)
+        popped = [p.pop()[0] for _ in range(len(priorities) - 1)]
+        self.assertListEqual(popped, [2, 3, 4, 5, 6])
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
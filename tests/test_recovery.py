@@ -0,0 +1,183 @@
+from lstore.db import Database
+from lstore.query import Query
+from lstore.transaction import Transaction
+from lstore.wal import transaction_context
+from config import Config
+import unittest
+import os
+import shutil
+import signal
+import subprocess
+import sys
+
+class TestRecovery(unittest.TestCase):
+    """Unit testing checkpoints and crash recovery
+
+    A crash is simulated by dropping the database without
+    closing it, so nothing after the last checkpoint
+    reaches the table files except evicted blocks.
+    """
+
+    def setUp(self):
+        self.wal_enabled = Config.wal_enabled
+        Config.wal_enabled = True
+        self.db_path = './TEMP'
+        if (os.path.exists(self.db_path)):
+            shutil.rmtree(self.db_path, ignore_errors=True)
+
+        self.db = Database()
+        self.db.open(self.db_path)
+        self.table = self.db.create_table('Test', 3, 0, force_merge=True)
+        self.query = Query(self.table)
+
+    def tearDown(self):
+        Config.wal_enabled = self.wal_enabled
+        self.db = None
+        if (os.path.exists(self.db_path)):
+            shutil.rmtree(self.db_path, ignore_errors=True)
+
+    def crash_and_reopen(self, memory_budget=None):
+        self.db.wal.flush()
+        self.db = Database()
+        self.db.open(self.db_path, memory_budget)
+        return Query(self.db.get_table('Test'))
+
+    def start_transaction(self, *updates):
+        """Run updates in a Transaction that does not finish"""
+
+        transaction = Transaction()
+        for key, columns in updates:
+            transaction.add_query(self.query.update, self.table, key, *columns)
+        with transaction_context(transaction.id):
+            for wrapper in transaction.queries:
+                self.assertTrue(wrapper.try_run())
+        return transaction
+
+    def test_committed_changes_survive(self):
+        for i in range(500):
+            self.query.insert(i, i * 2, i * 3)
+        self.db.checkpoint()
+        for i in range(0, 500, 5):
+            self.query.update(i, *[None, -i, None])
+        for i in range(1, 500, 50):
+            self.query.delete(i)
+        self.query.insert(1000, 1, 2)
+
+        query = self.crash_and_reopen()
+        self.assertEqual(self.db.recovery_stats.num_redone, 100 + 10 + 1)
+        for i in range(500):
+            expected = [] if i % 50 == 1 else [[i, -i if i % 5 == 0 else i * 2, i * 3]]
+            self.assertListEqual([record.columns for record in query.select(i, 0, [1, 1, 1])], expected)
+        self.assertListEqual(query.select(1000, 0, [1, 1, 1])[0].columns, [1000, 1, 2])
+
+        # Recovery checkpointed the table, a second crash has nothing to replay
+        query = self.crash_and_reopen()
+        self.assertEqual(self.db.recovery_stats.num_records, 0)
+        self.assertListEqual(query.select(5, 0, [1, 1, 1])[0].columns, [5, -5, 15])
+
+    def test_unfinished_transaction_undone(self):
+        for i in range(10):
+            self.query.insert(i, i, i)
+        self.start_transaction((1, [None, 100, None]), (2, [None, 200, None]))
+        # The checkpoint includes the changes of the running transaction
+        self.db.checkpoint()
+        self.query.update(3, *[None, 300, None])
+
+        query = self.crash_and_reopen()
+        self.assertEqual(self.db.recovery_stats.num_undone, 2)
+        self.assertListEqual(query.select(1, 0, [1, 1, 1])[0].columns, [1, 1, 1])
+        self.assertListEqual(query.select(2, 0, [1, 1, 1])[0].columns, [2, 2, 2])
+        self.assertListEqual(query.select(3, 0, [1, 1, 1])[0].columns, [3, 300, 3])
+
+    def test_abort_after_checkpoint_undone(self):
+        for i in range(10):
+            self.query.insert(i, i, i)
+        transaction = self.start_transaction((4, [None, 40, None]))
+        self.db.checkpoint()
+        transaction.abort()
+        committed = self.start_transaction((5, [None, 50, None]))
+        committed.commit()
+
+        query = self.crash_and_reopen()
+        self.assertListEqual(query.select(4, 0, [1, 1, 1])[0].columns, [4, 4, 4])
+        self.assertListEqual(query.select(5, 0, [1, 1, 1])[0].columns, [5, 50, 5])
+
+    def test_retry_after_abort(self):
+        for i in range(10):
+            self.query.insert(i, i, i)
+        holder = self.start_transaction((1, [None, 10, None]))
+        transaction = Transaction()
+        transaction.add_query(self.query.insert, self.table, 20, 20, 20)
+        transaction.add_query(self.query.update, self.table, 1, *[None, 11, None])
+        self.assertFalse(transaction.run())
+        holder.commit()
+        self.assertTrue(transaction.run())
+
+        # The records of the aborted attempt are not redone with the retry
+        query = self.crash_and_reopen()
+        self.assertEqual(self.db.recovery_stats.num_redone, 10 + 1 + 2)
+        self.assertListEqual(query.select(20, 0, [1, 1, 1])[0].columns, [20, 20, 20])
+        self.assertListEqual(query.select(1, 0, [1, 1, 1])[0].columns, [1, 11, 1])
+
+    def test_evicted_blocks_restored(self):
+        self.db.close()
+        self.db = Database()
+        # Room for a few blocks, so updates write evicted blocks over the checkpoint
+        self.db.open(self.db_path, memory_budget=8 * 4096 * 16)
+        self.query = Query(self.db.get_table('Test'))
+        for i in range(5000):
+            self.query.insert(i, i, i)
+        self.db.checkpoint()
+        for i in range(0, 5000, 3):
+            self.query.update(i, *[None, None, -i])
+
+        query = self.crash_and_reopen(memory_budget=8 * 4096 * 16)
+        self.assertGreater(self.db.recovery_stats.num_restored, 0)
+        for i in range(0, 5000, 7):
+            self.assertListEqual(query.select(i, 0, [1, 1, 1])[0].columns, [i, i, -i if i % 3 == 0 else i])
+
+    def test_checkpoint_trims_log(self):
+        for i in range(100):
+            self.query.insert(i, i, i)
+        lsn = self.db.checkpoint()
+        self.assertEqual(lsn, self.db.wal.next_lsn)
+        self.assertEqual(self.db.wal.base_lsn, lsn)
+
+        # The records of a running transaction are kept
+        start = self.db.wal.next_lsn
+        self.start_transaction((1, [None, 7, None]))
+        self.query.insert(100, 1, 1)
+        self.assertEqual(self.db.checkpoint(), start)
+        self.assertLess(self.db.wal.base_lsn, self.db.wal.next_lsn)
+
+    def test_killed_process(self):
+        script = (
+            "from config import Config\n"
+            "from lstore.db import Database\n"
+            "from lstore.query import Query\n"
+            "import os, signal\n"
+            "Config.wal_enabled = True\n"
+            "db = Database()\n"
+            f"db.open({self.db_path!r})\n"
+            "query = Query(db.get_table('Test'))\n"
+            "for i in range(300):\n"
+            "    query.insert(i, i, i)\n"
+            "db.checkpoint()\n"
+            "for i in range(300):\n"
+            "    query.update(i, *[None, -i, None])\n"
+            "db.wal.flush()\n"
+            "os.kill(os.getpid(), signal.SIGKILL)\n"
+        )
+        self.db.close()
+        result = subprocess.run([sys.executable, '-c', script], cwd=os.getcwd())
+        self.assertEqual(result.returncode, -signal.SIGKILL)
+
+        self.db = Database()
+        self.db.open(self.db_path)
+        query = Query(self.db.get_table('Test'))
+        for i in range(300):
+            self.assertListEqual(query.select(i, 0, [1, 1, 1])[0].columns, [i, -i, i])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,140 @@
+from lstore.db import Database
+from lstore.query import Query
+from lstore.transaction import Transaction
+import unittest
+import os
+import shutil
+from config import Config
+
+class TestResidentMetadata(unittest.TestCase):
+    """Unit testing the resident metadata arrays
+
+    The base indirection, RID and schema columns are
+    served from memory and always match the pages.
+    """
+
+    def setUp(self):
+        self.db_path = './TEMP'
+        if (os.path.exists(self.db_path)):
+            shutil.rmtree(self.db_path, ignore_errors=True)
+
+        self.db = Database()
+        self.db.open(self.db_path)
+        self.table = self.db.create_table('Test', 3, 0, force_merge=True)
+        self.query = Query(self.table)
+        self.page_directory = self.table.page_directory
+
+    def tearDown(self):
+        self.db = None
+        if (os.path.exists(self.db_path)):
+            shutil.rmtree(self.db_path, ignore_errors=True)
+
+    def assertMatchesPages(self, page_directory):
+        page_capacity = Config.page_size // Config.page_cell_size
+        for column_id, values in page_directory.resident_columns.items():
+            self.assertEqual(len(values), page_directory.num_records)
+            for rid in range(page_directory.num_records):
+                slot = page_directory.get_slot(rid)
+                if slot == -1:
+                    self.assertEqual(values[rid], -1)
+                    continue
+                page = page_directory.bufferpool.get_page(slot // page_capacity, column_id, tail_flg=0)
+                self.assertEqual(values[rid], page.read(slot % page_capacity))
+
+    def populate(self):
+        for i in range(20):
+            self.query.insert(i, i, i)
+        for i in range(0, 20, 3):
+            self.query.update(i, *[None, i + 1, None])
+        self.query.delete(5)
+
+        txn = Transaction()
+        txn.add_query(self.query.update, self.table, *[6, None, None, 99])
+        for wrapper in txn.queries:
+            wrapper.try_run()
+        txn.abort()
+
+    def test_write_through(self):
+        self.populate()
+        self.assertMatchesPages(self.page_directory)
+        self.assertEqual(self.page_directory.get_column_value(5, Config.rid_column_idx), -1)
+        self.assertEqual(self.page_directory.get_column_value(3, Config.schema_encoding_column_idx), 0b010)
+
+    def test_reads_skip_bufferpool(self):
+        self.populate()
+        bufferpool = self.page_directory.bufferpool
+        get_page = bufferpool.get_page
+        columns = []
+        bufferpool.get_page = lambda page_num, column_id, *args, **kwargs: columns.append(column_id) or get_page(page_num, column_id, *args, **kwargs)
+
+        self.assertListEqual(self.query.select(1, 0, [1, 1, 1])[0].columns, [1, 1, 1])
+        self.assertEqual(self.query.sum(0, 19, 2) + 5, sum(range(20)))
+        bufferpool.get_page = get_page
+
+        self.assertNotIn(Config.indirection_column_idx, columns)
+        self.assertNotIn(Config.rid_column_idx, columns)
+        self.assertNotIn(Config.schema_encoding_column_idx, columns)
+
+    def test_checkpoint(self):
+        self.populate()
+        self.db.close()
+        self.assertTrue(os.path.exists(os.path.join(self.db_path, 'Test', 'metadata.data')))
+
+        db = Database()
+        db.open(self.db_path)
+        page_directory = db.get_table('Test').page_directory
+        self.assertMatchesPages(page_directory)
+
+    def test_rebuild_without_checkpoint(self):
+        self.populate()
+        self.db.close()
+        os.remove(os.path.join(self.db_path, 'Test', 'metadata.data'))
+
+        db = Database()
+        db.open(self.db_path)
+        table = db.get_table('Test')
+        self.assertMatchesPages(table.page_directory)
+        self.assertListEqual(Query(table).select(3, 0, [1, 1, 1])[0].columns, [3, 4, 3])
+
+    def test_rebuild_after_unclean_shutdown(self):
+        wal_enabled = Config.wal_enabled
+        Config.wal_enabled = False
+        db_path = self.db_path + '_NO_WAL'
+        try:
+            db = Database()
+            db.open(db_path)
+            table = db.create_table('Test', 3, 0, force_merge=True)
+            for i in range(20):
+                Query(table).insert(i, i, i)
+            db.close()
+
+            # The pages reach the disk, but the arrays are never saved
+            db = Database()
+            db.open(db_path)
+            table = db.get_table('Test')
+            Query(table).delete(5)
+            table.page_directory.bufferpool.flush()
+
+            db = Database()
+            db.open(db_path)
+            page_directory = db.get_table('Test').page_directory
+            self.assertEqual(page_directory.get_column_value(5, Config.rid_column_idx), -1)
+            self.assertTrue(page_directory.tombstones[5])
+            self.assertMatchesPages(page_directory)
+            db.close()
+        finally:
+            Config.wal_enabled = wal_enabled
+            shutil.rmtree(db_path, ignore_errors=True)
+
+    def test_vacuum(self):
+        self.populate()
+        self.table.vacuum()
+        self.assertEqual(self.page_directory.get_column_value(5, Config.indirection_column_idx), -1)
+        self.assertMatchesPages(self.page_directory)
+        for rid in range(self.page_directory.num_records):
+            if rid != 5:
+                self.assertEqual(self.page_directory.get_column_value(rid, Config.rid_column_idx), rid)
+
+
+if __name__ == '__main__':
+    unittest.main()
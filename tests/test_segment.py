@@ -0,0 +1,147 @@
+import os
+import shutil
+import unittest
+
+from config import Config
+from lstore.block import Block
+from lstore.page import Page
+from lstore.pool import BufferPool
+from lstore.segment import SegmentFile
+
+class TestSegmentFile(unittest.TestCase):
+    """Unit testing the SegmentFile
+
+    Blocks of any column share one file and keep
+    their extent across writes and reopens.
+    """
+
+    def setUp(self):
+        self.path = 'tests/scratch/segment_test001'
+        if (os.path.exists(self.path)):
+            shutil.rmtree(self.path, ignore_errors=True)
+        os.makedirs(self.path)
+        self.segment_path = os.path.join(self.path, '0.seg')
+
+    def tearDown(self):
+        if (os.path.exists(self.path)):
+            shutil.rmtree(self.path, ignore_errors=True)
+
+    def make_pages(self, n, start):
+        pages = []
+        for i in range(n):
+            p = Page()
+            for j in range(i + 1):
+                p.write(start + i * 1000 + j)
+            pages.append(p)
+        return pages
+
+    def assertPagesEqual(self, pages, expected):
+        self.assertEqual(len(pages), len(expected))
+        for p, e in zip(pages, expected):
+            self.assertEqual(p.num_cells, e.num_cells)
+            self.assertListEqual([p.read(j) for j in range(p.num_cells)], [e.read(j) for j in range(e.num_cells)])
+
+    def test_read_write(self):
+        segment = SegmentFile(self.segment_path)
+        self.assertIsNone(segment.read_pages(0, 0))
+
+        first = self.make_pages(3, 0)
+        second = self.make_pages(Config.pages_per_block, 50)
+        segment.write_pages(0, 0, first)
+        segment.write_pages(7, 2, second)
+        self.assertPagesEqual(segment.read_pages(0, 0), first)
+        self.assertPagesEqual(segment.read_pages(7, 2), second)
+
+        # Rewriting a block reuses its extent
+        segment.write_pages(0, 0, second)
+        self.assertEqual(segment.num_extents, 2)
+        self.assertPagesEqual(segment.read_pages(0, 0), second)
+        segment.close()
+
+    def test_reopen_rebuilds_extent_map(self):
+        segment = SegmentFile(self.segment_path)
+        pages = self.make_pages(2, 9)
+        for column_id in range(4):
+            segment.write_pages(column_id, 1, pages)
+        segment.free(2, 1)
+        segment.close()
+
+        segment = SegmentFile(self.segment_path)
+        self.assertListEqual(sorted(segment.keys()), [(0, 1), (1, 1), (3, 1)])
+        self.assertListEqual(segment.free_extents, [2])
+        self.assertPagesEqual(segment.read_pages(3, 1), pages)
+
+        # A freed extent is handed to the next new block
+        segment.write_pages(5, 0, pages)
+        self.assertEqual(segment.extents[(5, 0)], 2)
+        self.assertEqual(segment.num_extents, 4)
+        segment.close()
+
+    def test_write_blocks_coalesces(self):
+        segment = SegmentFile(self.segment_path)
+        full = self.make_pages(Config.pages_per_block, 0)
+        partial = self.make_pages(2, 7)
+
+        # Four new blocks get adjacent extents and are written at once
+        blocks = [(3, 0, full), (1, 0, full), (0, 0, full), (2, 0, partial)]
+        num_bytes, num_writes = segment.write_blocks(blocks)
+        self.assertEqual(num_writes, 1)
+        self.assertEqual(num_bytes, 3 * segment.extent_size + 12 + 2 * segment.page_stride)
+
+        # A gap or a partial block ends a run
+        self.assertEqual(segment.write_blocks([(0, 0, full), (3, 0, full)])[1], 2)
+        self.assertEqual(segment.write_blocks([(1, 0, partial), (0, 0, full)])[1], 2)
+        self.assertEqual(segment.write_blocks([(1, 0, full)])[1], 1)
+        self.assertEqual(segment.write_blocks(list(reversed(blocks)))[1], 1)
+        for column_id, block_num, pages in blocks:
+            self.assertPagesEqual(segment.read_pages(column_id, block_num), pages)
+        segment.close()
+
+    def test_pool_flush_batches_segments(self):
+        pool = BufferPool(self.path, 4, use_segments=True, blocks_per_segment=2)
+        num_blocks = 6
+        for column_id in range(4):
+            for page_num in range(num_blocks * Config.pages_per_block):
+                p = Page()
+                p.write(column_id * 100000 + page_num)
+                pool.add_page(p, page_num, column_id)
+        pool.flush()
+
+        self.assertEqual(pool.num_flushed_blocks, 4 * num_blocks)
+        self.assertEqual(pool.num_flushed_bytes, 4 * num_blocks * pool._get_segment(0, 0).extent_size)
+        # Every segment holds eight adjacent full blocks and is written at once
+        self.assertEqual(pool.num_flush_writes, num_blocks // 2)
+        self.assertGreater(pool.flush_rate(), 0)
+
+        for column_id in range(4):
+            for page_num in [0, 17, num_blocks * Config.pages_per_block - 1]:
+                self.assertEqual(pool.get_page(page_num, column_id).read(0), column_id * 100000 + page_num)
+        pool.close()
+
+    def test_pool_reads_block_files(self):
+        # Tables written before segment files keep working and move their blocks into segments
+        column_path = os.path.join(self.path, 'base', '3')
+        os.makedirs(column_path)
+        os.makedirs(os.path.join(self.path, 'tail'))
+        block = Block(column_path, 3, 0)
+        pages = self.make_pages(2, 0)
+        for p in pages:
+            block.append(p)
+        block.write()
+
+        pool = BufferPool(self.path, 5)
+        self.assertEqual(pool.get_page(1, 3).read(1), 1001)
+        page = pool.get_page(1, 3)
+        page.write_at_location(-5, 0)
+        pool.update_page(page, 1, 3)
+        pool.close()
+
+        self.assertFalse(os.path.exists(os.path.join(column_path, '0.data')))
+        pool = BufferPool(self.path, 5)
+        self.assertEqual(pool.get_page(1, 3).read(0), -5)
+        self.assertEqual(pool.get_page(0, 3).read(0), 0)
+        pool.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
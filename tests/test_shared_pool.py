@@ -0,0 +1,114 @@
+from lstore.db import Database
+from lstore.pool import SharedBufferPool
+from lstore.query import Query
+import unittest
+import os
+import shutil
+from config import Config
+
+BLOCK_MEMORY = Config.pages_per_block * Config.page_size
+
+class TestSharedBufferPool(unittest.TestCase):
+    """Unit testing the SharedBufferPool
+
+    Every table of a database caches its blocks in
+    one pool that is split fairly between them.
+    """
+
+    def setUp(self):
+        self.db_path = './TEMP'
+        if (os.path.exists(self.db_path)):
+            shutil.rmtree(self.db_path, ignore_errors=True)
+
+        self.db = Database()
+        self.db.open(self.db_path, memory_budget=8 * BLOCK_MEMORY)
+
+    def tearDown(self):
+        self.db = None
+        if (os.path.exists(self.db_path)):
+            shutil.rmtree(self.db_path, ignore_errors=True)
+
+    def path(self, name):
+        return os.path.join(self.db_path, name)
+
+    def test_tables_share_the_pool(self):
+        first = self.db.create_table('First', 1, 0, force_merge=True)
+        second = self.db.create_table('Second', 1, 0, force_merge=True)
+        shared_pool = self.db.bufferpool
+        self.assertIs(first.page_directory.bufferpool.shared_pool, shared_pool)
+        self.assertIs(second.page_directory.bufferpool.shared_pool, shared_pool)
+        self.assertEqual(shared_pool.max_blocks, 8)
+
+        Query(first).insert(1)
+        Query(second).insert(2)
+        self.assertEqual(shared_pool.usage(self.path('First')), shared_pool.usage(self.path('Second')))
+        self.assertEqual(len(shared_pool.queue), shared_pool.usage(self.path('First')) * 2)
+
+    def test_budget_and_correctness(self):
+        tables = [self.db.create_table(name, 3, 0, force_merge=True) for name in ['A', 'B', 'C']]
+        for i in range(1000):
+            for table in tables:
+                Query(table).insert(i, i * 2, i * 3)
+                self.assertLessEqual(len(self.db.bufferpool.queue), 8)
+        for table in tables:
+            query = Query(table)
+            for i in range(0, 1000, 7):
+                query.update(i, *[None, -i, None])
+
+        # Evicted dirty blocks were written back
+        for table in tables:
+            query = Query(table)
+            for i in range(1000):
+                expected = [i, -i, i * 3] if i % 7 == 0 else [i, i * 2, i * 3]
+                self.assertListEqual(query.select(i, 0, [1, 1, 1])[0].columns, expected)
+
+    def test_fair_eviction(self):
+        shared_pool = SharedBufferPool(8)
+        shared_pool.register('hot')
+        shared_pool.register('cold')
+        for i in range(8):
+            shared_pool.admit(('hot', 0, 0, i), None)
+        self.assertEqual(shared_pool.usage('hot'), 8)
+
+        # A table below its share takes blocks from the one over it
+        for i in range(3):
+            shared_pool.admit(('cold', 0, 0, i), None)
+        self.assertEqual(shared_pool.usage('hot'), 5)
+        self.assertEqual(shared_pool.usage('cold'), 3)
+
+        # The coldest block of the hot table was the one evicted
+        self.assertNotIn(('hot', 0, 0, 0), shared_pool.queue)
+        self.assertIn(('hot', 0, 0, 7), shared_pool.queue)
+
+    def test_quota(self):
+        shared_pool = SharedBufferPool(8)
+        shared_pool.register('limited', quota=2)
+        shared_pool.register('free')
+        for i in range(5):
+            shared_pool.admit(('limited', 0, 0, i), None)
+            shared_pool.admit(('free', 0, 0, i), None)
+        self.assertEqual(shared_pool.usage('limited'), 2)
+        self.assertEqual(shared_pool.usage('free'), 5)
+
+        # Lowering a quota evicts right away
+        shared_pool.set_quota('free', 1)
+        self.assertEqual(shared_pool.usage('free'), 1)
+        shared_pool.set_quota('free', None)
+        shared_pool.admit(('free', 0, 0, 10), None)
+        self.assertEqual(shared_pool.usage('free'), 2)
+
+    def test_table_quota_and_drop(self):
+        table = self.db.create_table('Limited', 3, 0, force_merge=True)
+        self.db.set_table_quota('Limited', 2 * BLOCK_MEMORY)
+        query = Query(table)
+        for i in range(200):
+            query.insert(i, i, i)
+            self.assertLessEqual(self.db.bufferpool.usage(self.path('Limited')), 2)
+        self.assertListEqual(query.select(150, 0, [1, 1, 1])[0].columns, [150, 150, 150])
+
+        self.db.drop_table('Limited')
+        self.assertListEqual(self.db.bufferpool.keys(self.path('Limited')), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
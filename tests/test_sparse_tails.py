@@ -0,0 +1,151 @@
+from lstore.db import Database
+from lstore.query import Query
+import unittest
+import os
+import shutil
+from config import Config
+
+class TestSparseTails(unittest.TestCase):
+    """Unit testing sparse tail records
+
+    Sparse tail records only write the metadata and
+    the schema encoded columns of each update.
+    """
+
+    def setUp(self):
+        self.db_path = './TEMP'
+        if (os.path.exists(self.db_path)):
+            shutil.rmtree(self.db_path, ignore_errors=True)
+
+        self.db = Database()
+        self.db.open(self.db_path)
+
+    def tearDown(self):
+        self.db = None
+        if (os.path.exists(self.db_path)):
+            shutil.rmtree(self.db_path, ignore_errors=True)
+
+    def count_tail_cells(self, table):
+        """Total number of cells written to tail pages across all physical columns"""
+        page_directory = table.page_directory
+        page_directory.delta_buffer.flush()
+        total = 0
+        for column_id in range(page_directory.num_columns + 1):
+            page_num = 0
+            while True:
+                key = (page_directory.bufferpool.base_path, column_id, 1, page_num // Config.pages_per_block)
+                block = page_directory.bufferpool._get_block(*key)
+                if page_num % Config.pages_per_block >= len(block.pages):
+                    break
+                total += block.pages[page_num % Config.pages_per_block].num_cells
+                page_num += 1
+        return total
+
+    def test_one_column_update_writes_one_value(self):
+        sparse = self.db.create_table('Sparse', 20, 0, force_merge=True, is_sparse=True)
+        full = self.db.create_table('Full', 20, 0, force_merge=True, is_sparse=False)
+        for table in [sparse, full]:
+            query = Query(table)
+            for i in range(100):
+                query.insert(*([i] + [0] * 19))
+            for i in range(100):
+                query.update(i, *([None, i] + [None] * 18))
+
+        self.assertEqual(sparse.page_directory.num_tail_values, 100)
+        self.assertEqual(self.count_tail_cells(sparse), 100 * (Config.column_data_offset + 1))
+        self.assertEqual(self.count_tail_cells(full), 100 * (Config.column_data_offset + 20))
+
+    def test_select_and_versions(self):
+        table = self.db.create_table('Test', 5, 0, force_merge=True, is_sparse=True)
+        query = Query(table)
+        query.insert(0, 0, 0, 0, 0)
+        query.update(0, *[None, 1, None, None, None])
+        query.update(0, *[None, None, 2, None, 3])
+        query.update(0, *[None, 4, None, None, None])
+
+        self.assertListEqual(query.select(0, 0, [1, 1, 1, 1, 1])[0].columns, [0, 4, 2, 0, 3])
+        self.assertListEqual(query.select_version(0, 0, [1, 1, 1, 1, 1], -1)[0].columns, [0, 1, 2, 0, 3])
+        self.assertListEqual(query.select_version(0, 0, [1, 1, 1, 1, 1], -2)[0].columns, [0, 1, 0, 0, 0])
+
+        # Columns a sparse tail record does not carry read as the -1 placeholder
+        self.assertEqual(table.page_directory.get_column_value(0, Config.column_data_offset + 2, tail_flg=1), -1)
+        self.assertEqual(table.page_directory.get_column_value(0, Config.column_data_offset + 1, tail_flg=1), 1)
+
+    def test_merge(self):
+        table = self.db.create_table('Test', 5, 0, force_merge=True, is_sparse=True)
+        query = Query(table)
+        for i in range(600):
+            query.insert(i, i, i, i, i)
+        for i in range(600):
+            query.update(i, *[None, None, i + 1, None, None])
+
+        table.merge()
+
+        for i in range(600):
+            record = []
+            for j in range(5):
+                record.append(table.page_directory.get_column_value(i, j + Config.column_data_offset))
+            self.assertListEqual(record, [i, i, i + 1, i, i])
+
+    def reopen_with_updates(self, num_records, drop_offsets=False):
+        """Update every record in two tail records with different columns and open the table again"""
+        table = self.db.create_table('Test', 5, 0, force_merge=True, is_sparse=True)
+        query = Query(table)
+        for i in range(num_records):
+            query.insert(i, 0, 0, 0, 0)
+        for i in range(num_records):
+            query.update(i, *[None, i, None, None, None])
+            query.update(i, *[None, None, None, i, i])
+        offsets = list(table.page_directory.tail_page_offsets)
+        num_tail_values = table.page_directory.num_tail_values
+        self.db.close()
+        if drop_offsets:
+            os.remove(os.path.join(self.db_path, 'Test', 'tail_offsets.data'))
+
+        db = Database()
+        db.open(self.db_path)
+        table = db.get_table('Test')
+        self.assertTrue(table.is_sparse)
+        self.assertListEqual(list(table.page_directory.tail_page_offsets), offsets)
+        self.assertEqual(table.page_directory.num_tail_values, num_tail_values)
+        for i in range(0, num_records, 7):
+            self.assertListEqual(Query(table).select(i, 0, [1, 1, 1, 1, 1])[0].columns, [i, i, 0, i, i])
+        return table
+
+    def test_reopen_loads_offsets(self):
+        table = self.reopen_with_updates(10)
+        self.assertListEqual(list(table.page_directory.tail_page_offsets), [0])
+
+    def test_reopen_rebuilds_offsets(self):
+        # Older tables have no saved offsets
+        self.reopen_with_updates(10, drop_offsets=True)
+
+    def test_offsets_of_sealed_pages(self):
+        cache_pages = Config.sparse_offset_cache_pages
+        Config.sparse_offset_cache_pages = 1
+        try:
+            page_capacity = Config.page_size // 8
+            table = self.reopen_with_updates(page_capacity * 2)
+            page_directory = table.page_directory
+            self.assertEqual(len(page_directory.tail_page_offsets), 4)
+
+            # Only one sealed page keeps the offsets of its records
+            self.assertLessEqual(len(page_directory.sealed_tail_offsets), 1)
+
+            # Appends go on in the active page and seal it once it is full
+            query = Query(table)
+            for i in range(page_capacity):
+                query.update(i, *[None, None, -i, None, None])
+            self.assertEqual(page_directory.active_tail_offsets[0], 4)
+            query.update(0, *[None, None, 0, None, None])
+            self.assertEqual(page_directory.active_tail_offsets[0], 5)
+            self.assertListEqual(list(page_directory.sealed_tail_offsets), [4])
+            for i in range(0, page_capacity, 5):
+                self.assertListEqual(query.select(i, 0, [1, 1, 1, 1, 1])[0].columns, [i, i, -i, i, i])
+            for i in range(page_capacity, page_capacity * 2, 5):
+                self.assertListEqual(query.select_version(i, 0, [1, 1, 1, 1, 1], -1)[0].columns, [i, i, 0, 0, 0])
+        finally:
+            Config.sparse_offset_cache_pages = cache_pages
+
+if __name__ == '__main__':
+    unittest.main()
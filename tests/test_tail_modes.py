@@ -0,0 +1,123 @@
+from lstore.db import Database
+from lstore.query import Query
+import unittest
+import os
+import shutil
+from config import Config
+
+class TestCumulativeTails(unittest.TestCase):
+    """Unit testing the cumulative tail record mode
+
+    The same queries must give the same answers in
+    both modes, only the physical tail records differ.
+    """
+
+    is_cumulative = True
+
+    def setUp(self):
+        self.db_path = './TEMP'
+        if (os.path.exists(self.db_path)):
+            shutil.rmtree(self.db_path, ignore_errors=True)
+
+        self.db = Database()
+        self.db.open(self.db_path)
+        self.test_table = self.db.create_table('Test', 5, 0, force_merge=True, is_cumulative=self.is_cumulative)
+        self.query = Query(self.test_table)
+
+    def tearDown(self):
+        self.db = None
+        self.test_table = None
+        self.query = None
+        if (os.path.exists(self.db_path)):
+            shutil.rmtree(self.db_path, ignore_errors=True)
+
+    def test_select_latest(self):
+        self.query.insert(*[0, 1, 2, 3, 4])
+        self.query.update(0, *[None, 10, None, None, None])
+        self.query.update(0, *[None, None, 20, None, None])
+        self.query.update(0, *[None, None, None, 30, None])
+
+        record = self.query.select(0, 0, [1, 1, 1, 1, 1])[0]
+        self.assertListEqual(record.columns, [0, 10, 20, 30, 4])
+
+    def test_select_versions(self):
+        self.query.insert(*[0, 0, 0, 0, 0])
+        expected = [[0, 0, 0, 0, 0]]
+        for i in range(1, 20):
+            update = [None] * 5
+            update[(i % 4) + 1] = i
+            self.query.update(0, *update)
+
+            latest = expected[-1].copy()
+            latest[(i % 4) + 1] = i
+            expected.append(latest)
+
+        for version in range(0, -20, -1):
+            record = self.query.select_version(0, 0, [1, 1, 1, 1, 1], version)[0]
+            self.assertListEqual(record.columns, expected[len(expected) - 1 + version])
+
+        # Asking for a version older than the base record returns the base record
+        record = self.query.select_version(0, 0, [1, 1, 1, 1, 1], -100)[0]
+        self.assertListEqual(record.columns, expected[0])
+
+    def test_sum_versions(self):
+        for i in range(10):
+            self.query.insert(*[i, i, i, i, i])
+        for i in range(10):
+            self.query.update(i, *[None, None, i * 10, None, None])
+            self.query.update(i, *[None, i * 100, None, None, None])
+
+        self.assertEqual(self.query.sum(0, 9, 2), 450)
+        self.assertEqual(self.query.sum_version(0, 9, 1, -1), 45)
+        self.assertEqual(self.query.sum_version(0, 9, 2, -1), 450)
+        self.assertEqual(self.query.sum_version(0, 9, 2, -2), 45)
+
+    def test_tail_schema(self):
+        self.query.insert(*[0, 0, 0, 0, 0])
+        self.query.update(0, *[None, 1, None, None, None])
+        self.query.update(0, *[None, None, 2, None, None])
+
+        page_directory = self.test_table.page_directory
+        schema = page_directory.get_column_value(1, Config.schema_encoding_column_idx, tail_flg=1)
+        base_schema = page_directory.get_column_value(0, Config.schema_encoding_column_idx, tail_flg=0)
+
+        # The base schema always keeps every updated column
+        self.assertEqual(base_schema, 0b110)
+        if self.is_cumulative:
+            self.assertEqual(schema, 0b110)
+        else:
+            self.assertEqual(schema, 0b100)
+
+    def test_merge(self):
+        self.query.insert(*[0, 0, 0, 0, 0])
+        self.query.update(0, *[None, 1, None, None, None])
+        self.query.update(0, *[None, None, 2, None, None])
+
+        self.test_table.merge()
+
+        record = []
+        for i in range(5):
+            record.append(self.test_table.page_directory.get_column_value(0, i + Config.column_data_offset))
+        self.assertListEqual(record, [0, 1, 2, 0, 0])
+
+    def test_mode_is_persisted(self):
+        self.query.insert(*[0, 0, 0, 0, 0])
+        self.query.update(0, *[None, 1, None, None, None])
+        self.db.close()
+
+        db = Database()
+        db.open(self.db_path)
+        table = db.get_table('Test')
+        self.assertEqual(table.is_cumulative, self.is_cumulative)
+        self.assertListEqual(Query(table).select(0, 0, [1, 1, 1, 1, 1])[0].columns, [0, 1, 0, 0, 0])
+
+
+class TestNonCumulativeTails(TestCumulativeTails):
+    """Unit testing the non-cumulative tail record mode
+    """
+
+    is_cumulative = False
+
+
+if __name__ == '__main__':
+    unittest.main()
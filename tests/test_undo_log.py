@@ -0,0 +1,91 @@
+from lstore.db import Database
+from lstore.query import Query
+from lstore.transaction import Transaction
+import unittest
+import os
+import shutil
+
+class TestUndoLog(unittest.TestCase):
+    """Unit testing the undo log of a transaction
+
+    An abort writes back the recorded before-images
+    without looking any record up again.
+    """
+
+    def setUp(self):
+        self.db_path = './TEMP'
+        if (os.path.exists(self.db_path)):
+            shutil.rmtree(self.db_path, ignore_errors=True)
+
+        self.db = Database()
+        self.db.open(self.db_path)
+        self.table = self.db.create_table('Test', 3, 0, force_merge=True)
+        self.query = Query(self.table)
+        for i in range(10):
+            self.query.insert(i, i * 10, i * 100)
+
+    def tearDown(self):
+        self.db = None
+        if (os.path.exists(self.db_path)):
+            shutil.rmtree(self.db_path, ignore_errors=True)
+
+    def run_queries(self, *queries):
+        """Run queries in a Transaction that is left to abort"""
+
+        transaction = Transaction()
+        for query_function, args in queries:
+            transaction.add_query(query_function, self.table, *args)
+        for wrapper in transaction.queries:
+            self.assertTrue(wrapper.try_run())
+        return transaction
+
+    def test_roll_back_without_lookups(self):
+        transaction = self.run_queries(
+            (self.query.update, [1, None, -1, None]),
+            (self.query.delete, [2]),
+            (self.query.insert, [10, 1, 1]),
+            (self.query.update, [1, None, None, -2]),
+        )
+        self.assertEqual(len(transaction.undo_log), 3 + 2 + 2 + 3)
+
+        def fail(*args, **kwargs):
+            raise AssertionError('roll back looked a record up')
+        locate = self.table.index.locate
+        self.table.index.locate = fail
+        transaction.abort()
+        self.table.index.locate = locate
+
+        self.assertEqual(len(transaction.undo_log), 0)
+        self.assertListEqual(self.query.select(1, 0, [1, 1, 1])[0].columns, [1, 10, 100])
+        self.assertListEqual(self.query.select(2, 0, [1, 1, 1])[0].columns, [2, 20, 200])
+        self.assertListEqual(self.query.select(10, 0, [1, 1, 1]), [])
+        self.assertListEqual(self.query.select_version(1, 0, [1, 1, 1], -1)[0].columns, [1, 10, 100])
+
+    def test_secondary_index_restored(self):
+        self.table.index.create_index(1, ordered=False)
+        transaction = self.run_queries(
+            (self.query.update, [3, None, 33, None]),
+            (self.query.delete, [4]),
+        )
+        transaction.abort()
+
+        self.assertListEqual(self.table.index.locate(1, 33), [])
+        self.assertListEqual(self.table.index.locate(1, 30), [3])
+        self.assertListEqual(self.table.index.locate(1, 40), [4])
+
+    def test_increment_rolled_back(self):
+        transaction = self.run_queries((self.query.increment, [5, 2]))
+        self.assertListEqual(self.query.select(5, 0, [1, 1, 1])[0].columns, [5, 50, 501])
+        transaction.abort()
+        self.assertListEqual(self.query.select(5, 0, [1, 1, 1])[0].columns, [5, 50, 500])
+
+    def test_retry_after_abort(self):
+        transaction = self.run_queries((self.query.update, [6, None, 1, None]))
+        transaction.abort()
+        self.assertTrue(transaction.run())
+        self.assertEqual(len(transaction.undo_log), 0)
+        self.assertListEqual(self.query.select(6, 0, [1, 1, 1])[0].columns, [6, 1, 600])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,211 @@
+from lstore.db import Database
+from lstore.query import Query
+from lstore.transaction import Transaction
+from lstore.lock_manager import TABLE_GRANULE
+import unittest
+import threading
+import time
+import os
+import shutil
+from config import Config
+
+class TestVacuum(unittest.TestCase):
+    """Unit testing base page vacuum
+
+    Deleted records give their slots back and live
+    records keep their RIDs while they move.
+    """
+
+    def setUp(self):
+        self.db_path = './TEMP'
+        if (os.path.exists(self.db_path)):
+            shutil.rmtree(self.db_path, ignore_errors=True)
+
+        self.db = Database()
+        self.db.open(self.db_path)
+        self.table = self.db.create_table('Test', 3, 0, force_merge=True)
+        self.query = Query(self.table)
+        self.page_directory = self.table.page_directory
+        self.page_capacity = Config.page_size // Config.page_cell_size
+
+    def tearDown(self):
+        self.db = None
+        if (os.path.exists(self.db_path)):
+            shutil.rmtree(self.db_path, ignore_errors=True)
+
+    def base_files(self):
+        """Block numbers of the base RID column stored on disk"""
+        segment = self.page_directory.bufferpool._get_segment(0, 0)
+        return sorted(block_num for column_id, block_num in segment.keys() if column_id == Config.rid_column_idx)
+
+    def test_free_space_map(self):
+        for i in range(10):
+            self.query.insert(i, i, i)
+        for i in range(0, 10, 2):
+            self.query.delete(i)
+        self.assertEqual(self.page_directory.num_dead_slots(), 5)
+
+        # Rolling a delete back gives the slot back to its record
+        txn = Transaction()
+        txn.add_query(self.query.delete, self.table, 1)
+        for wrapper in txn.queries:
+            wrapper.try_run()
+        self.assertEqual(self.page_directory.num_dead_slots(), 6)
+        txn.abort()
+        self.assertEqual(self.page_directory.num_dead_slots(), 5)
+
+    def test_vacuum_moves_live_records(self):
+        for i in range(10):
+            self.query.insert(i, i, i)
+        self.query.update(9, *[None, 90, None])
+        for i in range(0, 10, 2):
+            self.query.delete(i)
+
+        self.assertEqual(self.table.vacuum(), 5)
+        self.assertEqual(self.page_directory.num_slots, 5)
+        self.assertEqual(self.page_directory.num_dead_slots(), 0)
+        self.assertEqual(self.table.vacuum(), 0)
+
+        for i in range(1, 10, 2):
+            expected = [9, 90, 9] if i == 9 else [i, i, i]
+            self.assertListEqual(self.query.select(i, 0, [1, 1, 1])[0].columns, expected)
+            self.assertLess(self.page_directory.get_slot(i), 5)
+        for i in range(0, 10, 2):
+            self.assertEqual(self.page_directory.get_slot(i), -1)
+            self.assertListEqual(self.query.select(i, 0, [1, 1, 1]), [])
+        self.assertEqual(self.query.sum(0, 9, 1), 1 + 3 + 5 + 7 + 90)
+        self.assertListEqual(self.query.select_version(9, 0, [1, 1, 1], -1)[0].columns, [9, 9, 9])
+
+    def test_vacuum_reclaims_pages(self):
+        num_records = self.page_capacity * Config.pages_per_block * 2
+        for i in range(num_records):
+            self.query.insert(i, i, i)
+        for i in range(self.page_capacity, num_records):
+            self.query.delete(i)
+        self.db.close()
+        self.assertListEqual(self.base_files(), [0, 1])
+
+        self.assertEqual(self.table.vacuum(), num_records - self.page_capacity)
+        self.assertListEqual(self.base_files(), [0])
+
+        # New records reuse the reclaimed space
+        self.query.insert(-1, 1, 1)
+        self.assertEqual(self.page_directory.get_slot(num_records), self.page_capacity)
+        self.assertListEqual(self.query.select(-1, 0, [1, 1, 1])[0].columns, [-1, 1, 1])
+        self.assertEqual(self.query.sum(0, self.page_capacity - 1, 2), sum(range(self.page_capacity)))
+
+    def test_reopen_after_vacuum(self):
+        for i in range(20):
+            self.query.insert(i, i, i)
+        for i in range(10):
+            self.query.delete(i)
+        self.table.vacuum()
+        self.query.insert(100, 0, 0)
+        self.db.close()
+
+        db = Database()
+        db.open(self.db_path)
+        table = db.get_table('Test')
+        query = Query(table)
+        self.assertEqual(table.page_directory.num_slots, 11)
+        for i in range(10, 20):
+            self.assertListEqual(query.select(i, 0, [1, 1, 1])[0].columns, [i, i, i])
+        self.assertListEqual(query.select(100, 0, [1, 1, 1])[0].columns, [100, 0, 0])
+        self.assertListEqual(query.select(3, 0, [1, 1, 1]), [])
+
+    def vacuum_and_crash(self, interrupt=False):
+        """Vacuum the table and open it again without closing it"""
+        num_records = self.page_capacity * 3
+        for i in range(num_records):
+            self.query.insert(i, i, i)
+        for i in range(self.page_capacity):
+            self.query.delete(i)
+        self.db.close()
+
+        if interrupt:
+            # The slot map is saved but the base pages are not truncated yet
+            def fail(*args, **kwargs):
+                raise OSError('Crash')
+            self.page_directory.bufferpool.truncate = fail
+            with self.assertRaises(OSError):
+                self.table.vacuum()
+        else:
+            self.assertEqual(self.table.vacuum(), self.page_capacity)
+
+        db = Database()
+        db.open(self.db_path)
+        table = db.get_table('Test')
+        query = Query(table)
+        self.assertEqual(table.page_directory.num_slots, num_records - self.page_capacity)
+        for i in range(0, num_records, 7):
+            expected = [] if i < self.page_capacity else [[i, i, i]]
+            self.assertListEqual([record.columns for record in query.select(i, 0, [1, 1, 1])], expected)
+
+        # New records go after the live ones
+        query.insert(-1, 1, 1)
+        self.assertEqual(table.page_directory.get_slot(num_records), num_records - self.page_capacity)
+        self.assertListEqual(query.select(-1, 0, [1, 1, 1])[0].columns, [-1, 1, 1])
+        self.assertEqual(query.sum(-1, num_records, 2), 1 + sum(range(self.page_capacity, num_records)))
+        db.close()
+
+    def test_crash_after_vacuum(self):
+        self.vacuum_and_crash()
+
+    def test_crash_during_vacuum(self):
+        self.vacuum_and_crash(interrupt=True)
+
+    def test_merge_after_vacuum(self):
+        for i in range(10):
+            self.query.insert(i, i, i)
+        for i in range(5):
+            self.query.delete(i)
+        self.table.vacuum()
+        for i in range(5, 10):
+            self.query.update(i, *[None, None, i + 1])
+
+        self.table.merge()
+
+        for i in range(5, 10):
+            record = [self.page_directory.get_column_value(i, j + Config.column_data_offset) for j in range(3)]
+            self.assertListEqual(record, [i, i, i + 1])
+
+    def test_vacuums_do_not_share_the_table_lock(self):
+        for i in range(10):
+            self.query.insert(i, i, i)
+        self.query.delete(0)
+
+        # Another vacuum holds the table
+        owner = object()
+        self.table.lock_manager.request(Config.EXCLUSIVE_LOCK, TABLE_GRANULE, owner, timeout=0)
+        self.assertIsNone(self.table.vacuum())
+        self.table.lock_manager.release_all(owner)
+        self.assertEqual(self.table.vacuum(), 1)
+
+    def test_vacuum_waits_for_logged_changes(self):
+        for i in range(10):
+            self.query.insert(i, i, i)
+        self.query.delete(0)
+
+        # A change in another thread holds the checkpoint latch shared
+        latched, release = threading.Event(), threading.Event()
+        def change():
+            with self.table.checkpoint_latch.shared():
+                latched.set()
+                release.wait()
+        thread = threading.Thread(target=change)
+        thread.start()
+        latched.wait()
+
+        result = []
+        vacuum = threading.Thread(target=lambda: result.append(self.table.vacuum()))
+        vacuum.start()
+        time.sleep(0.05)
+        self.assertListEqual(result, [])
+        release.set()
+        vacuum.join()
+        thread.join()
+        self.assertListEqual(result, [1])
+
+
+if __name__ == '__main__':
+    unittest.main()
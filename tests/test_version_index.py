@@ -0,0 +1,116 @@
+from lstore.db import Database
+from lstore.query import Query
+from lstore.transaction import Transaction
+import unittest
+import os
+import shutil
+
+class TestVersionIndex(unittest.TestCase):
+    """Unit testing the VersionIndex
+
+    Deep version reads must match what walking
+    the indirection chain would return.
+    """
+
+    def setUp(self):
+        self.db = Database()
+        self.test_table = self.db.create_table('Test', 3, 0, force_merge=True)
+        self.query = Query(self.test_table)
+        self.version_index = self.test_table.page_directory.version_index
+
+    def tearDown(self):
+        self.db = None
+        self.test_table = None
+        self.query = None
+        db_path = './TEMP'
+        if (os.path.exists(db_path)):
+            shutil.rmtree(db_path, ignore_errors=True)
+
+    def test_deep_versions(self):
+        self.query.insert(0, 0, 0)
+        for i in range(1, 101):
+            self.query.update(0, *[None, i, i * 2])
+
+        for version in range(0, -101, -1):
+            record = self.query.select_version(0, 0, [1, 1, 1], version)[0]
+            self.assertListEqual(record.columns, [0, 100 + version, (100 + version) * 2])
+
+        self.assertIn(0, self.version_index)
+        self.assertEqual(len(self.version_index.chains[0]), 100)
+
+    def test_shallow_versions_do_not_build(self):
+        self.query.insert(0, 0, 0)
+        for i in range(1, 10):
+            self.query.update(0, *[None, i, None])
+
+        self.query.select_version(0, 0, [1, 1, 1], -1)
+        self.assertNotIn(0, self.version_index)
+
+    def test_version_older_than_base(self):
+        self.query.insert(0, 5, 5)
+        for i in range(1, 6):
+            self.query.update(0, *[None, i, None])
+
+        record = self.query.select_version(0, 0, [1, 1, 1], -50)[0]
+        self.assertListEqual(record.columns, [0, 5, 5])
+
+    def test_updates_after_build(self):
+        self.query.insert(0, 0, 0)
+        for i in range(1, 11):
+            self.query.update(0, *[None, i, None])
+        self.assertEqual(self.query.sum_version(0, 0, 1, -8), 2)
+
+        # Later updates are appended to the indexed chain
+        for i in range(11, 21):
+            self.query.update(0, *[None, i, None])
+        self.assertEqual(self.query.sum_version(0, 0, 1, -8), 12)
+        self.assertEqual(len(self.version_index.chains[0]), 20)
+
+    def test_bounded_chains(self):
+        self.version_index.max_depth = 8
+        self.version_index.max_records = 2
+        for key in range(3):
+            self.query.insert(key, 0, 0)
+        for i in range(1, 41):
+            self.query.update(0, *[None, i, None])
+
+        # Versions older than the kept tail RIDs are walked to
+        for version in range(0, -42, -1):
+            record = self.query.select_version(0, 0, [1, 1, 1], version)[0]
+            self.assertEqual(record.columns[1], max(40 + version, 0))
+        self.assertLessEqual(len(self.version_index.chains[0]), 8)
+
+        # Appends trim the chain
+        for i in range(41, 61):
+            self.query.update(0, *[None, i, None])
+        self.assertLess(len(self.version_index.chains[0]), 16)
+        self.assertEqual(self.query.sum_version(0, 0, 1, -30), 30)
+
+        # The chain read least recently is dropped
+        for key in (1, 2):
+            for i in range(1, 6):
+                self.query.update(key, *[None, i, None])
+            self.query.select_version(key, 0, [1, 1, 1], -5)
+        self.assertEqual(len(self.version_index), 2)
+        self.assertNotIn(0, self.version_index)
+
+    def test_roll_back_invalidates(self):
+        self.query.insert(0, 0, 0)
+        for i in range(1, 11):
+            self.query.update(0, *[None, i, None])
+        self.query.select_version(0, 0, [1, 1, 1], -5)
+        self.assertIn(0, self.version_index)
+
+        txn = Transaction()
+        txn.add_query(self.query.update, self.test_table, *[0, None, 99, None])
+        for wrapper in txn.queries:
+            wrapper.try_run()
+        txn.abort()
+
+        self.assertNotIn(0, self.version_index)
+        record = self.query.select_version(0, 0, [1, 1, 1], -5)[0]
+        self.assertListEqual(record.columns, [0, 5, 0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,144 @@
+from lstore.db import Database
+from lstore.query import Query
+from lstore.transaction import Transaction
+from lstore.wal import WriteAheadLog, read_records, WAL_FILE, BASE_LSN, INSERT_RECORD, UPDATE_RECORD, DELETE_RECORD, COMMIT_RECORD, ABORT_RECORD
+from config import Config
+import unittest
+import os
+import shutil
+import threading
+
+class TestWriteAheadLog(unittest.TestCase):
+    """Unit testing the WriteAheadLog
+
+    Every change is logged and a commit returns
+    once its records are synced.
+    """
+
+    def setUp(self):
+        self.wal_enabled = Config.wal_enabled
+        Config.wal_enabled = True
+        self.db_path = './TEMP'
+        if (os.path.exists(self.db_path)):
+            shutil.rmtree(self.db_path, ignore_errors=True)
+
+        self.db = Database()
+        self.db.open(self.db_path)
+        self.table = self.db.create_table('Test', 3, 0, force_merge=True)
+        self.wal_path = os.path.join(self.db_path, WAL_FILE)
+
+    def tearDown(self):
+        Config.wal_enabled = self.wal_enabled
+        self.db = None
+        if (os.path.exists(self.db_path)):
+            shutil.rmtree(self.db_path, ignore_errors=True)
+
+    def records(self):
+        self.db.wal.flush()
+        return list(read_records(self.wal_path))
+
+    def test_queries_are_logged(self):
+        query = Query(self.table)
+        query.insert(1, 10, 100)
+        query.insert(2, 20, 200)
+        query.update(1, *[None, 11, None])
+        query.delete(2)
+
+        records = self.records()
+        self.assertListEqual([r.type for r in records], [INSERT_RECORD, INSERT_RECORD, UPDATE_RECORD, DELETE_RECORD])
+        self.assertTrue(all(r.transaction_id == 0 and r.table == 'Test' for r in records))
+        self.assertListEqual(records[1].new_values, [2, 20, 200])
+
+        # Updates and deletes keep what they overwrote
+        self.assertEqual(records[2].key, 1)
+        self.assertListEqual(records[2].new_values, [None, 11, None])
+        self.assertListEqual(records[2].old_values, [None, 10, None])
+        self.assertEqual(records[3].key, 2)
+        self.assertListEqual(records[3].old_values, [2, 20, 200])
+        self.assertEqual(records[-1].lsn, os.path.getsize(self.wal_path) - BASE_LSN.size)
+
+    def test_commit_is_durable(self):
+        query = Query(self.table)
+        transaction = Transaction()
+        transaction.add_query(query.insert, self.table, 5, 50, 500)
+        transaction.add_query(query.update, self.table, 5, *[None, None, 501])
+        transaction.add_query(query.select, self.table, 5, 0, [1, 1, 1])
+        self.assertTrue(transaction.run())
+
+        # The commit synced its records without a flush
+        self.assertEqual(self.db.wal.durable_lsn, os.path.getsize(self.wal_path) - BASE_LSN.size)
+        records = list(read_records(self.wal_path))
+        self.assertListEqual([r.type for r in records], [INSERT_RECORD, UPDATE_RECORD, COMMIT_RECORD])
+        self.assertTrue(all(r.transaction_id == transaction.id for r in records))
+
+        # A transaction that only reads is not logged
+        reader = Transaction()
+        reader.add_query(query.select, self.table, 5, 0, [1, 1, 1])
+        self.assertTrue(reader.run())
+        self.assertEqual(len(self.records()), 3)
+
+    def test_abort_is_logged(self):
+        query = Query(self.table)
+        transaction = Transaction()
+        transaction.add_query(query.insert, self.table, 7, 70, 700)
+        transaction.add_query(query.update, self.table, 8, *[None, 1, None])
+        self.assertIsNone(transaction.run())
+
+        records = self.records()
+        self.assertListEqual([r.type for r in records], [INSERT_RECORD, ABORT_RECORD])
+        self.assertEqual(records[-1].transaction_id, transaction.id)
+
+    def test_close_empties_log(self):
+        query = Query(self.table)
+        for i in range(100):
+            query.insert(i, i, i)
+        self.db.close()
+        self.assertEqual(os.path.getsize(self.wal_path), BASE_LSN.size)
+
+    def test_torn_record_ignored(self):
+        query = Query(self.table)
+        query.insert(1, 2, 3)
+        query.insert(4, 5, 6)
+        self.db.wal.flush()
+        with open(self.wal_path, 'rb') as fp:
+            data = fp.read()
+
+        # A crash in the middle of a write leaves part of a record
+        with open(self.wal_path, 'wb') as fp:
+            fp.write(data[:-3])
+        self.assertEqual(len(list(read_records(self.wal_path))), 1)
+
+    def commit_concurrently(self, wal, num_threads=8, num_transactions=20):
+        def run(thread):
+            for i in range(num_transactions):
+                transaction_id = thread * num_transactions + i + 1
+                wal.append(UPDATE_RECORD, 'Test', i, [None, i], [None, 0], transaction_id=transaction_id)
+                wal.commit(transaction_id)
+
+        threads = [threading.Thread(target=run, args=(t,)) for t in range(num_threads)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return num_threads * num_transactions
+
+    def test_group_commit(self):
+        wal = WriteAheadLog(os.path.join(self.db_path, 'group.log'), group_commit=True, commit_delay=0.002)
+        num_commits = self.commit_concurrently(wal)
+        self.assertEqual(wal.num_commits, num_commits)
+        self.assertLess(wal.num_syncs, num_commits)
+
+        records = list(read_records(wal.path))
+        self.assertEqual(sum(r.type == COMMIT_RECORD for r in records), num_commits)
+        self.assertEqual(wal.durable_lsn, os.path.getsize(wal.path) - BASE_LSN.size)
+        wal.close()
+
+    def test_sync_per_commit(self):
+        wal = WriteAheadLog(os.path.join(self.db_path, 'single.log'), group_commit=False)
+        num_commits = self.commit_concurrently(wal, num_threads=4, num_transactions=10)
+        self.assertEqual(wal.num_syncs, num_commits)
+        wal.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+from lstore.db import Database
+from lstore.pool import BufferPool, SharedBufferPool
+from lstore.query import Query
+import unittest
+import os
+import shutil
+from config import Config
+
+class TestWarmSet(unittest.TestCase):
+    """Unit testing the buffer pool warm set
+
+    The blocks cached at close are loaded back
+    when their table is reopened.
+    """
+
+    def setUp(self):
+        self.db_path = './TEMP'
+        if (os.path.exists(self.db_path)):
+            shutil.rmtree(self.db_path, ignore_errors=True)
+
+        self.db = Database()
+        self.db.open(self.db_path)
+
+    def tearDown(self):
+        self.db = None
+        if (os.path.exists(self.db_path)):
+            shutil.rmtree(self.db_path, ignore_errors=True)
+
+    def fill(self, name, num_records):
+        table = self.db.create_table(name, 3, 0, force_merge=True)
+        query = Query(table)
+        for i in range(num_records):
+            query.insert(i, i * 2, i * 3)
+        return table
+
+    def test_restore_after_reopen(self):
+        self.fill('Test', 2000)
+        cached = set(self.db.bufferpool.keys(os.path.join(self.db_path, 'Test')))
+        self.db.close()
+
+        db = Database()
+        db.open(self.db_path)
+        table = db.get_table('Test')
+        db.bufferpool.wait_warming()
+        self.assertEqual(set(db.bufferpool.keys(os.path.join(self.db_path, 'Test'))), cached)
+        self.assertGreater(db.bufferpool.num_warmed, 0)
+
+        # Every lookup of the reads below hits the restored blocks
+        num_misses = db.bufferpool.num_misses
+        query = Query(table)
+        for i in range(2000):
+            self.assertListEqual(query.select(i, 0, [1, 1, 1])[0].columns, [i, i * 2, i * 3])
+        self.assertEqual(db.bufferpool.num_misses, num_misses)
+        self.assertGreater(db.bufferpool.hit_rate(), 0.99)
+        self.assertEqual(db.bufferpool.hit_rate_curve[-1][1], 1.0)
+
+    def test_hottest_blocks_first(self):
+        self.fill('Test', 6000)
+        table_path = os.path.join(self.db_path, 'Test')
+        hot = (table_path, Config.column_data_offset + 1, 0, 0)
+        for _ in range(10):
+            self.db.bufferpool.admit(hot, self.db.bufferpool.get(hot))
+        self.db.close()
+
+        # Only a few blocks fit after the restart, the hot one is among them
+        shared_pool = SharedBufferPool(2)
+        with open(os.path.join(self.db_path, 'warm.data'), 'rb') as fp:
+            shared_pool.load_warm_set(fp, self.db_path)
+        bufferpool = BufferPool(table_path, 9, shared_pool=shared_pool)
+        shared_pool.wait_warming()
+        self.assertEqual(shared_pool.num_warmed, 2)
+        self.assertIn(hot, shared_pool.queue)
+        self.assertEqual(bufferpool.get_page(0, Config.column_data_offset + 1).read(7), 14)
+        self.assertEqual(shared_pool.num_misses, 0)
+
+    def test_writes_after_restore(self):
+        self.fill('Test', 600)
+        self.db.close()
+
+        db = Database()
+        db.open(self.db_path)
+        table = db.get_table('Test')
+        query = Query(table)
+        for i in range(600):
+            query.update(i, *[None, -i, None])
+        db.bufferpool.wait_warming()
+        for i in range(600):
+            self.assertListEqual(query.select(i, 0, [1, 1, 1])[0].columns, [i, -i, i * 3])
+        db.close()
+
+        db = Database()
+        db.open(self.db_path)
+        query = Query(db.get_table('Test'))
+        for i in range(0, 600, 50):
+            self.assertListEqual(query.select(i, 0, [1, 1, 1])[0].columns, [i, -i, i * 3])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,3 +1,4 @@
+from contextlib import contextmanager
 import threading
 
 class Latch:
@@ -33,3 +34,62 @@ class Latch:
             
             self._condition.notify_all()
 
+
+class BlockingLatch:
+    """A shared/exclusive latch that waits instead of failing
+
+    Waiting exclusive holders go before new shared holders
+    so they are not starved, but a thread that already holds
+    the latch shared may always take it again.
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition(threading.Lock())
+        self._shared_count = 0
+        self._exclusive_lock = False
+        self._exclusive_waiting = 0
+        self._local = threading.local()
+
+    def acquire_shared(self):
+        held = getattr(self._local, 'count', 0)
+        with self._condition:
+            while self._exclusive_lock or (self._exclusive_waiting > 0 and held == 0):
+                self._condition.wait()
+            self._shared_count += 1
+        self._local.count = held + 1
+
+    def release_shared(self):
+        self._local.count -= 1
+        with self._condition:
+            self._shared_count -= 1
+            if self._shared_count == 0:
+                self._condition.notify_all()
+
+    def acquire_exclusive(self):
+        with self._condition:
+            self._exclusive_waiting += 1
+            while self._exclusive_lock or self._shared_count > 0:
+                self._condition.wait()
+            self._exclusive_waiting -= 1
+            self._exclusive_lock = True
+
+    def release_exclusive(self):
+        with self._condition:
+            self._exclusive_lock = False
+            self._condition.notify_all()
+
+    @contextmanager
+    def shared(self):
+        self.acquire_shared()
+        try:
+            yield
+        finally:
+            self.release_shared()
+
+    @contextmanager
+    def exclusive(self):
+        self.acquire_exclusive()
+        try:
+            yield
+        finally:
+            self.release_exclusive()